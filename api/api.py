@@ -1,155 +1,1070 @@
 # api/api.py
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import joblib, json, traceback
-import numpy as np
-import pandas as pd
+import time
+_IMPORT_T0 = time.perf_counter()
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, model_validator
+import hmac, os, threading, traceback
 import numpy as np
-from functools import lru_cache
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+from typing import Any, Literal
+
+from api.artifacts import memory_report
+from api.batching import MicroBatcher
+from api.cache import ExplanationCache, TTLCache, row_key
+from api.encoding import FastJSONResponse, GZipMiddleware, compact_explanation, short_name, sse_event
+from api.explainers import expected_value, iter_shap_chunks, positive_class
+from api.jobs import JobManager, JobQueueFull
+from api.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, Registry
+from api.profiling import ProfilerBusy, profiled, record_stage
+from api.registry import ModelSlot, current_version, list_versions, load_bundle, resolve, set_current
+from api.scheduler import InferenceScheduler
+from api.shadow import Challenger, ShadowPool
+from api.schema import FeatureValue, RowDecoder
+from api.startup import StartupReport
+from api.streaming import CSV_TYPES, NDJSON_TYPES, ScoreStreamResponse, StreamScorer
+from api import wire
+
+STARTUP = StartupReport(started=_IMPORT_T0)
+STARTUP.record('import', time.perf_counter() - _IMPORT_T0)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm-up runs off the event loop so the server accepts connections (and
+    # answers /health and /ready) while shap/lime import and the first rows run
+    threading.Thread(target=_warm_up, name='warm-up', daemon=True).start()
+    stop_watch = threading.Event()
+    if MODEL_WATCH_SECONDS > 0:
+        threading.Thread(target=_watch_registry, args=(stop_watch,), name='model-watch', daemon=True).start()
+    yield
+    stop_watch.set()
+    EXPLAIN_JOBS.shutdown()
+    SHADOW_POOL.shutdown()
+
+app = FastAPI(title='XAI Heart Risk API', version='1.0', lifespan=lifespan)
+
+METRICS = Registry()
+REQUEST_SECONDS = METRICS.histogram('heart_api_request_seconds', 'HTTP request latency by route',
+                                    ('method', 'endpoint', 'status'))
+REQUESTS_IN_FLIGHT = METRICS.gauge('heart_api_requests_in_flight', 'HTTP requests being handled')
+# Internal stages of /predict and /explain: decode, predict_proba, shap_*, lime_*
+STAGE_SECONDS = METRICS.histogram('heart_api_stage_seconds', 'Latency of internal request stages', ('stage',))
+# Responses of at least GZIP_MIN_BYTES (batches, explanations) are gzipped for
+# clients that accept it; 0 turns compression off. Event streams and NDJSON are
+# never compressed. Added first so request latency in /metrics includes compression.
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', '1024'))
+if GZIP_MIN_BYTES > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES,
+                       compresslevel=int(os.environ.get('GZIP_LEVEL', '6')))
+app.add_middleware(MetricsMiddleware, latency=REQUEST_SECONDS, in_flight=REQUESTS_IN_FLIGHT)
+
+@contextmanager
+def _stage(name):
+    """Time one internal stage into /metrics and into the active request profile."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        STAGE_SECONDS.observe(seconds, stage=name)
+        record_stage(name, seconds)
+
+# Per-request cProfile runs (?profile=true or X-Profile: 1) are off unless enabled here
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')  # also dump .prof files here when set
+PROFILE_TOP = int(os.environ.get('PROFILE_TOP', '25'))
+
+def _profile_requested(request, profile):
+    if not (profile or request.headers.get('x-profile', '').lower() in ('1', 'true')):
+        return False
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail={'error': 'profiling is disabled (set PROFILING_ENABLED=1)'})
+    return True
+
+def _run_profiled(label, enabled, fn, *args):
+    """Call fn(*args); when ``enabled``, attach a 'profile' report to its dict."""
+    try:
+        with profiled(label, enabled=enabled) as prof:
+            out = fn(*args)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=429, detail={'error': str(e)})
+    if prof is not None:
+        out = dict(out, profile=prof.report(top=PROFILE_TOP, out_dir=PROFILE_DIR or None))
+    return out
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request, exc):
+    # The default handler echoes rejected inputs, which fails on Infinity/NaN
+    errors = [{k: v for k, v in err.items() if k not in ('input', 'ctx')} for err in exc.errors()]
+    return JSONResponse({'detail': errors}, status_code=422)
+
+THRESHOLD = 0.5
+# ?compact=true drops what GET /metadata already tells clients (feature list,
+# threshold) and shortens/rounds explanations; COMPACT_RESPONSES=1 makes it the default
+COMPACT_RESPONSES = os.environ.get('COMPACT_RESPONSES', '0') == '1'
+STATIC_FIELDS = ('features_used', 'threshold')
+EXPLAIN_DIGITS = int(os.environ.get('EXPLAIN_DIGITS', '6'))
+
+def _without_static(out):
+    return {k: v for k, v in out.items() if k not in STATIC_FIELDS}
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '10000'))
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', '1000'))
+
+# Versioned artifacts (api/registry.py): MODEL_REGISTRY_DIR/CURRENT names the
+# version served. Without one, the flat directory train.py writes is served as 'local'.
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', 'models/registry')
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+# 'sklearn' (default) runs the fitted Pipeline; 'compiled' uses the array evaluator,
+# memory-mapped from the version's shared/ directory when train.py exported it
+INFERENCE_ENGINE = os.environ.get('INFERENCE_ENGINE', 'sklearn')
+# 'exact' (default) always runs the engine; 'lookup' answers /predict from the
+# quantized table written by train/build_lookup.py when the row is on its grid
+PREDICT_MODE = os.environ.get('PREDICT_MODE', 'exact')
 
-app = FastAPI(title='XAI Heart Risk API', version='1.0')
+def _load_version(version=None, phase=None):
+    """Load ``version`` (default: the registry's CURRENT) into a ModelBundle."""
+    version = version or current_version(MODEL_REGISTRY_DIR)
+    if version is None:
+        return load_bundle(MODEL_DIR, version='local', engine=INFERENCE_ENGINE,
+                           predict_mode=PREDICT_MODE, phase=phase)
+    path, manifest = resolve(MODEL_REGISTRY_DIR, version)
+    return load_bundle(path, manifest=manifest, engine=INFERENCE_ENGINE,
+                       predict_mode=PREDICT_MODE, phase=phase)
 
-model = joblib.load('models/model.joblib')
-try:
-    shap_cache = joblib.load('models/shap_explainer.joblib')
-    shap_explainer = shap_cache.get('explainer')
-    bg = shap_cache.get('background')
-    feat_names = shap_cache.get('feature_names')
-except Exception:
-    shap_explainer = None; bg = None; feat_names = None
+MODELS = ModelSlot(_load_version(phase=STARTUP.phase))
+# The request schema is built once; a reload must keep the same features
+FEATURES = MODELS.current.features
 
-with open('models/features.json') as f:
-    FEATURES = json.load(f)
+# Small batches run single-threaded; large ones split the host's cores with in-flight calls
+SCHEDULER = InferenceScheduler(
+    cpus=int(os.environ.get('INFERENCE_CPUS', '0')) or None,
+    parallel_min_rows=int(os.environ.get('INFERENCE_PARALLEL_MIN_ROWS', '2048'))
+)
+
+def _score(bundle, X):
+    """Positive-class probabilities for a decoded feature matrix, within the CPU budget."""
+    with SCHEDULER.slot(len(X)), _stage('predict_proba'):
+        return bundle.engine.predict_proba(X)[:, 1]
+
+# Opt-in micro-batching: concurrent /predict rows are scored together after waiting
+# up to PREDICT_BATCH_WINDOW_MS (0 = off) or until PREDICT_BATCH_MAX rows are queued
+PREDICT_BATCH_WINDOW_MS = float(os.environ.get('PREDICT_BATCH_WINDOW_MS', '0'))
+PREDICT_BATCH_MAX = int(os.environ.get('PREDICT_BATCH_MAX', '64'))
+BATCH_ROWS = METRICS.histogram('heart_api_predict_batch_rows', 'Rows per micro-batched predict_proba call',
+                               buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+BATCH_WAIT_SECONDS = METRICS.histogram('heart_api_predict_batch_wait_seconds',
+                                       'Time a /predict row waited for its micro-batch')
+
+def _observe_batch(rows, waits):
+    BATCH_ROWS.observe(rows)
+    for seconds in waits:
+        BATCH_WAIT_SECONDS.observe(seconds)
+
+BATCHER = (MicroBatcher(PREDICT_BATCH_WINDOW_MS / 1000, PREDICT_BATCH_MAX, on_batch=_observe_batch)
+           if PREDICT_BATCH_WINDOW_MS > 0 else None)
+
+# Keys include the model hash, so results never outlive the artifact that produced them
+PREDICT_CACHE = TTLCache(
+    maxsize=int(os.environ.get('PREDICT_CACHE_SIZE', '4096')),
+    ttl=float(os.environ.get('PREDICT_CACHE_TTL', '300'))
+)
+
+def _startup_explain_cache():
+    """Open the shared on-disk explanation cache and drop entries of other models."""
+    path = os.environ.get('EXPLAIN_CACHE_PATH', '.cache/explain_cache.sqlite')
+    if not path:
+        return None
+    try:
+        cache = ExplanationCache(
+            path,
+            memory_size=int(os.environ.get('EXPLAIN_CACHE_SIZE', '256')),
+            max_age=float(os.environ.get('EXPLAIN_CACHE_MAX_AGE', str(7 * 86400))),
+            max_bytes=int(os.environ.get('EXPLAIN_CACHE_MAX_BYTES', str(64 << 20))),
+            sync_interval=float(os.environ.get('EXPLAIN_CACHE_SYNC_SECONDS', '1'))
+        )
+        cache.purge(keep_model_hash=MODELS.current.model_sha256)
+        return cache
+    except Exception as e:
+        print('Explanation cache disabled:', e)
+        return None
+
+with STARTUP.phase('open_caches'):
+    EXPLAIN_CACHE = _startup_explain_cache()
+
+# Explanation jobs get their own small pool so they never occupy request threads
+EXPLAIN_JOBS = JobManager(
+    workers=int(os.environ.get('EXPLAIN_JOB_WORKERS', '2')),
+    max_pending=int(os.environ.get('EXPLAIN_JOB_QUEUE', '32')),
+    ttl=float(os.environ.get('EXPLAIN_JOB_TTL', '600'))
+)
+
+DECODER = RowDecoder(FEATURES, categorical=MODELS.current.categorical)
+
+@METRICS.collector
+def _collect_state():
+    """Model identity, cache hit ratios and queue depths, read at scrape time."""
+    caches = [('predict', 'memory', PREDICT_CACHE.hits, PREDICT_CACHE.misses)]
+    if EXPLAIN_CACHE:
+        caches += [('explain', 'memory', EXPLAIN_CACHE.memory.hits, EXPLAIN_CACHE.memory.misses),
+                   ('explain', 'disk', EXPLAIN_CACHE.disk_hits, EXPLAIN_CACHE.disk_misses)]
+    ratio = lambda hits, misses: hits / (hits + misses) if hits + misses else 0.0
+    jobs = EXPLAIN_JOBS.stats()['jobs']
+    bundle = MODELS.current
+    return [
+        ('heart_api_model_info', 'gauge', 'Model being served (value is always 1)',
+         [({'model_sha256': bundle.model_sha256, 'model_version': bundle.version, 'engine': bundle.engine.name,
+            'api_version': app.version}, 1)]),
+        ('heart_api_cache_hits_total', 'counter', 'Cache hits',
+         [({'cache': c, 'tier': t}, h) for c, t, h, _ in caches]),
+        ('heart_api_cache_misses_total', 'counter', 'Cache misses',
+         [({'cache': c, 'tier': t}, m) for c, t, _, m in caches]),
+        ('heart_api_cache_hit_ratio', 'gauge', 'Cache hits / lookups since start',
+         [({'cache': c, 'tier': t}, ratio(h, m)) for c, t, h, m in caches]),
+        ('heart_api_inference_in_flight', 'gauge', 'predict_proba calls holding a scheduler slot',
+         [({}, SCHEDULER.stats()['inflight'])]),
+        ('heart_api_explain_jobs', 'gauge', 'Explanation jobs by status',
+         [({'status': s}, n) for s, n in jobs.items()]),
+    ]
+
+MEMORY_AT_STARTUP = memory_report()
+MEMORY_AFTER_WARM_UP = None
+print('Worker memory at startup:', MEMORY_AT_STARTUP)
+PatientPayload = DECODER.schema
 
 class PatientInput(BaseModel):
-    payload: dict
+    payload: PatientPayload
+
+    def as_array(self):
+        """Return a (1, n_features) float64 matrix ordered like FEATURES.
+        Missing keys become np.nan, matching the imputers in the pipeline."""
+        return DECODER.fill(self.payload, DECODER.empty())
+
+class BatchInput(BaseModel):
+    # Any, not dict: a malformed element is reported as that row's error
+    payloads: list[Any]
+
+WHAT_IF_MAX_POINTS = int(os.environ.get('WHAT_IF_MAX_POINTS', '10000'))
 
-    def as_ordered_list(self):
-        """Return feature values ordered according to training features list.
-        Missing keys become np.nan to allow sklearn imputers to work."""
-        return [self.payload.get(k, np.nan) for k in FEATURES]
+class SweepAxis(BaseModel):
+    """One swept feature: explicit ``values`` or ``num`` points from ``start`` to ``stop``."""
+    feature: str
+    values: list[FeatureValue] | None = None
+    start: FeatureValue = None
+    stop: FeatureValue = None
+    num: int = Field(25, ge=2, le=1000)
 
-    def as_dataframe(self):
-        """Return a single-row pandas DataFrame with training feature names as columns."""
-        row = {k: self.payload.get(k, np.nan) for k in FEATURES}
-        return pd.DataFrame([row])
+    @model_validator(mode='after')
+    def _check(self):
+        if self.feature not in FEATURES:
+            raise ValueError(f'unknown feature {self.feature!r}')
+        if self.values is None:
+            if self.start is None or self.stop is None:
+                raise ValueError('give either values or start and stop')
+        elif not self.values or any(v is None for v in self.values):
+            raise ValueError('values must be a non-empty list of numbers')
+        return self
+
+    def grid(self):
+        if self.values is not None:
+            return np.asarray(self.values, dtype=np.float64)
+        return np.linspace(self.start, self.stop, self.num)
+
+class WhatIfInput(BaseModel):
+    payload: PatientPayload
+    axes: list[SweepAxis] = Field(min_length=1, max_length=2)
+
+    @model_validator(mode='after')
+    def _distinct(self):
+        if len({a.feature for a in self.axes}) != len(self.axes):
+            raise ValueError('axes must sweep different features')
+        return self
+
+def _warm_bundle(bundle, report, explain=True):
+    """Push a synthetic (all-imputed) row through every serving path of
+    ``bundle`` so its first real request runs at steady-state speed."""
+    probe = PatientInput(payload={})
+    out = {}
+    with report.phase('warm_predict', tolerate=True):
+        _score(bundle, probe.as_array())
+    if not explain:
+        return
+    with report.phase('load_shap', tolerate=True):
+        if bundle.shap_explainer()[0] is None:
+            raise RuntimeError('SHAP explainer unavailable')
+    params = _explain_params()
+    for name, stage in EXPLAIN_STAGES:
+        with report.phase(f'warm_{name}', tolerate=True):
+            stage(bundle, probe, out, params)
+            if f'{name}_error' in out:
+                raise RuntimeError(out[f'{name}_error'].splitlines()[0])
+
+def _warm_up():
+    """Import the explainers and warm the startup model."""
+    with STARTUP.phase('import_shap', tolerate=True):
+        import shap  # noqa: F401
+    with STARTUP.phase('import_lime', tolerate=True):
+        import lime.lime_tabular  # noqa: F401
+    _warm_bundle(MODELS.current, STARTUP)
+    if CHALLENGER_VERSION:
+        _start_reload(CHALLENGER_VERSION, challenger={'mode': CHALLENGER_MODE, 'percent': CHALLENGER_PERCENT})
+    global MEMORY_AFTER_WARM_UP
+    MEMORY_AFTER_WARM_UP = memory_report()
+    STARTUP.mark_ready()
+    print('Startup timings (ms):', STARTUP.phases, 'errors:', STARTUP.errors or None)
+    print('Worker memory after warm-up:', MEMORY_AFTER_WARM_UP)
 
 @app.get('/health')
 def health():
     return {'status':'ok'}
 
+@app.get('/metadata')
+def metadata():
+    """Static facts about the served model that compact responses leave out."""
+    bundle = MODELS.current
+    return {
+        'features': FEATURES,
+        'threshold': THRESHOLD,
+        'explained_features': list(bundle.explained_features),
+        'model_version': bundle.version,
+        'model_sha256': bundle.model_sha256,
+        'engine': bundle.engine.name,
+        'api_version': app.version
+    }
+
+# Warm-up phases whose failure means predictions cannot be served; any other
+# failure (an explainer) only marks the worker degraded
+PREDICT_PHASES = ('warm_predict',)
+
+@app.get('/ready')
+def ready(strict: bool = False):
+    """200 once warm-up has finished and predictions work; 503 while warming up
+    or when the prediction path failed. A broken explainer still answers 200,
+    with ``degraded`` and the failed phases in ``failed`` / ``errors``;
+    ``?strict=true`` turns that into a 503 for monitoring."""
+    report = STARTUP.as_dict()
+    report['failed'] = sorted(report['errors'])
+    ok = report['ready'] and not any(p in report['errors'] for p in PREDICT_PHASES)
+    if strict:
+        ok = ok and not report['degraded']
+    return JSONResponse(report, status_code=200 if ok else 503)
+
+@app.get('/memory')
+def memory():
+    """Resident vs shared memory of the worker that handles this request."""
+    return {'startup': MEMORY_AT_STARTUP, 'after_warm_up': MEMORY_AFTER_WARM_UP,
+            'current': memory_report(), 'engine': MODELS.current.engine.name}
+
+@app.get('/metrics')
+def metrics():
+    """Prometheus text exposition of request/stage latency, caches and the model in use."""
+    return Response(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get('/scheduler')
+def scheduler_stats():
+    return SCHEDULER.stats()
+
+@app.get('/cache/stats')
+def cache_stats():
+    return {
+        'model_sha256': MODELS.current.model_sha256,
+        'predict': PREDICT_CACHE.stats(),
+        'explain': EXPLAIN_CACHE.stats() if EXPLAIN_CACHE else None
+    }
+
+@app.delete('/cache/explain')
+def purge_explain_cache():
+    """Drop every cached explanation, in memory and on disk."""
+    deleted = EXPLAIN_CACHE.purge() if EXPLAIN_CACHE else 0
+    return {'deleted': deleted}
+
+# Hot reload: POST /admin/models/reload, or a changed registry CURRENT when
+# MODEL_WATCH_SECONDS > 0, loads and warms a version on a background thread and
+# then swaps it in. Admin endpoints are disabled unless ADMIN_TOKEN is set.
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+MODEL_WATCH_SECONDS = float(os.environ.get('MODEL_WATCH_SECONDS', '0'))
+MODEL_RELOADS = METRICS.counter('heart_api_model_reloads_total', 'Model reloads by outcome', ('status',))
+
+def _reload_model(version, activate=False, challenger=None):
+    """Load, verify and warm ``version``, then serve it (model-reload thread).
+
+    With ``challenger`` (mode / percent options) the version becomes the
+    challenger instead; only its /predict path is warmed."""
+    report = StartupReport()
+    try:
+        bundle = _load_version(version, phase=report.phase)
+        if bundle.features != FEATURES:
+            raise ValueError('model features differ from the served request schema; restart the API instead')
+        _warm_bundle(bundle, report, explain=challenger is None)
+        if report.errors:
+            raise RuntimeError(f'warm-up failed: {report.errors}')
+        if challenger is not None:
+            challenger = Challenger(bundle, MODELS.current.version, threshold=THRESHOLD,
+                                    window=SHADOW_WINDOW, **challenger)
+    except Exception as e:
+        MODEL_RELOADS.inc(status='failed')
+        MODELS.finish_reload('failed', error=f'{type(e).__name__}: {e}', phases_ms=report.phases)
+        print(f'Model reload of {version!r} failed:', e)
+        return
+    if challenger is not None:
+        old, MODELS.challenger = MODELS.challenger, challenger
+        MODEL_RELOADS.inc(status='done')
+        MODELS.finish_reload('done', phases_ms=report.phases, replaced=old.bundle.version if old else None)
+        print(f'Shadowing with model {bundle.version} ({challenger.mode}, {challenger.percent}%)')
+        return
+    old = MODELS.swap(bundle)
+    if old.model_sha256 != bundle.model_sha256:
+        # Keys include the model hash, so old entries can no longer be hit; drop
+        # them to free memory. Requests still running on the old bundle may add
+        # a few more, which age out like any other entry.
+        PREDICT_CACHE.clear()
+        if EXPLAIN_CACHE:
+            try:
+                EXPLAIN_CACHE.purge(keep_model_hash=bundle.model_sha256)
+            except Exception as e:
+                print('Explanation cache not purged:', e)
+    if activate:
+        set_current(MODEL_REGISTRY_DIR, version)
+    MODEL_RELOADS.inc(status='done')
+    MODELS.finish_reload('done', phases_ms=report.phases, replaced=old.version)
+    print(f'Serving model {bundle.version} (was {old.version}):', report.phases)
+
+def _start_reload(version, activate=False, challenger=None):
+    """Reload on a background thread; False when a reload is already running."""
+    if not MODELS.begin_reload(version, 'primary' if challenger is None else 'challenger'):
+        return False
+    threading.Thread(target=_reload_model, args=(version, activate, challenger), name='model-reload',
+                     daemon=True).start()
+    return True
+
+def _watch_registry(stop):
+    """Follow the registry's CURRENT: every worker polls, so one publish reaches them all."""
+    while not stop.wait(MODEL_WATCH_SECONDS):
+        version = current_version(MODEL_REGISTRY_DIR)
+        last = MODELS.reload or {}
+        if version is None or version == MODELS.current.version:
+            continue
+        if last.get('version') == version and last.get('target') == 'primary' and last.get('status') == 'failed':
+            continue  # not retried until CURRENT changes again or an admin reloads it
+        _start_reload(version)
+
+def require_admin(x_admin_token: str = Header('')):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail={'error': 'admin endpoints are disabled (set ADMIN_TOKEN)'})
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail={'error': 'invalid admin token'})
+
+class ReloadInput(BaseModel):
+    version: str | None = None  # default: the registry's CURRENT
+    activate: bool = False  # also make it CURRENT once it is serving, for watchers and restarts
+
+@app.get('/admin/models', dependencies=[Depends(require_admin)])
+def model_versions():
+    """The version being served, the registry's versions and the last reload."""
+    return {
+        'serving': MODELS.current.describe(),
+        'registry': MODEL_REGISTRY_DIR,
+        'current': current_version(MODEL_REGISTRY_DIR),
+        'versions': [{k: m.get(k) for k in ('version', 'created', 'model_sha256', 'metrics')}
+                     for m in list_versions(MODEL_REGISTRY_DIR)],
+        'reload': MODELS.reload
+    }
+
+@app.post('/admin/models/reload', status_code=202, dependencies=[Depends(require_admin)])
+def reload_model(inp: ReloadInput | None = None):
+    """Load and warm a registry version in the background, then swap it in.
+
+    Requests already running finish on the model they started with."""
+    inp = inp or ReloadInput()
+    version = inp.version or current_version(MODEL_REGISTRY_DIR)
+    if version is None:
+        raise HTTPException(status_code=404, detail={'error': f'{MODEL_REGISTRY_DIR} has no CURRENT version; give one'})
+    try:
+        resolve(MODEL_REGISTRY_DIR, version)
+    except (LookupError, ValueError) as e:
+        raise HTTPException(status_code=404, detail={'error': str(e)})
+    if not _start_reload(version, inp.activate):
+        raise HTTPException(status_code=409, detail={'error': 'a model reload is already running'})
+    return {'status': 'loading', 'version': version, 'poll': '/admin/models'}
+
+# A challenger version is scored in the shadow of every /predict (off the
+# response path) and, in 'ab' mode, answers CHALLENGER_PERCENT of them
+CHALLENGER_VERSION = os.environ.get('CHALLENGER_VERSION', '')
+CHALLENGER_MODE = os.environ.get('CHALLENGER_MODE', 'shadow')
+CHALLENGER_PERCENT = float(os.environ.get('CHALLENGER_PERCENT', '0'))
+SHADOW_WINDOW = int(os.environ.get('SHADOW_WINDOW', '10000'))  # rows behind the delta/latency percentiles
+SHADOW_POOL = ShadowPool(workers=int(os.environ.get('SHADOW_WORKERS', '1')),
+                         max_pending=int(os.environ.get('SHADOW_MAX_PENDING', '256')))
+SHADOW_SECONDS = METRICS.histogram('heart_api_shadow_model_seconds', 'predict_proba latency on compared rows',
+                                   ('role',))
+SHADOW_ROWS = METRICS.counter('heart_api_shadow_rows_total', 'Shadow-compared rows by outcome', ('outcome',))
+
+class ChallengerInput(BaseModel):
+    version: str
+    mode: Literal['shadow', 'ab'] = 'shadow'
+    percent: float = Field(0.0, ge=0, le=100)  # share of /predict answered by the challenger in 'ab' mode
+
+@app.put('/admin/models/challenger', status_code=202, dependencies=[Depends(require_admin)])
+def set_challenger(inp: ChallengerInput, response: Response):
+    """Load ``version`` as the challenger in the background, or re-route the loaded one."""
+    challenger = MODELS.challenger
+    if challenger is not None and challenger.bundle.version == inp.version:
+        challenger.mode, challenger.percent = inp.mode, inp.percent
+        response.status_code = 200
+        return {'status': 'updated', 'challenger': challenger.as_dict()}
+    try:
+        resolve(MODEL_REGISTRY_DIR, inp.version)
+    except (LookupError, ValueError) as e:
+        raise HTTPException(status_code=404, detail={'error': str(e)})
+    if not _start_reload(inp.version, challenger={'mode': inp.mode, 'percent': inp.percent}):
+        raise HTTPException(status_code=409, detail={'error': 'a model reload is already running'})
+    return {'status': 'loading', 'version': inp.version, 'poll': '/admin/models'}
+
+@app.delete('/admin/models/challenger', dependencies=[Depends(require_admin)])
+def remove_challenger():
+    """Stop shadowing; returns the final comparison."""
+    challenger, MODELS.challenger = MODELS.challenger, None
+    if challenger is None:
+        raise HTTPException(status_code=404, detail={'error': 'no challenger is loaded'})
+    return {'removed': challenger.as_dict()}
+
+@app.get('/shadow/stats')
+def shadow_stats():
+    """Agreement, probability deltas and latency of the challenger against the primary."""
+    challenger = MODELS.challenger
+    return {'primary': MODELS.current.version, 'challenger': challenger.as_dict() if challenger else None}
+
+@app.get('/global_importance')
+def global_importance():
+    """Mean |SHAP|, dependence curves and interaction strengths over the
+    training set, computed by train.py; served as stored, no model work."""
+    bundle = MODELS.current
+    if bundle.global_importance is None:
+        raise HTTPException(status_code=404, detail={'error': 'no global explanation for this model; run train/train.py'})
+    return Response(bundle.global_importance, media_type='application/json',
+                    headers={'ETag': f'"{bundle.model_sha256[:16]}"', 'Cache-Control': 'public, max-age=3600'})
+
 @app.post('/predict')
-def predict(inp: PatientInput):
+def predict(inp: PatientInput, request: Request, profile: bool = False, compact: bool = COMPACT_RESPONSES):
+    prof = _profile_requested(request, profile)
+    # A profiled request must do the work on its own thread, so it bypasses the cache and batching
+    out = _run_profiled('predict', prof, _predict, inp, not prof, not prof)
+    return FastJSONResponse(_without_static(out) if compact else out)
+
+def _predict(inp, use_cache=True, batch=True):
+    primary, challenger = MODELS.current, MODELS.challenger
     try:
-        x_df = inp.as_dataframe()
-        proba = model.predict_proba(x_df)[0, 1]
-        pred = int(proba >= 0.5)
-        return {
-            'prediction': pred,
-            'probability': float(proba),
-            'threshold': 0.5,
-            'features_used': FEATURES
-        }
+        with _stage('decode'):
+            x = inp.as_array()
+        bundle = primary
+        if challenger is not None and challenger.routes(row_key(None, x[0])[1]):
+            bundle = challenger.bundle
+        out, seconds = _predict_row(bundle, x, use_cache, batch)
     except Exception as e:
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail={'error': str(e), 'trace': tb})
-
-@lru_cache(maxsize=1)
-def _lime_explainer(bg_data, feature_names, class_names=('no','yes')):
-    from lime.lime_tabular import LimeTabularExplainer
-    return LimeTabularExplainer(
-        bg_data,
-        feature_names=feature_names,
-        discretize_continuous=True,
-        mode='classification',
-        class_names=class_names
-    )
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail={'error': str(e)})
+    if challenger is not None:
+        _shadow(primary, challenger, bundle, x, out['probability'], seconds)
+    return out
+
+def _predict_row(bundle, x, use_cache, batch=True):
+    """(response, seconds) for one decoded row; seconds is None when no model ran."""
+    if bundle.lookup is not None:
+        proba, covered = bundle.lookup.lookup(x)
+        if covered[0]:
+            proba = float(proba[0])
+            return {
+                'prediction': int(proba >= THRESHOLD),
+                'probability': proba,
+                'threshold': THRESHOLD,
+                'features_used': FEATURES,
+                'engine': bundle.lookup.name,
+                'model_version': bundle.version,
+                'cached': False,
+                # Measured by build_lookup.py on random off-grid rows, not a proof
+                'quantization': bundle.lookup.error.get('random')
+            }, None
+    key = row_key(bundle.model_sha256, x[0])
+    proba = PREDICT_CACHE.get(key) if use_cache else None
+    cached = proba is not None
+    seconds = None
+    if not cached:
+        t0 = time.perf_counter()
+        if BATCHER is not None and batch:
+            proba = float(BATCHER.submit(bundle, x[0], partial(_score, bundle)))
+        else:
+            proba = float(_score(bundle, x)[0])
+        seconds = time.perf_counter() - t0
+        PREDICT_CACHE.put(key, proba)
+    pred = int(proba >= THRESHOLD)
+    return {
+        'prediction': pred,
+        'probability': proba,
+        'threshold': THRESHOLD,
+        'features_used': FEATURES,
+        'engine': bundle.engine.name,
+        'model_version': bundle.version,
+        'cached': cached
+    }, seconds
+
+def _shadow(primary, challenger, served, x, proba, seconds):
+    """Score ``x`` on the shadow pool with whichever model did not answer and compare."""
+    role, other_role, other = (('primary', 'challenger', challenger.bundle) if served is primary
+                               else ('challenger', 'primary', primary))
+    stats = challenger.stats_for(primary.version)
+
+    def run():
+        t0 = time.perf_counter()
+        try:
+            with SCHEDULER.slot(len(x)):
+                other_proba = float(other.engine.predict_proba(x)[0, 1])
+        except Exception as e:
+            stats.count('errors')
+            SHADOW_ROWS.inc(outcome='error')
+            print(f'Shadow scoring with {other.version} failed:', e)
+            return
+        timings = {role: seconds, other_role: time.perf_counter() - t0}
+        probas = {role: proba, other_role: other_proba}
+        stats.record(probas, timings, served=role)
+        for r, s in timings.items():
+            if s is not None:
+                SHADOW_SECONDS.observe(s, role=r)
+        agree = (probas['primary'] >= THRESHOLD) == (probas['challenger'] >= THRESHOLD)
+        SHADOW_ROWS.inc(outcome='agree' if agree else 'disagree')
+
+    if not SHADOW_POOL.submit(run):
+        stats.count('dropped')
+        SHADOW_ROWS.inc(outcome='dropped')
+
+def _check_batch_size(n):
+    if n > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail={'error': f'batch of {n} rows exceeds MAX_BATCH_SIZE={MAX_BATCH_SIZE}'})
+
+def _score_batch(bundle, X, errors):
+    """Score the decodable rows of X in one call; returns (proba, ok)."""
+    ok = np.ones(len(X), dtype=bool)
+    ok[list(errors)] = False
+    proba = np.full(len(X), np.nan)
+    try:
+        if ok.any():
+            proba[ok] = _score(bundle, X[ok])
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail={'error': str(e)})
+    return proba, ok
+
+def _batch_response(bundle, proba, ok, errors, accept=None, compact=False):
+    """Batch results in the format negotiated from ``accept`` (JSON by default).
+
+    Arrow gets columns plus the scalar fields as schema metadata; JSON and
+    MessagePack get the same document."""
+    fmt = wire.response_format(accept)
+    meta = {
+        'n_scored': int(ok.sum()),
+        'n_errors': len(errors),
+        'threshold': THRESHOLD,
+        'engine': bundle.engine.name,
+        'model_version': bundle.version
+    }
+    with _stage('encode'):
+        if fmt == 'arrow':
+            return Response(wire.encode_arrow(meta, proba, ok, errors, THRESHOLD), media_type=wire.ARROW_TYPE)
+        results = []
+        for i in range(len(ok)):
+            if ok[i]:
+                results.append({'index': i, 'prediction': int(proba[i] >= THRESHOLD), 'probability': float(proba[i])})
+            else:
+                results.append({'index': i, 'error': errors[i]})
+        out = {'results': results, **meta, 'features_used': FEATURES}
+        out = _without_static(out) if compact else out
+        if fmt == 'msgpack':
+            return Response(wire.encode_msgpack(out), media_type=wire.MSGPACK_TYPE)
+        return FastJSONResponse(out)
+
+@app.post('/predict_batch')
+def predict_batch(inp: BatchInput, request: Request, compact: bool = COMPACT_RESPONSES):
+    """Score many payloads with a single predict_proba call.
+
+    Rows that cannot be decoded are reported individually and skipped; the
+    remaining rows are stacked into one matrix ordered by FEATURES. The
+    response is JSON, or Arrow IPC / MessagePack when the Accept header asks."""
+    _check_batch_size(len(inp.payloads))
+    bundle = MODELS.current
+    with _stage('decode'):
+        X, errors = DECODER.decode_many(inp.payloads)
+    proba, ok = _score_batch(bundle, X, errors)
+    return _batch_response(bundle, proba, ok, errors, request.headers.get('accept'), compact)
+
+# Binary bodies are refused before they are read (Content-Length) or while
+# reading, so an oversized upload is never buffered or decoded
+MAX_MATRIX_BODY_BYTES = int(os.environ.get('MAX_MATRIX_BODY_BYTES',
+                                           str(wire.max_body_bytes(MAX_BATCH_SIZE, len(FEATURES)))))
+
+def _body_too_large():
+    return HTTPException(status_code=413, detail={'error': f'body exceeds MAX_MATRIX_BODY_BYTES={MAX_MATRIX_BODY_BYTES}'})
+
+async def _read_capped(request):
+    try:
+        declared = int(request.headers.get('content-length', '0'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail={'error': 'invalid Content-Length'})
+    if declared > MAX_MATRIX_BODY_BYTES:
+        raise _body_too_large()
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_MATRIX_BODY_BYTES:
+            raise _body_too_large()
+    return bytes(body)
+
+def _predict_matrix(fmt, body, accept, compact):
+    bundle = MODELS.current
+    with _stage('decode'):
+        try:
+            X, errors = wire.decode(fmt, body, FEATURES, max_rows=MAX_BATCH_SIZE)
+        except wire.BatchTooLarge as e:
+            raise HTTPException(status_code=413, detail={'error': str(e)})
+        except Exception as e:
+            raise HTTPException(status_code=400, detail={'error': f'invalid {fmt} body: {e}'})
+    proba, ok = _score_batch(bundle, X, errors)
+    return _batch_response(bundle, proba, ok, errors, accept, compact)
+
+@app.post('/predict_batch/matrix')
+async def predict_batch_matrix(request: Request, compact: bool = COMPACT_RESPONSES):
+    """/predict_batch for feature matrices sent as Arrow IPC or MessagePack.
+
+    Arrow: a stream of columns named as in FEATURES (Content-Type
+    application/vnd.apache.arrow.stream). MessagePack: {"columns": [...],
+    "rows": [[...], ...]} (Content-Type application/msgpack). Columns go
+    straight into the float64 model input without per-row dicts; the
+    response format follows the Accept header as for /predict_batch."""
+    fmt = wire.request_format(request.headers.get('content-type'))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail={'error': f'expected one of {wire.ARROW_TYPES + wire.MSGPACK_TYPES}; send JSON to /predict_batch'})
+    if not wire.available(fmt):
+        raise HTTPException(status_code=415, detail={'error': f'{fmt} support is not installed on this server'})
+    body = await _read_capped(request)
+    return await run_in_threadpool(_predict_matrix, fmt, body, request.headers.get('accept'), compact)
+
+@app.post('/what_if')
+def what_if(inp: WhatIfInput):
+    """Risk over a grid of one or two features, all other inputs fixed at ``payload``.
+
+    The whole grid is one (n_points, n_features) matrix scored by a single
+    engine call; ``probability`` is a curve for one axis or a
+    len(axes[0]) x len(axes[1]) surface for two."""
+    t0 = time.perf_counter()
+    bundle = MODELS.current
+    grids = [axis.grid() for axis in inp.axes]
+    n_points = int(np.prod([len(g) for g in grids]))
+    if n_points > WHAT_IF_MAX_POINTS:
+        raise HTTPException(status_code=413, detail={'error': f'{n_points} grid points exceed WHAT_IF_MAX_POINTS={WHAT_IF_MAX_POINTS}'})
+    base = DECODER.fill(inp.payload, DECODER.empty())
+    X = np.repeat(base, n_points + 1, axis=0)  # last row: the unmodified payload
+    for axis, values in zip(inp.axes, np.meshgrid(*grids, indexing='ij')):
+        X[:n_points, FEATURES.index(axis.feature)] = values.ravel()
+    try:
+        proba = _score(bundle, X)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail={'error': str(e)})
+    return FastJSONResponse({
+        'features': [a.feature for a in inp.axes],
+        'grid': [g.tolist() for g in grids],
+        'probability': proba[:n_points].reshape([len(g) for g in grids]).tolist(),
+        'baseline': {'probability': float(proba[-1]),
+                     'values': {a.feature: inp.payload.get(a.feature) for a in inp.axes}},
+        'threshold': THRESHOLD,
+        'n_points': n_points,
+        'engine': bundle.engine.name,
+        'model_version': bundle.version,
+        'cost_ms': {'total': (time.perf_counter() - t0) * 1000}
+    })
+
+@app.post('/predict_stream')
+async def predict_stream(request: Request, chunk_rows: int = STREAM_CHUNK_ROWS):
+    """Score a CSV (data/heart.csv columns) or NDJSON upload as it arrives.
+
+    Results stream back as NDJSON, one line per input row in order, followed
+    by a summary line. Memory stays bounded by ``chunk_rows``."""
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if content_type in CSV_TYPES:
+        fmt = 'csv'
+    elif content_type in NDJSON_TYPES:
+        fmt = 'ndjson'
+    else:
+        raise HTTPException(status_code=415, detail={'error': f'expected one of {CSV_TYPES + NDJSON_TYPES}'})
+    scorer = StreamScorer(DECODER, partial(_score, MODELS.current), THRESHOLD, chunk_rows=min(max(1, chunk_rows), MAX_BATCH_SIZE))
+    return ScoreStreamResponse(scorer, fmt)
+
+EXPLAIN_METHODS = ('shap', 'lime')
+EXPLAIN_MAX_TOP_K = int(os.environ.get('EXPLAIN_MAX_TOP_K', '50'))
+LIME_MAX_SAMPLES = int(os.environ.get('LIME_MAX_SAMPLES', '5000'))
+
+def _explain_params(methods=EXPLAIN_METHODS, top_k=10, num_samples=100, seed=None):
+    """Explainer settings that change the result; they are also the cache key.
+
+    LIME settings are left out when LIME is not requested so SHAP-only
+    results are shared across them."""
+    if isinstance(methods, str):
+        methods = [m.strip() for m in methods.split(',') if m.strip()]
+    unknown = sorted(set(methods) - set(EXPLAIN_METHODS))
+    if unknown or not methods:
+        raise HTTPException(status_code=400, detail={'error': f'methods must be a subset of {EXPLAIN_METHODS}, got {unknown or "none"}'})
+    params = {'methods': [m for m in EXPLAIN_METHODS if m in methods], 'top_k': top_k}
+    if 'lime' in methods:
+        params.update(lime_num_samples=num_samples, lime_seed=seed, lime_background='training_stats')
+    return params
+
+def explain_options(
+    top_k: int = Query(10, ge=1, le=EXPLAIN_MAX_TOP_K, description='features returned per method'),
+    num_samples: int = Query(100, ge=10, le=LIME_MAX_SAMPLES, description='LIME perturbations (model rows scored)'),
+    seed: int | None = Query(None, ge=0, description='LIME sampling seed; omit for a random one')
+):
+    return {'top_k': top_k, 'num_samples': num_samples, 'seed': seed}
 
 @app.post('/explain')
-def explain(inp: PatientInput):
-    out = {'shap': None, 'lime': None}
-    # SHAP
+def explain(inp: PatientInput, request: Request, methods: str = ','.join(EXPLAIN_METHODS),
+            options: dict = Depends(explain_options), profile: bool = False, compact: bool = COMPACT_RESPONSES):
+    """Explanations for one patient. ``methods`` is a comma-separated subset of
+    shap,lime; ``cost_ms`` reports what this response took per method."""
+    params = _explain_params(methods, **options)
+    prof = _profile_requested(request, profile)
+    out = _run_profiled('explain', prof, _explain, inp, params, not prof)
+    return FastJSONResponse(compact_explanation(out, EXPLAIN_DIGITS) if compact else out)
+
+@app.post('/explain/shap')
+def explain_shap(inp: PatientInput, request: Request, options: dict = Depends(explain_options),
+                 profile: bool = False, compact: bool = COMPACT_RESPONSES):
+    """SHAP only: a few ms per patient."""
+    return explain(inp, request, 'shap', options, profile, compact)
+
+@app.post('/explain/lime')
+def explain_lime(inp: PatientInput, request: Request, options: dict = Depends(explain_options),
+                 profile: bool = False, compact: bool = COMPACT_RESPONSES):
+    """LIME only; cost grows with ``num_samples``."""
+    return explain(inp, request, 'lime', options, profile, compact)
+
+@app.post('/explain/stream')
+def explain_stream(inp: PatientInput, methods: str = ','.join(EXPLAIN_METHODS),
+                   options: dict = Depends(explain_options), compact: bool = COMPACT_RESPONSES):
+    """/explain as Server-Sent Events, one per stage as soon as it finishes.
+
+    Events arrive in order: ``prediction``, then one per requested method
+    (``shap``, ``lime``; each carries the top-k list or ``<method>_error``),
+    then ``timings``. A failed prediction ends the stream with ``error``."""
+    params = _explain_params(methods, **options)
+    return StreamingResponse(_explain_events(MODELS.current, inp, params, compact),
+                             media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _explain_events(bundle, inp, params, compact):
+    t0 = time.perf_counter()
     try:
-        import shap
-        pre = model.named_steps['preproc']
-        rf = model.named_steps['rf']
-        x_pp = pre.transform(inp.as_dataframe())
-        # ensure dense
-        if hasattr(x_pp, 'toarray'):
-            x_pp_dense = x_pp.toarray()
-        else:
-            x_pp_dense = np.asarray(x_pp)
-        
-        # Use default TreeExplainer (fastest and most stable)
-        explainer = shap.TreeExplainer(rf)
-        sv_all = explainer.shap_values(x_pp_dense)
+        with _stage('decode'):
+            x = inp.as_array()
+        pred, _ = _predict_row(bundle, x, use_cache=True)
+    except Exception as e:
+        traceback.print_exc()
+        yield sse_event('error', {'error': str(e)})
+        return
+    yield sse_event('prediction', _without_static(pred) if compact else pred)
+    cost = {'prediction': (time.perf_counter() - t0) * 1000}
+
+    key, cached, tier = _cached_explanation(bundle, inp, params)
+    if cached is not None:
+        stages = ((name, cached, None) for name in params['methods'])
+    else:
+        stages = _iter_explanation(bundle, inp, params)
+    for name, out, seconds in stages:
+        event = {k: out[k] for k in (name, f'{name}_error', f'{name}_cached') if k in out}
+        yield sse_event(name, compact_explanation(event, EXPLAIN_DIGITS) if compact else event)
+        if seconds is not None:
+            cost[name] = seconds * 1000
+    if cached is None:
+        _store_explanation(bundle, key, out)
+    cost['total'] = (time.perf_counter() - t0) * 1000
+    yield sse_event('timings', {'cost_ms': cost, 'cache': tier or 'miss', 'params': params,
+                                'model_version': bundle.version})
+
+def _explain(inp, params, use_cache=True):
+    t0 = time.perf_counter()
+    bundle = MODELS.current
+    key, cached, tier = _cached_explanation(bundle, inp, params)
+    if cached is not None and use_cache:
+        return dict(cached, cache=tier, cost_ms={'total': (time.perf_counter() - t0) * 1000})
+    out = _compute_explanation(bundle, inp, params)
+    _store_explanation(bundle, key, out)
+    return dict(out, cache='miss')
+
+def _compute_explanation(bundle, inp, params, on_stage=None):
+    """Run the requested explanation stages in order; on_stage(name, out, seconds)
+    is called after each one so callers can publish partial results."""
+    for name, out, seconds in _iter_explanation(bundle, inp, params):
+        if on_stage is not None:
+            on_stage(name, out, seconds)
+    return out
+
+def _iter_explanation(bundle, inp, params):
+    """Yield (stage name, snapshot of the result so far, seconds) as each requested stage finishes."""
+    out = {name: None for name in params['methods']}
+    if 'shap' in params['methods']:
+        out['shap_cached'] = bundle.shap_explainer()[1]
+    out['params'] = params
+    out['cost_ms'] = cost = {}
+    t_start = time.perf_counter()
+    for name, stage in EXPLAIN_STAGES:
+        if name not in params['methods']:
+            continue
+        t0 = time.perf_counter()
+        stage(bundle, inp, out, params)
+        seconds = time.perf_counter() - t0
+        cost[name] = seconds * 1000
+        cost['total'] = (time.perf_counter() - t_start) * 1000
+        # A snapshot: consumers on other threads must not see later stages' timings
+        yield name, dict(out, cost_ms=dict(cost)), seconds
+
+def _explain_shap(bundle, inp, out, params):
+    try:
+        explainer = bundle.shap_explainer()[0]
+        if explainer is None:
+            raise RuntimeError('SHAP explainer is not available')
+        with _stage('shap_transform'):
+            x_pp = bundle.transform(inp.as_array())
         
-        # Handle different return formats
-        if isinstance(sv_all, list) and len(sv_all) == 2:
-            # Binary classification: [class_0_shap, class_1_shap]
-            sv = sv_all[1]  # positive class
-        elif isinstance(sv_all, np.ndarray) and sv_all.ndim == 3:
-            # Shape: (n_samples, n_features, n_classes)
-            sv = sv_all[0, :, 1]  # first sample, all features, positive class
-        elif isinstance(sv_all, np.ndarray) and sv_all.ndim == 2:
-            # Shape: (n_samples, n_features) - single output
-            sv = sv_all[0, :]
-        else:
-            sv = np.asarray(sv_all).flatten()
+        # Long-lived TreeExplainer built/validated at startup
+        with _stage('shap_values'):
+            sv_all = explainer.shap_values(x_pp)
         
-        # Safe conversion
-        flat_values = np.asarray(sv).flatten().astype(float)
-        names = list(pre.get_feature_names_out())
+        # Positive-class contributions of the single row, whatever shap version returned
+        flat_values = positive_class(sv_all)[0]
+        with _stage('feature_names'):
+            names = list(bundle.explained_features)
         
         # Defensive alignment
         m = min(len(names), len(flat_values))
         pairs = list(zip(names[:m], flat_values[:m]))
-        top = sorted(pairs, key=lambda t: abs(t[1]), reverse=True)[:10]
+        top = sorted(pairs, key=lambda t: abs(t[1]), reverse=True)[:params['top_k']]
         out['shap'] = [{'feature': n, 'contribution': float(v)} for n, v in top]
     except Exception as e:
-        import traceback
-        out['shap_error'] = f"{str(e)}\n{traceback.format_exc()}"
+        # The traceback goes to the server log, not to clients
+        traceback.print_exc()
+        out['shap_error'] = f'{type(e).__name__}: {e}'
+
+MAX_SHAP_BATCH_SIZE = int(os.environ.get('MAX_SHAP_BATCH_SIZE', '5000'))
+SHAP_CHUNK_ROWS = int(os.environ.get('SHAP_CHUNK_ROWS', '256'))
+
+@app.post('/explain/shap/batch')
+def explain_shap_batch(inp: BatchInput, compact: bool = COMPACT_RESPONSES):
+    """Exact TreeSHAP for a cohort: an (n_rows x n_features) contribution matrix.
 
-    # LIME
+    Rows are preprocessed and explained SHAP_CHUNK_ROWS at a time. Each row's
+    contributions plus ``expected_value`` sum to its predicted probability.
+    Rows that fail validation get ``null`` values and an entry in ``errors``."""
+    n = len(inp.payloads)
+    if n > MAX_SHAP_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail={'error': f'batch of {n} rows exceeds MAX_SHAP_BATCH_SIZE={MAX_SHAP_BATCH_SIZE}'})
+    bundle = MODELS.current
+    explainer = bundle.shap_explainer()[0]
+    if explainer is None:
+        raise HTTPException(status_code=503, detail={'error': 'SHAP explainer is not available'})
+    t0 = time.perf_counter()
+    with _stage('decode'):
+        X, errors = DECODER.decode_many(inp.payloads)
+    ok = np.array([i not in errors for i in range(n)], dtype=bool)
+    values = [None] * n
+    rows = np.flatnonzero(ok)
     try:
-        pre = model.named_steps['preproc']
-        rf = model.named_steps['rf']
-        x0_sparse = pre.transform(inp.as_dataframe())
-        if hasattr(x0_sparse, 'toarray'):
-            x0 = x0_sparse.toarray()
-        else:
-            x0 = np.asarray(x0_sparse)
-        
-        # Ensure float type and 2D shape
-        x0 = x0.astype(float)
-        
-        # Simplified background: use small sample
-        bg_data = np.tile(x0, (50, 1))  # Reduced from 200 for speed
-        feature_names = list(pre.get_feature_names_out())
-        
-        # Build LIME explainer with simpler settings
-        from lime.lime_tabular import LimeTabularExplainer
-        lime_exp = LimeTabularExplainer(
-            bg_data,
-            feature_names=feature_names,
-            discretize_continuous=False,  # Faster
-            mode='classification',
-            class_names=['No Disease', 'Disease']
-        )
-        
+        with _stage('shap_batch'):
+            for start, chunk in iter_shap_chunks(explainer, X[rows], SHAP_CHUNK_ROWS, bundle.transform):
+                if compact:
+                    chunk = chunk.round(EXPLAIN_DIGITS)
+                for i, contrib in zip(rows[start:start + len(chunk)], chunk.tolist()):
+                    values[i] = contrib
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail={'error': str(e)})
+    return FastJSONResponse({
+        'features': [short_name(f) if compact else str(f) for f in bundle.explained_features],
+        'expected_value': expected_value(explainer),
+        'values': values,
+        'errors': {str(i): msg for i, msg in errors.items()},
+        'n_explained': int(ok.sum()),
+        'cost_ms': {'total': (time.perf_counter() - t0) * 1000}
+    })
+
+def _explain_lime(bundle, inp, out, params):
+    try:
+        with _stage('lime_transform'):
+            x0 = bundle.transform(inp.as_array())
+
         def predict_fn(z):
-            proba = rf.predict_proba(z)[:, 1]
+            with SCHEDULER.slot(len(z)):
+                proba = bundle.predict_preprocessed(z)
             return np.column_stack([1 - proba, proba])
-        
-        exp = lime_exp.explain_instance(
-            x0[0], 
-            predict_fn, 
-            num_features=10,
-            num_samples=100  # Reduced from default 5000 for speed
-        )
-        out['lime'] = [{'feature': str(f), 'weight': float(w)} for f, w in exp.as_list()]
+
+        # lime_explain = lime_sample + lime_predict + lime_fit
+        with _stage('lime_explain'):
+            weights = bundle.lime.explain(x0[0], predict_fn, num_features=params['top_k'],
+                                          num_samples=params['lime_num_samples'], seed=params['lime_seed'],
+                                          timer=_stage)
+        out['lime'] = [{'feature': f, 'weight': w} for f, w in weights]
     except Exception as e:
-        import traceback
-        out['lime_error'] = f"{str(e)}\n{traceback.format_exc()}"
+        traceback.print_exc()
+        out['lime_error'] = f'{type(e).__name__}: {e}'
 
-    return out
+# SHAP is cheap and runs first so job pollers see it before LIME finishes
+EXPLAIN_STAGES = (('shap', _explain_shap), ('lime', _explain_lime))
+
+def _cached_explanation(bundle, inp, params):
+    """Return (cache_key, cached_result, tier); key is None when caching is off."""
+    if not EXPLAIN_CACHE:
+        return None, None, None
+    key = EXPLAIN_CACHE.key(bundle.model_sha256, inp.as_array()[0], params)
+    cached, tier = EXPLAIN_CACHE.get(key)
+    return key, cached, tier
+
+def _store_explanation(bundle, key, out):
+    # Failed explanations are retried on the next call rather than cached
+    if key is not None and 'shap_error' not in out and 'lime_error' not in out:
+        EXPLAIN_CACHE.put(key, bundle.model_sha256, out)
+
+def _run_explain_job(job, inp, params):
+    bundle = MODELS.current
+    key, cached, tier = _cached_explanation(bundle, inp, params)
+    if cached is not None:
+        job.update('cache', dict(cached, cache=tier), 0.0)
+        return
+    def publish(name, out, seconds):
+        job.update(name, dict(out, cache='miss'), seconds)
+    out = _compute_explanation(bundle, inp, params, on_stage=publish)
+    _store_explanation(bundle, key, out)
+    failed = [name for name in params['methods'] if f'{name}_error' in out]
+    if failed:
+        job.error = f"stages failed: {', '.join(failed)}"
+        return 'failed' if len(failed) == len(params['methods']) else 'partial'
+
+@app.post('/explain/jobs', status_code=202)
+def submit_explain_job(inp: PatientInput, methods: str = ','.join(EXPLAIN_METHODS),
+                       options: dict = Depends(explain_options)):
+    """Queue an explanation on the bounded job pool and return its id immediately."""
+    params = _explain_params(methods, **options)
+    try:
+        job = EXPLAIN_JOBS.submit(_run_explain_job, inp, params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail={'error': str(e)})
+    return {'job_id': job.id, 'status': job.status, 'poll': f'/explain/jobs/{job.id}'}
+
+@app.get('/explain/jobs')
+def explain_job_stats():
+    return EXPLAIN_JOBS.stats()
+
+@app.get('/explain/jobs/{job_id}')
+def get_explain_job(job_id: str):
+    job = EXPLAIN_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail={'error': f'unknown or expired job {job_id}'})
+    return job.as_dict()
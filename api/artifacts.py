@@ -0,0 +1,98 @@
+# api/artifacts.py
+"""Memory-mappable model artifacts shared by all workers on a host.
+
+A shared artifact directory holds one ``.npy`` file per array plus a
+``manifest.json``. Workers open the arrays with ``mmap_mode='r'`` so the
+operating system keeps a single page-cache copy no matter how many uvicorn
+workers are running.
+
+Only the compiled forest is shared. It also carries the imputation and
+scaling, so a worker serving it preprocesses rows for SHAP/LIME from the same
+arrays and never loads models/model.joblib. With the default sklearn engine
+every worker holds its own copy of the pipeline.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from api.inference import CompiledForest
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+def export_shared(out_dir, forest, model_sha256):
+    """Write ``forest``'s arrays as .npy files plus a manifest."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    arrays = {name: getattr(forest, name) for name in CompiledForest.ARRAYS}
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model_sha256': model_sha256,
+        'max_depth': forest.max_depth,
+        'arrays': {}
+    }
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        tmp = out_dir / f'.{name}.npy.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, arr)
+        os.replace(tmp, out_dir / f'{name}.npy')
+        manifest['arrays'][name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape)}
+    # Manifest goes last so readers never see a half-written directory as valid
+    tmp = out_dir / f'.{MANIFEST}.tmp'
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, out_dir / MANIFEST)
+    return manifest
+
+
+def load_shared(out_dir, model_sha256=None, mmap_mode='r'):
+    """Return (forest, manifest) with the forest backed by memory-mapped arrays.
+
+    Raises FileNotFoundError when the directory has no manifest and ValueError
+    when it was exported for a different model.joblib."""
+    out_dir = Path(out_dir)
+    manifest = json.loads((out_dir / MANIFEST).read_text())
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"unsupported shared artifact format {manifest.get('format_version')!r}")
+    if model_sha256 is not None and manifest.get('model_sha256') != model_sha256:
+        raise ValueError('shared artifacts were exported for a different model')
+    # Extra arrays (e.g. a SHAP background from older exports) are ignored
+    arrays = {name: np.load(out_dir / f'{name}.npy', mmap_mode=mmap_mode)
+              for name in manifest['arrays'] if name in CompiledForest.ARRAYS}
+    forest = CompiledForest(max_depth=manifest['max_depth'], **arrays)
+    return forest, manifest
+
+
+def memory_report():
+    """Resident and shared memory of this process in MiB (Linux /proc only).
+
+    ``shared`` counts file-backed and shmem pages, which is where memory-mapped
+    artifacts live; ``pss`` splits shared pages evenly across the processes
+    mapping them, so summing it over workers gives real host usage."""
+    fields = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'RssAnon', 'RssFile', 'RssShmem'):
+                    fields[key] = int(value.split()[0]) / 1024
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key == 'Pss':
+                    fields['Pss'] = int(value.split()[0]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    if 'VmRSS' not in fields:
+        return {'pid': os.getpid(), 'available': False}
+    return {
+        'pid': os.getpid(),
+        'available': True,
+        'rss_mib': round(fields['VmRSS'], 1),
+        'anon_mib': round(fields.get('RssAnon', 0.0), 1),
+        'shared_mib': round(fields.get('RssFile', 0.0) + fields.get('RssShmem', 0.0), 1),
+        'pss_mib': round(fields['Pss'], 1) if 'Pss' in fields else None
+    }
@@ -0,0 +1,107 @@
+# api/batching.py
+"""Micro-batching of concurrent single-row predictions.
+
+Each predict_proba call has a fixed cost (input validation, joblib dispatch,
+one pass over 400 trees' Python objects) that dwarfs the per-row work, so
+rows arriving within a few milliseconds of each other are scored together.
+
+The first caller to find no batch forming becomes its leader: it waits up
+to ``window`` seconds, or until ``max_batch`` rows are queued, then takes the
+queued rows and scores them in one call per model. Other callers just block
+until their row is scored. Rows left over after a full batch are handed to a
+new leader from among their callers, so no extra thread is needed.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class _Pending:
+    __slots__ = ('key', 'row', 'score', 'queued', 'wake', 'lead', 'value', 'error')
+
+    def __init__(self, key, row, score):
+        self.key = key
+        self.row = row
+        self.score = score
+        self.queued = time.perf_counter()
+        self.wake = threading.Event()
+        self.lead = False
+        self.value = self.error = None
+
+
+class MicroBatcher:
+    """Coalesce concurrent ``submit()`` calls into vectorised ``score(X)`` calls.
+
+    ``on_batch(rows, waits)`` is called after every model call with the
+    batch size and each row's seconds spent queued, for metrics."""
+
+    def __init__(self, window=0.002, max_batch=64, on_batch=None):
+        self.window = float(window)
+        self.max_batch = max(1, int(max_batch))
+        self.on_batch = on_batch
+        self._queue = []
+        self._leading = False
+        self._cond = threading.Condition()
+
+    def submit(self, key, row, score):
+        """Return ``score(X)[i]`` for ``row`` scored within a batch of rows sharing ``key``.
+
+        ``key`` identifies the model (rows of different models are never
+        stacked together); ``score`` maps an (n, d) matrix to n values."""
+        item = _Pending(key, row, score)
+        with self._cond:
+            self._queue.append(item)
+            if not self._leading:
+                self._leading = item.lead = True
+                item.wake.set()
+            elif len(self._queue) >= self.max_batch:
+                self._cond.notify()
+        while True:
+            item.wake.wait()
+            if not item.lead:
+                break
+            item.wake.clear()
+            item.lead = False
+            self._lead()
+        if item.error is not None:
+            raise item.error
+        return item.value
+
+    def _lead(self):
+        deadline = time.perf_counter() + self.window
+        with self._cond:
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            if self._queue:
+                # The next batch starts forming while this one is scored
+                nxt = self._queue[0]
+                nxt.lead = True
+                nxt.wake.set()
+            else:
+                self._leading = False
+        self._run(batch)
+
+    def _run(self, batch):
+        groups = {}
+        for item in batch:
+            groups.setdefault(item.key, []).append(item)
+        for items in groups.values():
+            started = time.perf_counter()
+            try:
+                values = items[0].score(np.vstack([item.row for item in items]))
+                for item, value in zip(items, values):
+                    item.value = value
+            except Exception as e:
+                for item in items:
+                    item.error = e
+            finally:
+                for item in items:
+                    item.wake.set()
+            if self.on_batch is not None:
+                self.on_batch(len(items), [started - item.queued for item in items])
@@ -0,0 +1,240 @@
+# api/cache.py
+"""Caches for API results: in-process LRU/TTL and an on-disk SQLite tier."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def row_key(model_hash, row):
+    """Canonical cache key for one decoded feature row.
+
+    Values are already ordered by FEATURES and coerced to float64, so 26 and
+    26.0 collide as they should; -0.0 is folded into 0.0 and every missing
+    value is the same NaN. The model hash keeps results of different artifacts
+    apart."""
+    row = np.where(np.isnan(row), np.nan, row) + 0.0
+    return model_hash, row.astype(np.float64, copy=False).tobytes()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=300.0, clock=time.monotonic):
+        self.maxsize = int(maxsize)
+        self.ttl = float(ttl)
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
+class ExplanationCache:
+    """Two-tier cache for /explain results.
+
+    The memory tier is a TTLCache local to the worker. The disk tier is a
+    SQLite database (WAL mode) shared by every worker on the host and by
+    restarts; it is pruned by age and by total payload size. Values must be
+    JSON-serialisable.
+
+    purge() bumps a generation counter stored in the database. Each worker
+    compares it with the generation its memory tier was filled under at
+    most every ``sync_interval`` seconds and drops the memory tier when
+    another process has purged, so purged results stop being served
+    everywhere within that interval.
+    """
+
+    def __init__(self, path, memory_size=256, max_age=7 * 86400, max_bytes=64 << 20, sync_interval=1.0,
+                 clock=time.monotonic):
+        self.path = str(path)
+        self.max_age = float(max_age)
+        self.max_bytes = int(max_bytes)
+        self.memory = TTLCache(maxsize=memory_size, ttl=max_age)
+        self.sync_interval = float(sync_interval)
+        self._clock = clock
+        self._synced = clock()
+        self.disk_hits = self.disk_misses = 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute("""CREATE TABLE IF NOT EXISTS explanations (
+                key TEXT PRIMARY KEY, model_sha256 TEXT NOT NULL,
+                created REAL NOT NULL, accessed REAL NOT NULL,
+                size INTEGER NOT NULL, value TEXT NOT NULL)""")
+            db.execute('CREATE INDEX IF NOT EXISTS explanations_accessed ON explanations(accessed)')
+            db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            db.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+            self.generation = self._generation(db)
+
+    @staticmethod
+    def _generation(db):
+        return db.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def _sync(self):
+        """Drop the memory tier if the disk tier was purged since it was filled."""
+        now = self._clock()
+        if now - self._synced < self.sync_interval:
+            return
+        self._synced = now
+        try:
+            with self._connect() as db:
+                generation = self._generation(db)
+        except sqlite3.Error:
+            return
+        if generation != self.generation:
+            self.memory.clear()
+            self.generation = generation
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps this safe across threads and processes
+        db = sqlite3.connect(self.path, timeout=5.0)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def key(model_hash, row, params):
+        """Digest of payload row + model hash + explainer parameters."""
+        h = hashlib.sha256()
+        for part in row_key(model_hash, row):
+            h.update(part if isinstance(part, bytes) else part.encode())
+        h.update(json.dumps(params, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """Return (value, tier) with tier 'memory' or 'disk', or (None, None) on a miss."""
+        self._sync()
+        value = self.memory.get(key)
+        if value is not None:
+            return value, 'memory'
+        now = time.time()
+        try:
+            with self._connect() as db:
+                row = db.execute('SELECT value, created FROM explanations WHERE key = ?', (key,)).fetchone()
+                if row is not None and now - row[1] <= self.max_age:
+                    db.execute('UPDATE explanations SET accessed = ? WHERE key = ?', (now, key))
+                else:
+                    row = None
+        except sqlite3.Error:
+            row = None
+        if row is None:
+            self.disk_misses += 1
+            return None, None
+        self.disk_hits += 1
+        value = json.loads(row[0])
+        self.memory.put(key, value)
+        return value, 'disk'
+
+    def put(self, key, model_hash, value):
+        self.memory.put(key, value)
+        blob = json.dumps(value, separators=(',', ':'))
+        now = time.time()
+        try:
+            with self._connect() as db:
+                db.execute('INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?, ?, ?)',
+                           (key, model_hash, now, now, len(blob), blob))
+                self._prune(db, now)
+        except sqlite3.Error as e:
+            print('Explanation cache write failed:', e)
+
+    def _prune(self, db, now):
+        db.execute('DELETE FROM explanations WHERE created < ?', (now - self.max_age,))
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM explanations').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently accessed rows until the table fits again
+        freed = 0
+        victims = []
+        for key, size in db.execute('SELECT key, size FROM explanations ORDER BY accessed'):
+            victims.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        db.executemany('DELETE FROM explanations WHERE key = ?', victims)
+
+    def purge(self, keep_model_hash=None):
+        """Delete cached explanations; with keep_model_hash, only those of other models."""
+        self.memory.clear()
+        with self._connect() as db:
+            if keep_model_hash is None:
+                cur = db.execute('DELETE FROM explanations')
+            else:
+                cur = db.execute('DELETE FROM explanations WHERE model_sha256 != ?', (keep_model_hash,))
+            db.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            self.generation = self._generation(db)
+            return cur.rowcount
+
+    def stats(self):
+        try:
+            with self._connect() as db:
+                entries, size = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM explanations').fetchone()
+        except sqlite3.Error:
+            entries = size = None
+        lookups = self.disk_hits + self.disk_misses
+        return {
+            'memory': self.memory.stats(),
+            'disk': {
+                'path': self.path,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+                'max_age_seconds': self.max_age,
+                'hits': self.disk_hits,
+                'misses': self.disk_misses,
+                'hit_ratio': self.disk_hits / lookups if lookups else 0.0,
+                'generation': self.generation
+            }
+        }
@@ -0,0 +1,149 @@
+# api/encoding.py
+"""JSON response encoding, compact explanation payloads and gzip.
+
+For a returned dict FastAPI first copies the whole structure through
+jsonable_encoder (on the event loop), then json.dumps it. Hot endpoints
+return a FastJSONResponse instead, which encodes the dict once: with orjson
+when it is installed, otherwise with the stdlib encoder and no whitespace.
+"""
+import json
+import zlib
+
+import numpy as np
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is used without it
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+
+def _finite(obj):
+    """Copy of ``obj`` with NaN/Infinity replaced by None, as orjson writes them."""
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    if isinstance(obj, (float, np.floating)):
+        return float(obj) if np.isfinite(obj) else None
+    return obj
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, allow_nan=False,
+                      default=_default).encode()
+
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes (numpy scalars and arrays included).
+
+    NaN and Infinity become null with or without orjson."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        return _stdlib_dumps(obj)
+    except ValueError:  # out-of-range float: only then pay for a second pass
+        return _stdlib_dumps(_finite(obj))
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def sse_event(event, data):
+    """One Server-Sent Events message: a named event whose data is a JSON line."""
+    return b'event: ' + event.encode() + b'\ndata: ' + dumps(data) + b'\n\n'
+
+
+def short_name(name):
+    """'num__age' -> 'age': drop the ColumnTransformer prefix of a preprocessed feature."""
+    return str(name).split('__', 1)[-1]
+
+
+def compact_explanation(out, digits=6):
+    """Copy of an /explain result with raw feature names and rounded numbers.
+
+    Contributions and weights keep ``digits`` decimals (probability scale)
+    and timings 3 decimals of a millisecond; everything else is unchanged."""
+    out = dict(out)
+    for method, value_key in (('shap', 'contribution'), ('lime', 'weight')):
+        if out.get(method):
+            out[method] = [{'feature': short_name(r['feature']), value_key: round(r[value_key], digits)}
+                           for r in out[method]]
+    if out.get('cost_ms'):
+        out['cost_ms'] = {k: round(v, 3) for k, v in out['cost_ms'].items()}
+    return out
+
+
+# Media types whose chunks must reach the client as soon as they are sent
+STREAMING_TYPES = ('text/event-stream', 'application/x-ndjson')
+
+
+class GZipMiddleware:
+    """gzip responses of ``minimum_size`` bytes or more for clients that accept it.
+
+    Streamed media types pass through uncompressed. Starlette's own
+    GZipMiddleware before 0.39 (what fastapi 0.115 installs) compresses them
+    too and holds every chunk in the compressor until the stream closes."""
+
+    def __init__(self, app, minimum_size=1024, compresslevel=6, exclude=STREAMING_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or 'gzip' not in Headers(scope=scope).get('accept-encoding', ''):
+            await self.app(scope, receive, send)
+            return
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_gzip(message):
+            nonlocal start, compressor, passthrough
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                media_type = headers.get('content-type', '').split(';')[0].strip().lower()
+                passthrough = media_type in self.exclude or 'content-encoding' in headers
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message  # held until the first body chunk shows the size
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                await send(message)
+                return
+            body, more = message.get('body', b''), message.get('more_body', False)
+            if compressor is None:
+                if not more and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                data = compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH if more else zlib.Z_FINISH)
+                headers = MutableHeaders(raw=list(start['headers']))
+                headers['Content-Encoding'] = 'gzip'
+                headers.add_vary_header('Accept-Encoding')
+                del headers['Content-Length']
+                if not more:
+                    headers['Content-Length'] = str(len(data))
+                await send(dict(start, headers=headers.raw))
+            else:
+                data = compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH if more else zlib.Z_FINISH)
+            await send({'type': 'http.response.body', 'body': data, 'more_body': more})
+
+        await self.app(scope, receive, send_gzip)
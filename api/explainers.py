@@ -0,0 +1,246 @@
+# api/explainers.py
+"""Explainer helpers shared by the API, train.py and offline scripts.
+
+Batched TreeSHAP: shap_matrix() explains whole cohorts chunk by chunk, and
+global_explanation() summarises a training set for /global_importance.
+
+LIME: LimeTabularExplainer fits a scaler on the training matrix it is given, so
+building one per request (from copies of the patient being explained) both
+costs time and collapses the perturbation distribution. This module keeps
+LIME's continuous-feature algorithm (sample from the training distribution,
+weight by an exponential kernel on standardised distance, fit a weighted
+ridge through lime.lime_base) but takes the statistics from train/train.py.
+"""
+import json
+from contextlib import nullcontext
+
+import numpy as np
+
+STATS_VERSION = 1
+GLOBAL_VERSION = 1
+
+
+def positive_class(values):
+    """Normalise TreeExplainer.shap_values() output to (n, d) for the positive class.
+
+    Depending on the shap version a binary classifier yields a [neg, pos]
+    list, an (n, d, 2) array or a single (n, d) output."""
+    if isinstance(values, list):
+        return np.asarray(values[-1], dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    return values[:, :, -1] if values.ndim == 3 else values
+
+
+def iter_shap_chunks(explainer, X, chunk_rows=512, transform=None):
+    """Yield (start, values) for consecutive ``chunk_rows`` slices of ``X``.
+
+    ``transform`` (e.g. the pipeline's preprocessor) is applied per chunk, so
+    neither the preprocessed matrix nor shap's per-row working memory ever
+    exists for the whole cohort at once."""
+    chunk_rows = max(1, int(chunk_rows))
+    for start in range(0, len(X), chunk_rows):
+        Z = X[start:start + chunk_rows]
+        if transform is not None:
+            Z = transform(Z)
+        Z = np.asarray(Z.toarray() if hasattr(Z, 'toarray') else Z, dtype=np.float64)
+        yield start, positive_class(explainer.shap_values(Z))
+
+
+def expected_value(explainer):
+    """Positive-class base value: SHAP values of a row sum to its probability minus this."""
+    ev = np.ravel(np.asarray(explainer.expected_value, dtype=np.float64))
+    return float(ev[-1])
+
+
+def shap_matrix(explainer, X, chunk_rows=512, transform=None):
+    """Exact TreeSHAP for every row of ``X`` in one call over the forest per chunk.
+
+    Returns (values, expected_value) where values is an (n_rows, n_features)
+    float64 matrix of positive-class contributions."""
+    values = None
+    for start, chunk in iter_shap_chunks(explainer, X, chunk_rows, transform):
+        if values is None:
+            values = np.empty((len(X), chunk.shape[1]), dtype=np.float64)
+        values[start:start + len(chunk)] = chunk
+    if values is None:
+        values = np.empty((0, 0), dtype=np.float64)
+    return values, expected_value(explainer)
+
+
+def _interaction_matrix(explainer, Z):
+    """Sum over rows of |positive-class SHAP interaction values|, shape (d, d)."""
+    values = explainer.shap_interaction_values(Z)
+    values = np.asarray(values[-1] if isinstance(values, list) else values, dtype=np.float64)
+    if values.ndim == 4:
+        values = values[..., -1]
+    return np.abs(values).sum(axis=0)
+
+
+def _dependence_bins(x, v, max_bins=20):
+    """Binned feature value -> SHAP value curve; discrete features get one bin per value."""
+    keep = ~np.isnan(x)
+    x, v = x[keep], v[keep]
+    levels = np.unique(x)
+    if len(levels) <= max_bins:
+        groups = [(u, u, x == u) for u in levels]
+    else:
+        edges = np.unique(np.quantile(x, np.linspace(0, 1, max_bins + 1)))
+        idx = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, len(edges) - 2)
+        groups = [(edges[i], edges[i + 1], idx == i) for i in range(len(edges) - 1)]
+    bins = []
+    for low, high, mask in groups:
+        if mask.any():
+            s = v[mask]
+            bins.append({'low': float(low), 'high': float(high), 'count': int(mask.sum()),
+                         'shap_mean': float(s.mean()),
+                         'shap_p10': float(np.percentile(s, 10)), 'shap_p90': float(np.percentile(s, 90))})
+    return bins
+
+
+def global_explanation(explainer, X, transform, feature_names, n_jobs=1, chunk_rows=64, interaction_rows=200, max_bins=20, seed=0, model_sha256=None):
+    """Global SHAP summary of ``X`` (raw rows, e.g. the training DataFrame).
+
+    Returns a JSON-ready dict with mean |SHAP| per feature, binned dependence
+    curves against the raw feature values, and mean |interaction| strengths
+    from a seeded sample of ``interaction_rows`` rows (interaction values cost
+    about n_features times more than SHAP values). Chunks of rows are
+    explained on ``n_jobs`` joblib workers."""
+    from joblib import Parallel, delayed
+    X = X.reset_index(drop=True) if hasattr(X, 'reset_index') else np.asarray(X)
+    n = len(X)
+    chunks = [X[i:i + chunk_rows] for i in range(0, n, chunk_rows)]
+    parts = Parallel(n_jobs=n_jobs)(delayed(shap_matrix)(explainer, c, chunk_rows, transform) for c in chunks)
+    values = np.vstack([p[0] for p in parts])
+    names = [str(f) for f in feature_names]
+
+    sample = np.sort(np.random.default_rng(seed).permutation(n)[:min(n, interaction_rows)])
+    take = (lambda idx: X.iloc[idx]) if hasattr(X, 'iloc') else (lambda idx: X[idx])
+    pieces = [sample[i:i + chunk_rows] for i in range(0, len(sample), chunk_rows)]
+    sums = Parallel(n_jobs=n_jobs)(delayed(_interaction_matrix)(explainer, np.asarray(transform(take(idx)), dtype=np.float64))
+                                   for idx in pieces)
+    interactions = sum(sums) / max(1, len(sample))
+
+    # Dependence is plotted against raw (unscaled) values when a DataFrame column maps back
+    Z = None
+    dependence = {}
+    for j, name in enumerate(names):
+        raw = name.split('__', 1)[-1]
+        if hasattr(X, 'columns') and raw in X.columns:
+            x = X[raw].to_numpy(dtype=np.float64)
+        else:
+            if Z is None:
+                Z = np.asarray(transform(X), dtype=np.float64)
+            x = Z[:, j]
+        dependence[name] = _dependence_bins(x, values[:, j], max_bins)
+
+    mean_abs = np.abs(values).mean(axis=0)
+    pairs = [(i, j) for i in range(len(names)) for j in range(i + 1, len(names))]
+    # shap splits each pair's effect evenly between [i, j] and [j, i]
+    pairs.sort(key=lambda p: interactions[p], reverse=True)
+    return {
+        'version': GLOBAL_VERSION,
+        'model_sha256': model_sha256,
+        'n_rows': n,
+        'interaction_rows': len(sample),
+        'expected_value': expected_value(explainer),
+        'features': names,
+        'importance': sorted(({'feature': names[j], 'mean_abs_shap': float(mean_abs[j]),
+                               'mean_shap': float(values[:, j].mean())} for j in range(len(names))),
+                             key=lambda r: r['mean_abs_shap'], reverse=True),
+        'dependence': dependence,
+        'interactions': {
+            'mean_abs': interactions.tolist(),
+            'top_pairs': [{'features': [names[i], names[j]], 'strength': float(2 * interactions[i, j])}
+                          for i, j in pairs[:10]]
+        }
+    }
+
+
+def load_global_explanation(path, model_sha256=None):
+    """Read train.py's global explanation; ValueError if it belongs to another model."""
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('version') != GLOBAL_VERSION:
+        raise ValueError(f"unsupported global explanation version {data.get('version')!r}")
+    if model_sha256 is not None and data.get('model_sha256') != model_sha256:
+        raise ValueError('global explanation was computed for a different model')
+    return data
+
+
+def lime_training_stats(Z, feature_names, model_sha256=None):
+    """Per-column statistics of the preprocessed training matrix ``Z``."""
+    Z = np.asarray(Z, dtype=np.float64)
+    return {
+        'version': STATS_VERSION,
+        'model_sha256': model_sha256,
+        'n_rows': int(Z.shape[0]),
+        'feature_names': [str(n) for n in feature_names],
+        'mean': Z.mean(axis=0).tolist(),
+        'std': Z.std(axis=0).tolist(),
+        'min': Z.min(axis=0).tolist(),
+        'max': Z.max(axis=0).tolist()
+    }
+
+
+def load_lime_stats(path, model_sha256=None):
+    """Read stats written by train.py; ValueError if they belong to another model."""
+    with open(path) as f:
+        stats = json.load(f)
+    if stats.get('version') != STATS_VERSION:
+        raise ValueError(f"unsupported LIME stats version {stats.get('version')!r}")
+    if model_sha256 is not None and stats.get('model_sha256') != model_sha256:
+        raise ValueError('LIME stats were computed for a different model')
+    return stats
+
+
+class TabularLime:
+    """LIME for continuous, already-preprocessed features (discretize_continuous=False).
+
+    Stateless between calls apart from the statistics, so one instance is
+    shared by every request and thread; each call draws from its own seeded
+    generator."""
+
+    def __init__(self, mean, std, feature_names, kernel_width=None):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        std = np.asarray(std, dtype=np.float64)
+        # Constant columns are sampled/scaled with unit spread, like sklearn's StandardScaler
+        self.scale = np.where(std > 0, std, 1.0)
+        self.feature_names = list(feature_names)
+        self.kernel_width = float(kernel_width or np.sqrt(len(self.mean)) * 0.75)
+
+    @classmethod
+    def from_stats(cls, stats, kernel_width=None):
+        return cls(stats['mean'], stats['std'], stats['feature_names'], kernel_width)
+
+    def _kernel(self, d):
+        return np.sqrt(np.exp(-(d ** 2) / self.kernel_width ** 2))
+
+    def sample(self, x, num_samples, rng):
+        """(num_samples, d) perturbations from the training distribution; row 0 is ``x``."""
+        data = rng.standard_normal((num_samples, len(self.mean)))
+        data *= self.scale
+        data += self.mean
+        data[0] = x
+        return data
+
+    def explain(self, x, predict_fn, num_features=10, num_samples=100, seed=None, timer=None):
+        """Return [(feature_name, weight)] for the positive class, largest |weight| first.
+
+        ``predict_fn`` maps an (n, d) matrix to (n, 2) class probabilities.
+        ``timer(stage)`` is an optional context manager factory for per-stage
+        timing (lime_sample, lime_predict, lime_fit)."""
+        from lime.lime_base import LimeBase
+        timer = timer or (lambda name: nullcontext())
+        rng = np.random.default_rng(seed)
+        x = np.asarray(x, dtype=np.float64).ravel()
+        with timer('lime_sample'):
+            data = self.sample(x, num_samples, rng)
+            scaled = (data - self.mean) / self.scale
+            distances = np.sqrt(((scaled - scaled[0]) ** 2).sum(axis=1))
+        with timer('lime_predict'):
+            labels = predict_fn(data)
+        with timer('lime_fit'):
+            # LimeBase seeds the ridge / feature selection; derive it from the same seed
+            base = LimeBase(self._kernel, random_state=np.random.RandomState(rng.integers(2 ** 31)))
+            _, exp, _, _ = base.explain_instance_with_data(scaled, labels, distances, 1, num_features)
+        return [(self.feature_names[i], float(w)) for i, w in exp]
@@ -0,0 +1,195 @@
+# api/inference.py
+"""Inference engines used by the API.
+
+Both engines take a float64 matrix whose columns are ordered like
+models/features.json (np.nan for missing values) and return class
+probabilities shaped like sklearn's predict_proba.
+"""
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+
+
+class SklearnEngine:
+    """Reference engine: the fitted sklearn Pipeline itself."""
+    name = 'sklearn'
+
+    def __init__(self, pipe, features):
+        self.pipe = pipe
+        self.features = list(features)
+
+    def predict_proba(self, X):
+        import pandas as pd
+        return self.pipe.predict_proba(pd.DataFrame(X, columns=self.features))
+
+
+class CompiledForest:
+    """Preprocessing + random forest flattened into contiguous NumPy arrays.
+
+    All trees share one node table; leaves point at themselves so every row
+    can be walked for exactly ``max_depth`` steps without branching. Only
+    median/mean imputation followed by standard scaling is supported, which is
+    what train/train.py fits for numeric columns.
+    """
+    name = 'compiled'
+    chunk_rows = 4096
+
+    # Array attributes persisted by api/artifacts.py (max_depth goes in the manifest)
+    ARRAYS = ('columns', 'fill', 'mean', 'scale', 'roots', 'left', 'right',
+              'feature', 'threshold', 'value', 'children')
+
+    def __init__(self, columns, fill, mean, scale, roots, left, right, feature, threshold, value, max_depth,
+                 children=None):
+        self.columns = np.asarray(columns, dtype=np.intp)
+        self.fill = np.asarray(fill, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.max_depth = int(max_depth)
+        # children[2 * node + go_left] -> next node, one gather per level
+        if children is None:
+            children = np.stack([self.right, self.left], axis=1).ravel()
+        self.children = np.asarray(children, dtype=np.int32)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_pipeline(cls, pipe, features):
+        """Compile a fitted Pipeline([('preproc', ColumnTransformer), ('rf', forest)])."""
+        # sklearn is only needed to compile; loading memory-mapped arrays skips it
+        from sklearn.impute import SimpleImputer
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import StandardScaler
+        pre = pipe.named_steps['preproc']
+        rf = pipe.named_steps['rf']
+        features = list(features)
+
+        columns, fill, mean, scale = [], [], [], []
+        for name, trans, cols in pre.transformers_:
+            if trans == 'drop' or len(cols) == 0:
+                continue
+            steps = trans.steps if isinstance(trans, Pipeline) else [(name, trans)]
+            n = len(cols)
+            f, m, s = np.full(n, np.nan), np.zeros(n), np.ones(n)
+            for _, step in steps:
+                if step == 'passthrough':
+                    continue
+                if isinstance(step, SimpleImputer) and not step.add_indicator:
+                    f = np.asarray(step.statistics_, dtype=np.float64)
+                    if np.isnan(f).any():
+                        raise ValueError('imputer has empty features')
+                elif isinstance(step, StandardScaler):
+                    if step.with_mean:
+                        m = np.asarray(step.mean_, dtype=np.float64)
+                    if step.with_std:
+                        s = np.asarray(step.scale_, dtype=np.float64)
+                else:
+                    raise ValueError(f'cannot compile transformer {type(step).__name__} in {name!r}')
+            columns += [features.index(c) if isinstance(c, str) else int(c) for c in cols]
+            fill.append(f); mean.append(m); scale.append(s)
+
+        roots, left, right, feature, threshold, value = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for est in rf.estimators_:
+            t = est.tree_
+            idx = np.arange(t.node_count)
+            leaf = t.children_left == -1
+            left.append(np.where(leaf, idx, t.children_left) + offset)
+            right.append(np.where(leaf, idx, t.children_right) + offset)
+            feature.append(np.where(leaf, 0, t.feature))
+            threshold.append(np.where(leaf, np.inf, t.threshold))
+            # Normalise per node: older sklearn stores weighted counts, newer stores fractions
+            v = t.value[:, 0, :].astype(np.float64)
+            norm = v.sum(axis=1, keepdims=True)
+            norm[norm == 0] = 1.0
+            value.append(v / norm)
+            roots.append(offset)
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+
+        return cls(
+            columns=columns,
+            fill=np.concatenate(fill), mean=np.concatenate(mean), scale=np.concatenate(scale),
+            roots=roots,
+            left=np.concatenate(left), right=np.concatenate(right),
+            feature=np.concatenate(feature), threshold=np.concatenate(threshold),
+            value=np.concatenate(value), max_depth=max_depth
+        )
+
+    def transform(self, X):
+        """Impute and scale, returning columns in the model's training order."""
+        Z = np.array(X, dtype=np.float64, ndmin=2)[:, self.columns]
+        missing = np.isnan(Z)
+        if missing.any():
+            Z = np.where(missing, self.fill, Z)
+        Z -= self.mean
+        Z /= self.scale
+        return Z
+
+    def _predict_chunk(self, Z):
+        # sklearn trees compare float32 inputs against float64 thresholds
+        Z = np.ascontiguousarray(Z, dtype=np.float32)
+        n, d = Z.shape
+        flat = Z.ravel()
+        base = (np.arange(n, dtype=np.intp) * d)[:, None]
+        node = np.broadcast_to(self.roots.astype(np.intp), (n, self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = flat[base + self.feature[node]] <= self.threshold[node]
+            node = self.children[2 * node + go_left]
+        return self.value[node].mean(axis=1)
+
+    def predict_proba(self, X):
+        return self.predict_proba_preprocessed(self.transform(X))
+
+    def predict_proba_preprocessed(self, Z):
+        """predict_proba for rows already imputed and scaled (the forest's input space)."""
+        # Thread budget comes from the caller's joblib.parallel_config (see api/scheduler.py)
+        n_jobs = effective_n_jobs(None)
+        if n_jobs <= 1 and len(Z) <= self.chunk_rows:
+            return self._predict_chunk(Z)
+        step = min(self.chunk_rows, -(-len(Z) // max(1, n_jobs)))
+        chunks = [Z[i:i + step] for i in range(0, len(Z), step)]
+        if n_jobs <= 1 or len(chunks) == 1:
+            return np.concatenate([self._predict_chunk(c) for c in chunks])
+        # NumPy releases the GIL in the gathers/compares, so threads scale here
+        parts = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(self._predict_chunk)(c) for c in chunks)
+        return np.concatenate(parts)
+
+    def max_abs_error(self, reference, X):
+        """Largest probability difference against another engine on X."""
+        return float(np.max(np.abs(self.predict_proba(X) - reference.predict_proba(X))))
+
+
+def probe_rows(engine, n=256, seed=0):
+    """Synthetic raw-feature rows around the training distribution, with some missing values."""
+    rng = np.random.default_rng(seed)
+    n_raw = int(engine.columns.max()) + 1
+    mean, scale = np.zeros(n_raw), np.ones(n_raw)
+    mean[engine.columns] = engine.mean
+    scale[engine.columns] = engine.scale
+    X = mean + scale * rng.normal(0.0, 1.5, size=(n, n_raw))
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X
+
+
+def build_engine(name, pipe, features, atol=1e-9, compiled=None):
+    """Return the requested engine; a compiled engine must reproduce sklearn on probe rows.
+
+    ``compiled`` may be a CompiledForest loaded elsewhere (e.g. memory-mapped)
+    to skip compiling the pipeline again."""
+    reference = SklearnEngine(pipe, features)
+    if name == 'sklearn':
+        return reference
+    if name != 'compiled':
+        raise ValueError(f'unknown inference engine {name!r}')
+    engine = compiled if compiled is not None else CompiledForest.from_pipeline(pipe, features)
+    err = engine.max_abs_error(reference, probe_rows(engine))
+    if err > atol:
+        raise ValueError(f'compiled engine disagrees with sklearn (max abs error {err:.3g})')
+    return engine
@@ -0,0 +1,122 @@
+# api/jobs.py
+"""Background jobs for slow endpoints (currently /explain)."""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running."""
+
+
+class Job:
+    """State of one background job; results are published stage by stage."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.stages = []
+        self.timings = {}
+        self.error = None
+        self._lock = threading.Lock()
+
+    def update(self, stage, result, seconds):
+        """Publish a partial result after ``stage`` took ``seconds``."""
+        with self._lock:
+            self.result = result
+            self.stages.append(stage)
+            self.timings[f'{stage}_ms'] = seconds * 1000
+
+    def as_dict(self):
+        with self._lock:
+            timings = dict(self.timings)
+            if self.started is not None:
+                timings['queued_ms'] = (self.started - self.created) * 1000
+                timings['total_ms'] = ((self.finished or time.time()) - self.started) * 1000
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'stages_done': list(self.stages),
+                'result': self.result,
+                'timings_ms': timings,
+                'error': self.error
+            }
+
+
+class JobManager:
+    """Run jobs on a bounded thread pool and keep finished jobs for ``ttl`` seconds.
+
+    ``max_pending`` caps queued + running jobs; submit() raises JobQueueFull
+    beyond that instead of letting a burst pile up behind the pool."""
+
+    def __init__(self, workers=2, max_pending=32, ttl=600.0):
+        self.workers = int(workers)
+        self.max_pending = int(max_pending)
+        self.ttl = float(ttl)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _pending(self):
+        return sum(1 for j in self._jobs.values() if j.status in ('queued', 'running'))
+
+    def _expire(self, now):
+        for job_id in [k for k, j in self._jobs.items()
+                       if j.finished is not None and now - j.finished > self.ttl]:
+            del self._jobs[job_id]
+
+    def submit(self, fn, *args):
+        """Queue fn(job, *args); fn publishes progress through job.update().
+
+        fn may return a final status ('partial', 'failed'); None means 'done'."""
+        with self._lock:
+            self._expire(time.time())
+            if self._pending() >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f'{self.max_pending} jobs already pending, retry later')
+            job = Job()
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        with self._lock:
+            if job.status != 'queued':  # cancelled by shutdown()
+                return
+            job.status = 'running'
+        job.started = time.time()
+        try:
+            job.status = fn(job, *args) or 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire(time.time())
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for j in self._jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+            return {'workers': self.workers, 'max_pending': self.max_pending,
+                    'ttl_seconds': self.ttl, 'rejected': self.rejected, 'jobs': counts}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        now = time.time()
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == 'queued':
+                    job.status = 'cancelled'
+                    job.finished = now
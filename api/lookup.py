@@ -0,0 +1,154 @@
+# api/lookup.py
+"""Precomputed risk table over a quantized input space.
+
+Every feature gets a sorted grid of values. Discrete features (binary flags,
+integer ages and scores) must match a grid value exactly; continuous ones
+snap to the nearest grid value within half a step of the covered range. The
+table stores the model's positive-class probability for every grid point, so
+a lookup is one index computation. Rows outside the grid (or with missing
+values) are reported as not covered and must be scored by the model.
+
+The table lives in a shared artifact directory (table.npy + manifest.json)
+and is memory-mapped like api/artifacts.py.
+"""
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+class RiskTable:
+    name = 'lookup'
+
+    def __init__(self, features, axes, snap, table, error=None):
+        self.features = list(features)
+        self.axes = [np.asarray(a, dtype=np.float64) for a in axes]
+        self.snap = list(snap)  # 'exact' or 'nearest' per feature
+        self.table = table
+        self.error = error or {}
+        shape = tuple(len(a) for a in self.axes)
+        if tuple(table.shape) != shape:
+            raise ValueError(f'table shape {table.shape} does not match axes {shape}')
+        self._strides = np.array([int(np.prod(shape[i + 1:])) for i in range(len(shape))], dtype=np.intp)
+
+    @property
+    def n_cells(self):
+        return int(np.prod(self.table.shape))
+
+    def grid_points(self, start, stop):
+        """Raw feature rows for flat cells [start, stop), in table order."""
+        idx = np.unravel_index(np.arange(start, stop), self.table.shape)
+        return np.column_stack([axis[i] for axis, i in zip(self.axes, idx)])
+
+    def index(self, X):
+        """Flat table index per row, -1 where the row is not covered by the grid."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.features))
+        flat = np.zeros(len(X), dtype=np.intp)
+        ok = ~np.isnan(X).any(axis=1)
+        for j, (axis, snap) in enumerate(zip(self.axes, self.snap)):
+            x = np.where(ok, X[:, j], axis[0])
+            i = np.clip(np.searchsorted(axis, x), 0, len(axis) - 1)
+            if snap == 'exact':
+                ok &= axis[i] == x
+            else:
+                lower = np.clip(i - 1, 0, len(axis) - 1)
+                i = np.where(np.abs(axis[lower] - x) <= np.abs(axis[i] - x), lower, i)
+                half = (axis[-1] - axis[0]) / max(1, len(axis) - 1) / 2
+                ok &= (x >= axis[0] - half) & (x <= axis[-1] + half)
+            flat += i * self._strides[j]
+        return np.where(ok, flat, -1)
+
+    def lookup(self, X):
+        """(proba, covered): table probabilities (NaN where not covered) and the coverage mask."""
+        flat = self.index(X)
+        covered = flat >= 0
+        proba = np.full(len(flat), np.nan)
+        proba[covered] = self.table.ravel()[flat[covered]]
+        return proba, covered
+
+
+def grid_axes(X, features, steps, max_levels=20):
+    """Axes covering the observed range of each column of raw training rows ``X``.
+
+    Columns listed in ``steps`` become uniform 'nearest' grids with that step;
+    the rest are discrete and take their observed levels (at most
+    ``max_levels``, else ValueError)."""
+    axes, snap = [], []
+    for j, name in enumerate(features):
+        col = X[:, j][~np.isnan(X[:, j])]
+        if name in steps:
+            step = float(steps[name])
+            lo, hi = np.floor(col.min() / step) * step, np.ceil(col.max() / step) * step
+            axes.append(np.round(np.arange(lo, hi + step / 2, step), 10))
+            snap.append('nearest')
+        else:
+            levels = np.unique(col)
+            if len(levels) > max_levels and not np.all(levels == np.round(levels)):
+                raise ValueError(f'{name!r} has {len(levels)} non-integer levels; give it a step')
+            if len(levels) > max_levels:
+                levels = np.arange(levels.min(), levels.max() + 1)  # integer range, e.g. age
+            axes.append(levels)
+            snap.append('exact')
+    return axes, snap
+
+
+def build_table(score, features, axes, snap, chunk_cells=1 << 16, progress=None):
+    """Score every grid point with ``score(X) -> probabilities`` and return a RiskTable."""
+    shape = tuple(len(a) for a in axes)
+    table = RiskTable(features, axes, snap, np.empty(shape, dtype=np.float32))
+    out = table.table.reshape(-1)
+    for start in range(0, table.n_cells, chunk_cells):
+        stop = min(start + chunk_cells, table.n_cells)
+        out[start:stop] = score(table.grid_points(start, stop))
+        if progress is not None:
+            progress(stop, table.n_cells)
+    return table
+
+
+def measure_error(table, score, X):
+    """Max / p99 / mean |table - model| over covered rows of ``X`` (raw features)."""
+    proba, covered = table.lookup(X)
+    err = np.abs(proba[covered] - score(np.asarray(X)[covered]))
+    if not len(err):
+        return {'n_rows': 0}
+    return {'n_rows': int(len(err)), 'max_abs_error': float(err.max()),
+            'p99_abs_error': float(np.percentile(err, 99)), 'mean_abs_error': float(err.mean())}
+
+
+def save_table(out_dir, table, model_sha256):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = out_dir / '.table.npy.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, np.ascontiguousarray(table.table))
+    os.replace(tmp, out_dir / 'table.npy')
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model_sha256': model_sha256,
+        'features': table.features,
+        'axes': [a.tolist() for a in table.axes],
+        'snap': table.snap,
+        'error': table.error
+    }
+    tmp = out_dir / f'.{MANIFEST}.tmp'
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, out_dir / MANIFEST)
+    return manifest
+
+
+def load_table(out_dir, model_sha256=None, features=None, mmap_mode='r'):
+    """Memory-map a saved RiskTable; ValueError if it was built for another model or feature order."""
+    out_dir = Path(out_dir)
+    manifest = json.loads((out_dir / MANIFEST).read_text())
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"unsupported lookup table format {manifest.get('format_version')!r}")
+    if model_sha256 is not None and manifest.get('model_sha256') != model_sha256:
+        raise ValueError('lookup table was built for a different model')
+    if features is not None and manifest['features'] != list(features):
+        raise ValueError('lookup table feature order does not match the model')
+    table = np.load(out_dir / 'table.npy', mmap_mode=mmap_mode)
+    return RiskTable(manifest['features'], manifest['axes'], manifest['snap'], table, manifest.get('error'))
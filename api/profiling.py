@@ -0,0 +1,92 @@
+# api/profiling.py
+"""Opt-in cProfile runs of single requests.
+
+A profiled request collects its own stage timings (through record_stage)
+and the hottest functions by cumulative time, and can dump the raw profile
+for snakeviz / pstats. cProfile can only run once per process at a time, so
+concurrent profiling requests are refused rather than queued.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_active = ContextVar('active_profile', default=None)
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Raised when another request is already being profiled."""
+
+
+def record_stage(name, seconds):
+    """Add ``seconds`` to stage ``name`` of the profile active in this context, if any."""
+    profile = _active.get()
+    if profile is not None:
+        profile.stages[name] = profile.stages.get(name, 0.0) + seconds
+
+
+class RequestProfile:
+    def __init__(self, label):
+        self.label = label
+        self.stages = {}
+        self.seconds = None
+        self.profiler = cProfile.Profile()
+
+    def hot_functions(self, top=20):
+        """Top functions by cumulative time, as pstats prints them."""
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        rows = []
+        for func, (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            if func[0] == __file__:
+                continue
+            rows.append({'function': pstats.func_std_string(func), 'calls': ncalls,
+                         'tottime_ms': round(tottime * 1000, 3), 'cumtime_ms': round(cumtime * 1000, 3)})
+        rows.sort(key=lambda r: r['cumtime_ms'], reverse=True)
+        return rows[:top]
+
+    def dump(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{self.label}-{uuid.uuid4().hex[:8]}.prof")
+        self.profiler.dump_stats(path)
+        return path
+
+    def report(self, top=20, out_dir=None):
+        return {
+            'total_ms': round(self.seconds * 1000, 3),
+            'stages_ms': {k: round(v * 1000, 3) for k, v in self.stages.items()},
+            'hot_functions': self.hot_functions(top),
+            'profile_file': self.dump(out_dir) if out_dir else None
+        }
+
+
+@contextmanager
+def profiled(label, enabled=True):
+    """Run the block under cProfile and yield its RequestProfile (None when not enabled).
+
+    Must wrap synchronous work on one thread: cProfile only sees calls made
+    on the thread that started it (plus, on Python 3.12+, other threads'
+    calls made while it runs)."""
+    if not enabled:
+        yield None
+        return
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy('another request is being profiled, retry later')
+    profile = RequestProfile(label)
+    token = _active.set(profile)
+    t0 = time.perf_counter()
+    try:
+        profile.profiler.enable()
+        try:
+            yield profile
+        finally:
+            profile.profiler.disable()
+    finally:
+        profile.seconds = time.perf_counter() - t0
+        _active.reset(token)
+        _lock.release()
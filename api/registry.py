@@ -0,0 +1,391 @@
+# api/registry.py
+"""Versioned model artifacts and the per-version bundle the API serves.
+
+A registry directory holds one subdirectory per version with the files
+train.py (and optionally train/build_lookup.py) writes to models/, plus a
+manifest.json recording the sha256 of every file and the validation metrics
+from metrics.json. A ``CURRENT`` file names the active version. Versions are
+copied into a hidden directory and renamed into place, and CURRENT is
+replaced atomically, so readers never see a half-published version.
+
+A ModelBundle is everything loaded from one version directory. The API keeps
+the bundle it serves in a ModelSlot; requests take ``slot.current`` once and
+use that bundle throughout, so swapping in another bundle never changes the
+model under a request that is already running.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from api.artifacts import load_shared
+from api.explainers import TabularLime, load_global_explanation, load_lime_stats
+from api.inference import CompiledForest, SklearnEngine, build_engine
+from api.lookup import load_table
+from api.scheduler import pin_estimator_threads
+from api.schema import categorical_features
+
+MANIFEST = 'manifest.json'
+CURRENT = 'CURRENT'
+FORMAT_VERSION = 1
+REQUIRED = ('model.joblib', 'features.json')
+# Derived artifacts are copied when present; directories are copied whole
+OPTIONAL = ('metrics.json', 'preproc.joblib', 'shap_explainer.joblib', 'lime_stats.json',
+            'global_importance.json', 'shared', 'lookup')
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _files(version_dir):
+    """Relative paths of every artifact file in a version directory, sorted."""
+    version_dir = Path(version_dir)
+    return sorted(p.relative_to(version_dir).as_posix() for p in version_dir.rglob('*')
+                  if p.is_file() and p.name != MANIFEST)
+
+
+def _read_json(path):
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def publish(registry_dir, source_dir='models', version=None, activate=False):
+    """Copy the artifacts in ``source_dir`` into a new registry version and return its manifest.
+
+    ``version`` defaults to a UTC timestamp plus the first 8 hex digits of
+    the model hash. With ``activate`` the new version also becomes CURRENT."""
+    registry_dir, source_dir = Path(registry_dir), Path(source_dir)
+    missing = [name for name in REQUIRED if not (source_dir / name).is_file()]
+    if missing:
+        raise FileNotFoundError(f'{source_dir} has no {", ".join(missing)}')
+    model_sha256 = file_sha256(source_dir / 'model.joblib')
+    version = version or f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{model_sha256[:8]}"
+    if version.startswith('.') or '/' in version or version == CURRENT:
+        raise ValueError(f'invalid version name {version!r}')
+    target = registry_dir / version
+    if target.exists():
+        raise FileExistsError(f'version {version!r} already exists')
+    tmp = registry_dir / f'.{version}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        for name in REQUIRED + OPTIONAL:
+            src = source_dir / name
+            if src.is_dir():
+                shutil.copytree(src, tmp / name, ignore=shutil.ignore_patterns('.*'))
+            elif src.is_file():
+                shutil.copy2(src, tmp / name)
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'version': version,
+            'created': time.time(),
+            'model_sha256': model_sha256,
+            'metrics': _read_json(tmp / 'metrics.json'),
+            'files': {name: file_sha256(tmp / name) for name in _files(tmp)}
+        }
+        (tmp / MANIFEST).write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    if activate:
+        set_current(registry_dir, version)
+    return manifest
+
+
+def read_manifest(version_dir):
+    manifest = json.loads((Path(version_dir) / MANIFEST).read_text())
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"unsupported registry manifest format {manifest.get('format_version')!r}")
+    return manifest
+
+
+def verify(version_dir, manifest=None):
+    """Re-hash every file of a version; ValueError if any was changed, added or removed."""
+    manifest = manifest or read_manifest(version_dir)
+    files = _files(version_dir)
+    if files != sorted(manifest['files']):
+        raise ValueError(f"files of version {manifest['version']!r} do not match its manifest")
+    for name in files:
+        if file_sha256(Path(version_dir) / name) != manifest['files'][name]:
+            raise ValueError(f"{name} of version {manifest['version']!r} does not match its manifest")
+    return manifest
+
+
+def list_versions(registry_dir):
+    """Manifests of every published version, oldest first."""
+    registry_dir = Path(registry_dir)
+    if not registry_dir.is_dir():
+        return []
+    manifests = []
+    for path in registry_dir.iterdir():
+        if path.is_dir() and not path.name.startswith('.'):
+            try:
+                manifests.append(read_manifest(path))
+            except (OSError, ValueError):
+                continue
+    return sorted(manifests, key=lambda m: m['created'])
+
+
+def current_version(registry_dir):
+    try:
+        return (Path(registry_dir) / CURRENT).read_text().strip() or None
+    except OSError:
+        return None
+
+
+def set_current(registry_dir, version):
+    registry_dir = Path(registry_dir)
+    read_manifest(registry_dir / version)  # refuse to point CURRENT at something that is not a version
+    tmp = registry_dir / f'.{CURRENT}.tmp'
+    tmp.write_text(version + '\n')
+    os.replace(tmp, registry_dir / CURRENT)
+
+
+def resolve(registry_dir, version=None):
+    """(path, manifest) of ``version`` or of CURRENT; LookupError when there is none."""
+    version = version or current_version(registry_dir)
+    if version is None:
+        raise LookupError(f'{registry_dir} has no {CURRENT} version')
+    path = Path(registry_dir) / version
+    if version.startswith('.') or '/' in version or not (path / MANIFEST).is_file():
+        raise LookupError(f'unknown model version {version!r}')
+    return path, read_manifest(path)
+
+
+def _load_model(path):
+    return pin_estimator_threads(joblib.load(Path(path) / 'model.joblib'))
+
+
+class ModelBundle:
+    """One loaded model version: pipeline, inference engine and explainer state.
+
+    The fitted pipeline is a private copy in every worker. A bundle serving
+    the memory-mapped compiled forest is built with ``model=None``: it
+    preprocesses and scores through the shared arrays, and only loads the
+    pipeline if something still needs it (an explainer without train.py's
+    artifacts)."""
+
+    def __init__(self, version, path, model, model_sha256, features, metrics=None, manifest=None):
+        self.version = version
+        self.path = Path(path)
+        self._model = model
+        self._model_lock = threading.Lock()
+        self.model_sha256 = model_sha256
+        self.features = list(features)
+        # A compiled forest only holds imputed and scaled numeric columns
+        self.categorical = categorical_features(model) if model is not None else []
+        self.metrics = metrics
+        self.manifest = manifest
+        self.engine = SklearnEngine(model, self.features) if model is not None else None
+        self.lime = None
+        self.global_importance = None  # pre-encoded JSON bytes
+        self.lookup = None
+        self.loaded_at = time.time()
+        self._shap_lock = threading.Lock()
+        self._shap_state = None
+
+    @property
+    def model(self):
+        """The fitted sklearn Pipeline, loaded on first use if the bundle was built without it."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    print(f'Loading the sklearn pipeline of model version {self.version}')
+                    self._model = _load_model(self.path)
+        return self._model
+
+    @property
+    def explained_features(self):
+        """Names of the preprocessed columns that SHAP and LIME explain."""
+        if self.lime is not None:
+            return self.lime.feature_names
+        return [str(n) for n in self.model.named_steps['preproc'].get_feature_names_out()]
+
+    def transform(self, X):
+        """Raw feature rows (FEATURES order) -> the preprocessed float64 matrix the forest sees."""
+        if isinstance(self.engine, CompiledForest):
+            return self.engine.transform(X)
+        import pandas as pd
+        Z = self.model.named_steps['preproc'].transform(pd.DataFrame(X, columns=self.features))
+        return np.asarray(Z.toarray() if hasattr(Z, 'toarray') else Z, dtype=np.float64)
+
+    def predict_preprocessed(self, Z):
+        """Positive-class probability of rows returned by transform()."""
+        if isinstance(self.engine, CompiledForest):
+            return self.engine.predict_proba_preprocessed(Z)[:, 1]
+        return self.model.named_steps['rf'].predict_proba(Z)[:, 1]
+
+    def _load_shap_explainer(self):
+        """Return (explainer, cached).
+
+        The pickled explainer is only trusted when it was written for this
+        bundle's model.joblib; otherwise a TreeExplainer is built once so
+        requests never pay for it. Unpickling imports shap (slow), which is
+        why this runs on first use / during warm-up rather than at load."""
+        try:
+            # mmap_mode keeps the explainer's tree arrays and the background matrix in the
+            # page cache, shared by every worker, instead of a private copy per process
+            shap_cache = joblib.load(self.path / 'shap_explainer.joblib', mmap_mode='r')
+            if shap_cache.get('explainer') is not None and shap_cache.get('model_sha256') == self.model_sha256:
+                return shap_cache['explainer'], True
+        except Exception as e:
+            print('SHAP explainer cache not loaded:', e)
+        try:
+            import shap
+            return shap.TreeExplainer(self.model.named_steps['rf']), False
+        except Exception as e:
+            print('SHAP explainer unavailable:', e)
+            return None, False
+
+    def shap_explainer(self):
+        """(explainer, cached) for this bundle, loaded once."""
+        if self._shap_state is None:
+            with self._shap_lock:
+                if self._shap_state is None:
+                    self._shap_state = self._load_shap_explainer()
+        return self._shap_state
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'model_sha256': self.model_sha256,
+            'path': str(self.path),
+            'engine': self.engine.name,
+            'pipeline_loaded': self._model is not None,
+            'loaded_at': self.loaded_at,
+            'metrics': self.metrics,
+            'lookup': self.lookup is not None,
+            'global_importance': self.global_importance is not None
+        }
+
+
+def _load_lime(bundle):
+    """LIME sampling from train.py's statistics.
+
+    Without them (or for another model) it falls back to mean 0 / std 1,
+    which is what the pipeline's StandardScaler produces on its training set.
+    Stats written for this model.joblib also supply the feature names, so
+    the pipeline is not loaded just to read them."""
+    try:
+        stats = load_lime_stats(bundle.path / 'lime_stats.json', model_sha256=bundle.model_sha256)
+        if bundle._model is not None and stats['feature_names'] != bundle.explained_features:
+            raise ValueError('LIME stats feature names do not match the pipeline')
+        return TabularLime.from_stats(stats)
+    except (OSError, ValueError, KeyError) as e:
+        print('LIME stats not loaded, assuming standardised features:', e)
+        names = bundle.explained_features
+        return TabularLime(np.zeros(len(names)), np.ones(len(names)), names)
+
+
+def _load_global_importance(bundle):
+    """train.py's global SHAP summary, pre-encoded once; None when absent or stale."""
+    try:
+        data = load_global_explanation(bundle.path / 'global_importance.json', model_sha256=bundle.model_sha256)
+        return json.dumps(data, separators=(',', ':')).encode()
+    except (OSError, ValueError) as e:
+        print('Global importance not served:', e)
+        return None
+
+
+def _load_shared_forest(path, model_sha256):
+    """Memory-mapped compiled forest written (and checked against sklearn) by train.py, or None."""
+    try:
+        return load_shared(Path(path) / 'shared', model_sha256=model_sha256)[0]
+    except (OSError, ValueError) as e:
+        print('Shared artifacts not used, compiling in-process:', e)
+        return None
+
+
+def _build_engine(bundle, name):
+    try:
+        return build_engine(name, bundle.model, bundle.features)
+    except Exception as e:
+        print(f'Inference engine {name!r} unavailable, using sklearn:', e)
+        return SklearnEngine(bundle.model, bundle.features)
+
+
+def _load_lookup(bundle):
+    try:
+        return load_table(bundle.path / 'lookup', model_sha256=bundle.model_sha256, features=bundle.features)
+    except (OSError, ValueError) as e:
+        print('Lookup table not used, predicting exactly:', e)
+        return None
+
+
+def load_bundle(path, version=None, manifest=None, engine='sklearn', predict_mode='exact', phase=None):
+    """Load a version directory (or the flat models/ layout) into a ModelBundle.
+
+    With a registry ``manifest`` every file is re-hashed first. ``phase(name)``
+    is an optional context manager factory timing each step, e.g.
+    StartupReport.phase."""
+    phase = phase or (lambda name: nullcontext())
+    path = Path(path)
+    with phase('load_model'):
+        if manifest is not None:
+            verify(path, manifest)
+        model_sha256 = file_sha256(path / 'model.joblib')
+        features = json.loads((path / 'features.json').read_text())
+        metrics = manifest['metrics'] if manifest is not None else _read_json(path / 'metrics.json')
+        # Serving from the shared arrays needs no private copy of the pipeline
+        shared = _load_shared_forest(path, model_sha256) if engine == 'compiled' else None
+        bundle = ModelBundle(version or (manifest or {}).get('version') or path.name, path,
+                             _load_model(path) if shared is None else None,
+                             model_sha256, features, metrics=metrics, manifest=manifest)
+    with phase('build_engine'):
+        bundle.engine = shared if shared is not None else _build_engine(bundle, engine)
+    with phase('load_lime_stats'):
+        bundle.lime = _load_lime(bundle)
+    with phase('load_global_importance'):
+        bundle.global_importance = _load_global_importance(bundle)
+    # 'lookup' answers on-grid rows from the table written by train/build_lookup.py
+    if predict_mode == 'lookup':
+        with phase('load_lookup'):
+            bundle.lookup = _load_lookup(bundle)
+    return bundle
+
+
+class ModelSlot:
+    """The bundle being served, swapped atomically, an optional challenger
+    (api/shadow.py) and at most one reload in progress."""
+
+    def __init__(self, bundle):
+        self.current = bundle
+        self.challenger = None
+        self.reload = None  # status dict of the last / running reload
+        self._reload_lock = threading.Lock()
+
+    def begin_reload(self, version, target='primary'):
+        """Claim the reload slot; False when another reload is still running."""
+        with self._reload_lock:
+            if self.reload is not None and self.reload['status'] == 'loading':
+                return False
+            self.reload = {'status': 'loading', 'version': version, 'target': target, 'started': time.time(),
+                           'phases_ms': {}, 'error': None}
+            return True
+
+    def finish_reload(self, status, error=None, **extra):
+        with self._reload_lock:
+            self.reload.update(extra, status=status, error=error, finished=time.time())
+
+    def swap(self, bundle):
+        """Serve ``bundle`` from now on and return the one it replaced.
+
+        A single attribute assignment, so every request sees either the old
+        bundle or the new one; requests holding the old one finish with it."""
+        old, self.current = self.current, bundle
+        return old
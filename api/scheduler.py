@@ -0,0 +1,80 @@
+# api/scheduler.py
+"""CPU budgeting for model inference.
+
+train.py fits the forest with n_jobs=-1 and that setting is pickled with it,
+so every predict_proba -- even for a single row -- fans out to all cores.
+Under concurrent requests that oversubscribes the CPU. The scheduler pins the
+estimator to joblib's context-controlled default and decides per call how many
+threads the call may use: small batches stay single-threaded, large batches
+share the host's cores with whatever else is in flight.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from joblib import parallel_config
+
+
+def available_cpus():
+    """CPUs this process may run on (respects affinity / container cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def pin_estimator_threads(pipe):
+    """Make every n_jobs-aware step follow joblib.parallel_config instead of its pickled value."""
+    steps = pipe.named_steps.values() if hasattr(pipe, 'named_steps') else [pipe]
+    for step in steps:
+        if hasattr(step, 'n_jobs'):
+            step.n_jobs = None
+    return pipe
+
+
+class InferenceScheduler:
+    """Size the thread budget of each inference call from CPU count and load."""
+
+    def __init__(self, cpus=None, parallel_min_rows=2048):
+        self.cpus = int(cpus or available_cpus())
+        self.parallel_min_rows = int(parallel_min_rows)
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self.calls = self.parallel_calls = 0
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    def plan(self, rows, inflight):
+        """Threads for a call scoring ``rows`` rows while ``inflight`` calls (incl. itself) run."""
+        if rows < self.parallel_min_rows or self.cpus <= 1:
+            return 1
+        return max(1, self.cpus // max(1, inflight))
+
+    @contextmanager
+    def slot(self, rows):
+        """Reserve a share of the CPU for one call; yields its n_jobs.
+
+        joblib's parallel_config is thread-local, so the budget only applies to
+        the request thread that entered the slot."""
+        with self._lock:
+            self._inflight += 1
+            n_jobs = self.plan(rows, self._inflight)
+            self.calls += 1
+            self.parallel_calls += n_jobs > 1
+        try:
+            with parallel_config(n_jobs=n_jobs):
+                yield n_jobs
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def stats(self):
+        return {
+            'cpus': self.cpus,
+            'parallel_min_rows': self.parallel_min_rows,
+            'inflight': self._inflight,
+            'calls': self.calls,
+            'parallel_calls': self.parallel_calls
+        }
@@ -0,0 +1,75 @@
+# api/schema.py
+"""Typed request payloads generated from models/features.json."""
+from typing import Annotated, Optional
+
+import numpy as np
+from pydantic import Field, TypeAdapter, ValidationError
+from typing_extensions import NotRequired, TypedDict
+
+# Finite floats only: Infinity/NaN literals would make the engines disagree
+FeatureValue = Optional[Annotated[float, Field(allow_inf_nan=False)]]
+
+
+def categorical_features(pipe):
+    """Input columns the fitted pipeline one-hot encodes (train.py's cat_cols)."""
+    from sklearn.preprocessing import OneHotEncoder
+    pre = pipe.named_steps['preproc']
+    cols = []
+    for _, trans, selected in pre.transformers_:
+        steps = [s for _, s in getattr(trans, 'steps', [(None, trans)])]
+        if any(isinstance(s, OneHotEncoder) for s in steps):
+            cols += list(selected)
+    return cols
+
+
+def payload_schema(features, categorical=()):
+    """TypedDict with one optional finite float per training feature.
+
+    Missing keys and explicit nulls both mean "impute"; unknown keys are
+    dropped by validation. Raises ValueError when the model has categorical
+    inputs, which this float-only schema cannot represent."""
+    categorical = [c for c in categorical if c in features]
+    if categorical:
+        raise ValueError(f'payload schema only supports numeric features; categorical: {categorical}')
+    return TypedDict('PatientPayload', {k: NotRequired[FeatureValue] for k in features})
+
+
+class RowDecoder:
+    """Validate payload dicts and write them straight into float64 rows.
+
+    Validation runs through pydantic-core's compiled validator for the
+    generated schema; decoding never builds a DataFrame."""
+
+    def __init__(self, features, categorical=()):
+        self.features = tuple(features)
+        self.schema = payload_schema(self.features, categorical)
+        self.adapter = TypeAdapter(self.schema)
+
+    def empty(self, n_rows=1):
+        """Preallocated (n_rows, n_features) matrix of missing values."""
+        return np.full((n_rows, len(self.features)), np.nan, dtype=np.float64)
+
+    def fill(self, payload, row):
+        """Write an already-validated payload into ``row`` in feature order (None -> NaN)."""
+        row[:] = [payload.get(k) for k in self.features]
+        return row
+
+    def decode(self, payload, row=None):
+        """Validate one raw payload dict and return it as a float64 row."""
+        if row is None:
+            row = self.empty()[0]
+        return self.fill(self.adapter.validate_python(payload), row)
+
+    def decode_many(self, payloads):
+        """Decode a list of raw payloads into one matrix.
+
+        Returns (X, errors) where errors maps row index -> message; rows with
+        errors are left as NaN and must not be scored."""
+        X = self.empty(len(payloads))
+        errors = {}
+        for i, payload in enumerate(payloads):
+            try:
+                self.decode(payload, X[i])
+            except ValidationError as e:
+                errors[i] = '; '.join(f"{'.'.join(map(str, err['loc'])) or 'payload'}: {err['msg']}" for err in e.errors())
+        return X, errors
@@ -0,0 +1,150 @@
+# api/shadow.py
+"""Shadow scoring and A/B routing of a challenger model version.
+
+The model that answers a request (the primary, or the challenger for its A/B
+share) scores the row on the request thread. The other one scores the same
+row afterwards on a small background pool, off the response's critical
+path. ShadowStats compares each pair: agreement at the decision threshold,
+probability deltas (challenger - primary) and the latency of each model.
+"""
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MODES = ('shadow', 'ab')
+ROLES = ('primary', 'challenger')
+
+
+class ShadowStats:
+    """Pairwise comparison of two versions; percentiles cover the last ``window`` rows."""
+
+    def __init__(self, primary_version, threshold=0.5, window=10000):
+        self.primary_version = primary_version
+        self.threshold = threshold
+        self.window = int(window)
+        self.started = time.time()
+        self.rows = self.agree = self.dropped = self.errors = 0
+        self.served = dict.fromkeys(ROLES, 0)
+        self._deltas = deque(maxlen=self.window)
+        self._seconds = {role: deque(maxlen=self.window) for role in ROLES}
+        self._lock = threading.Lock()
+
+    def record(self, proba, seconds, served):
+        """One row scored by both models: ``proba`` and ``seconds`` map role -> value.
+
+        A latency of None (the served answer came from a cache or lookup
+        table) is left out of that model's latency percentiles."""
+        with self._lock:
+            self.rows += 1
+            self.served[served] += 1
+            self.agree += (proba['primary'] >= self.threshold) == (proba['challenger'] >= self.threshold)
+            self._deltas.append(proba['challenger'] - proba['primary'])
+            for role in ROLES:
+                if seconds.get(role) is not None:
+                    self._seconds[role].append(seconds[role])
+
+    def count(self, field):
+        """Increment ``dropped`` (pool full) or ``errors`` (shadow scoring failed)."""
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            deltas = np.asarray(self._deltas, dtype=np.float64)
+            seconds = {role: np.asarray(s, dtype=np.float64) for role, s in self._seconds.items()}
+            out = {
+                'primary_version': self.primary_version,
+                'since': self.started,
+                'rows': self.rows,
+                'served': dict(self.served),
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'agreement': self.agree / self.rows if self.rows else None,
+                'window': self.window
+            }
+        if len(deltas):
+            abs_d = np.abs(deltas)
+            out['delta'] = {'mean': float(deltas.mean()), 'mean_abs': float(abs_d.mean()),
+                            'max_abs': float(abs_d.max()),
+                            **{f'p{q}_abs': float(np.percentile(abs_d, q)) for q in (50, 95, 99)}}
+        out['latency_ms'] = {
+            role: {f'p{q}': float(np.percentile(s, q) * 1000) for q in (50, 95, 99)} if len(s) else None
+            for role, s in seconds.items()
+        }
+        return out
+
+
+class Challenger:
+    """A second loaded version: scored in the shadow of every request, and
+    in ``ab`` mode serving ``percent`` of them."""
+
+    def __init__(self, bundle, primary_version, mode='shadow', percent=0.0, threshold=0.5, window=10000):
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {MODES}')
+        if not 0 <= percent <= 100:
+            raise ValueError('percent must be between 0 and 100')
+        self.bundle = bundle
+        self.mode = mode
+        self.percent = float(percent)
+        self.stats = ShadowStats(primary_version, threshold, window)
+        self._lock = threading.Lock()
+
+    def routes(self, key):
+        """True when the A/B split sends the row with canonical bytes ``key`` to the challenger.
+
+        Hashing the row instead of drawing at random keeps a patient on the
+        same arm across repeated requests."""
+        if self.mode != 'ab' or self.percent <= 0:
+            return False
+        return zlib.crc32(key) % 10000 < self.percent * 100
+
+    def stats_for(self, primary_version):
+        """The running stats, restarted when the primary version has changed since they began."""
+        with self._lock:
+            if self.stats.primary_version != primary_version:
+                self.stats = ShadowStats(primary_version, self.stats.threshold, self.stats.window)
+            return self.stats
+
+    def as_dict(self):
+        return {
+            'version': self.bundle.version,
+            'model_sha256': self.bundle.model_sha256,
+            'mode': self.mode,
+            'percent': self.percent,
+            'stats': self.stats.as_dict()
+        }
+
+
+class ShadowPool:
+    """Background threads for shadow scoring.
+
+    At most ``max_pending`` rows wait or run at once; beyond that submit()
+    returns False and the row is not compared, so a slow challenger can
+    never build an unbounded backlog."""
+
+    def __init__(self, workers=1, max_pending=256):
+        self.workers = workers
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            # Threads start on first use, and again after shutdown() if the app restarts
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shadow')
+            future = self._pool.submit(fn, *args)
+        future.add_done_callback(lambda f: self._slots.release())
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,59 @@
+# api/startup.py
+"""Startup phase timing and readiness tracking."""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """Wall-clock time of each startup phase plus a readiness flag.
+
+    Phases run either at import (loading artifacts) or on the background
+    warm-up thread. Errors always propagate unless the phase is entered with
+    ``tolerate=True`` (warm-up only): then the error is recorded, the
+    exception is swallowed and the report is marked degraded, so one broken
+    explainer cannot keep the API from serving predictions."""
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = {}
+        self.errors = {}
+        self.current = None
+        self._ready = threading.Event()
+
+    @contextmanager
+    def phase(self, name, tolerate=False):
+        self.current = name
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.errors[name] = f'{type(e).__name__}: {e}'
+            if not tolerate:
+                raise
+        finally:
+            self.phases[name] = round((time.perf_counter() - t0) * 1000, 2)
+            self.current = None
+
+    def record(self, name, seconds):
+        self.phases[name] = round(seconds * 1000, 2)
+
+    def mark_ready(self):
+        self.phases['total'] = round((time.perf_counter() - self.started) * 1000, 2)
+        self._ready.set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def as_dict(self):
+        return {
+            'ready': self.ready,
+            'degraded': bool(self.errors),
+            'current_phase': self.current,
+            'phases_ms': dict(self.phases),
+            'errors': dict(self.errors)
+        }
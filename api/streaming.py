@@ -0,0 +1,153 @@
+# api/streaming.py
+"""Chunked scoring of CSV / NDJSON uploads with NDJSON results.
+
+Rows are decoded as they arrive, scored in fixed-size chunks and written back
+immediately, so memory is bounded by the chunk size rather than the upload.
+"""
+import codecs
+import csv
+import json
+
+import numpy as np
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from starlette.responses import Response
+
+CSV_TYPES = ('text/csv', 'application/csv')
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines')
+
+
+async def iter_lines(chunks):
+    """Yield decoded text lines from an async iterator of byte chunks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.rstrip('\r')
+
+
+def _error_message(e):
+    if isinstance(e, ValidationError):
+        return '; '.join(f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in e.errors())
+    return str(e)
+
+
+class StreamScorer:
+    """Decode rows in the data/heart.csv schema and score them chunk by chunk.
+
+    ``score`` maps an (n, n_features) float64 matrix to positive-class
+    probabilities; it runs in the threadpool so the event loop keeps reading
+    the upload while a chunk is being scored."""
+
+    def __init__(self, decoder, score, threshold, chunk_rows=1000):
+        self.decoder = decoder
+        self.score = score
+        self.threshold = threshold
+        self.chunk_rows = max(1, int(chunk_rows))
+
+    def _csv_rows(self):
+        header = None
+        def parse(line):
+            nonlocal header
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [h.strip() for h in values]
+                return None
+            if len(values) != len(header):
+                raise ValueError(f'expected {len(header)} columns, got {len(values)}')
+            # Empty cells are missing values, imputed like absent payload keys
+            return {k: (v if v.strip() else None) for k, v in zip(header, values)}
+        return parse
+
+    @staticmethod
+    def _ndjson_row(line):
+        obj = json.loads(line)
+        if isinstance(obj, dict) and isinstance(obj.get('payload'), dict):
+            obj = obj['payload']
+        return obj
+
+    async def results(self, chunks, fmt):
+        """Async generator of NDJSON result lines (bytes), in input row order.
+
+        Every row yields either {"row", "prediction", "probability"} or
+        {"row", "error"}; a final {"summary": ...} line closes the stream."""
+        parse = self._csv_rows() if fmt == 'csv' else self._ndjson_row
+        X = self.decoder.empty(self.chunk_rows)
+        errors = {}
+        start = n = 0
+        total = n_errors = 0
+
+        async def flush():
+            proba = np.empty(n)
+            ok = [i for i in range(n) if i not in errors]
+            if ok:
+                proba[ok] = await run_in_threadpool(self.score, X[ok])
+            out = []
+            for i in range(n):
+                row = {'row': start + i}
+                if i in errors:
+                    row['error'] = errors[i]
+                else:
+                    row['prediction'] = int(proba[i] >= self.threshold)
+                    row['probability'] = float(proba[i])
+                out.append(json.dumps(row))
+            return ('\n'.join(out) + '\n').encode()
+
+        async for line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            try:
+                payload = parse(line)
+                if payload is None:  # CSV header
+                    continue
+                self.decoder.decode(payload, X[n])
+            except (ValueError, ValidationError, csv.Error) as e:
+                errors[n] = _error_message(e)
+            n += 1
+            if n == self.chunk_rows:
+                yield await flush()
+                total += n; n_errors += len(errors)
+                start, n, errors = start + n, 0, {}
+        if n:
+            yield await flush()
+            total += n; n_errors += len(errors)
+        yield (json.dumps({'summary': {'rows': total, 'errors': n_errors, 'chunk_rows': self.chunk_rows}}) + '\n').encode()
+
+
+class ScoreStreamResponse(Response):
+    """Response that reads the request body and writes results itself.
+
+    StreamingResponse runs a disconnect listener that also calls receive(),
+    which swallows upload chunks when the body is read from inside the
+    response iterator. Owning both receive and send avoids that race."""
+    media_type = 'application/x-ndjson'
+
+    def __init__(self, scorer, fmt):
+        super().__init__(media_type=self.media_type)
+        self.scorer = scorer
+        self.fmt = fmt
+
+    async def __call__(self, scope, receive, send):
+        async def body():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    raise ClientDisconnect()
+                yield message.get('body', b'')
+                if not message.get('more_body', False):
+                    return
+
+        await send({'type': 'http.response.start', 'status': self.status_code,
+                    'headers': [(b'content-type', self.media_type.encode())]})
+        try:
+            async for chunk in self.scorer.results(body(), self.fmt):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        except ClientDisconnect:
+            return
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
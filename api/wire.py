@@ -0,0 +1,176 @@
+# api/wire.py
+"""Binary request and response formats for batch scoring.
+
+Upstream services that already hold feature matrices can skip JSON:
+
+* Arrow IPC stream (``application/vnd.apache.arrow.stream``): one column per
+  feature, named as in models/features.json. Each column is cast to float64
+  and copied once, straight into the model input matrix.
+* MessagePack (``application/msgpack``): ``{"columns": [...], "rows": [[...], ...]}``;
+  ``columns`` defaults to the model's features.
+
+In both, absent columns and null/NaN cells are missing values (imputed like
+absent payload keys) and unknown columns are ignored. pyarrow and msgpack
+are optional: without them the format is answered with 415 (requests) or
+JSON (responses).
+"""
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: Arrow IPC disabled without it
+    pa = None
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack disabled without it
+    msgpack = None
+
+ARROW_TYPES = ('application/vnd.apache.arrow.stream', 'application/vnd.apache.arrow.file')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+JSON_TYPE = 'application/json'
+ARROW_TYPE, MSGPACK_TYPE = ARROW_TYPES[0], MSGPACK_TYPES[0]
+
+
+class BatchTooLarge(ValueError):
+    """The body holds more rows than the caller allows."""
+
+
+def _check_rows(n_rows, max_rows):
+    if max_rows is not None and n_rows > max_rows:
+        raise BatchTooLarge(f'batch of {n_rows} rows exceeds MAX_BATCH_SIZE={max_rows}')
+
+
+def available(fmt):
+    return {'arrow': pa, 'msgpack': msgpack, 'json': True}[fmt] is not None
+
+
+def request_format(content_type):
+    """'arrow' / 'msgpack' for a binary Content-Type, else None."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ARROW_TYPES:
+        return 'arrow'
+    if content_type in MSGPACK_TYPES:
+        return 'msgpack'
+    return None
+
+
+def response_format(accept):
+    """Best installed format for an Accept header: 'arrow', 'msgpack' or 'json'.
+
+    Media ranges are taken in q-value order; JSON is the fallback, also when
+    only an uninstalled binary format is acceptable."""
+    ranked = []
+    for i, part in enumerate((accept or '').split(',')):
+        media, *params = [p.strip() for p in part.split(';')]
+        q = 1.0
+        for p in params:
+            if p.startswith('q='):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        ranked.append((-q, i, media.lower()))
+    for neg_q, _, media in sorted(ranked):
+        if neg_q >= 0:
+            break
+        fmt = request_format(media) or ('json' if media in (JSON_TYPE, 'application/*', '*/*') else None)
+        if fmt and available(fmt):
+            return fmt
+    return 'json'
+
+
+def columns_to_matrix(features, names, columns, n_rows):
+    """Write 1-d float columns into an (n_rows, len(features)) float64 matrix.
+
+    ``columns`` yields one array (or list of chunk arrays) per name in
+    ``names``. Returns (X, errors) like RowDecoder.decode_many: rows with
+    an infinite value are reported and left as NaN."""
+    X = np.full((n_rows, len(features)), np.nan, dtype=np.float64)
+    index = {f: j for j, f in enumerate(features)}
+    for name, column in zip(names, columns):
+        j = index.get(name)
+        if j is None:
+            continue
+        start = 0
+        for chunk in (column if isinstance(column, list) else [column]):
+            X[start:start + len(chunk), j] = chunk
+            start += len(chunk)
+        if start != n_rows:
+            raise ValueError(f'column {name!r} has {start} values, expected {n_rows}')
+    errors = {}
+    bad = np.isinf(X)
+    for i in np.flatnonzero(bad.any(axis=1)):
+        errors[int(i)] = '; '.join(f'{features[j]}: Input should be a finite number' for j in np.flatnonzero(bad[i]))
+        X[i] = np.nan
+    return X, errors
+
+
+def decode_arrow(body, features, max_rows=None):
+    """Arrow IPC stream (or file) bytes -> (X, errors).
+
+    Record batches are views into ``body``; the row count is checked before
+    any column is converted."""
+    source = pa.py_buffer(body)
+    reader = pa.ipc.open_file(source) if body.startswith(b'ARROW1') else pa.ipc.open_stream(source)
+    table = reader.read_all()
+    _check_rows(table.num_rows, max_rows)
+    columns = []
+    for name in table.column_names:
+        try:
+            columns.append([c.cast(pa.float64()).to_numpy(zero_copy_only=False) for c in table.column(name).chunks]
+                           if name in features else [])
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f'column {name!r} of type {table.schema.field(name).type} is not numeric: {e}')
+    return columns_to_matrix(features, table.column_names, columns, table.num_rows)
+
+
+def decode_msgpack(body, features, max_rows=None):
+    """MessagePack ``{"columns", "rows"}`` bytes -> (X, errors)."""
+    obj = msgpack.unpackb(body)
+    if not isinstance(obj, dict) or not isinstance(obj.get('rows'), list):
+        raise ValueError('expected a map with "rows" (list of rows) and optional "columns"')
+    _check_rows(len(obj['rows']), max_rows)
+    names = obj.get('columns') or list(features)
+    try:
+        M = np.array(obj['rows'], dtype=np.float64).reshape(len(obj['rows']), len(names))  # None -> NaN
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'rows must be lists of {len(names)} numbers (one per column): {e}')
+    return columns_to_matrix(features, names, M.T, len(M))
+
+
+def decode(fmt, body, features, max_rows=None):
+    """(X, errors) for a request body; BatchTooLarge past ``max_rows`` rows."""
+    return (decode_arrow if fmt == 'arrow' else decode_msgpack)(body, features, max_rows)
+
+
+def max_body_bytes(max_rows, n_features):
+    """Generous byte budget for ``max_rows`` rows in either format.
+
+    A float64 takes 8 bytes in Arrow and at most 9 in MessagePack; the rest
+    covers validity bitmaps, an error column and the schema or map keys."""
+    return max_rows * (n_features * 9 + 16) + (1 << 16)
+
+
+def encode_arrow(meta, proba, ok, errors, threshold):
+    """Batch results as an Arrow IPC stream.
+
+    One record batch with index / prediction / probability / error columns
+    (null where not applicable); the scalar fields in ``meta`` travel as
+    schema metadata."""
+    n = len(ok)
+    prediction = np.where(ok, proba >= threshold, 0).astype(np.int8)
+    table = pa.table({
+        'index': pa.array(np.arange(n, dtype=np.int32)),
+        'prediction': pa.array(prediction, mask=~ok),
+        'probability': pa.array(proba, mask=~ok),
+        'error': pa.array([errors.get(i) for i in range(n)], type=pa.string())
+    })
+    table = table.replace_schema_metadata({k: str(v) for k, v in meta.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_msgpack(out):
+    return msgpack.packb(out, use_bin_type=True)
@@ -1,4 +1,5 @@
 # app/streamlit_app.py
+import json
 import os
 import requests
 import streamlit as st
@@ -392,6 +393,106 @@ with st.sidebar:
     
     st.markdown("---")
 
+def iter_sse(resp):
+    """Yield (event, data) from a text/event-stream response as events arrive."""
+    event, data = None, []
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line:
+            if event is not None:
+                yield event, json.loads('\n'.join(data))
+            event, data = None, []
+        elif line.startswith('event:'):
+            event = line[6:].strip()
+        elif line.startswith('data:'):
+            data.append(line[5:].strip())
+
+def render_shap(exp):
+    """SHAP chart and insights for an explanation (or its error)."""
+    if exp.get('shap'):
+        df_shap = pd.DataFrame(exp['shap'])
+        df_shap = df_shap.sort_values('contribution', key=abs, ascending=False)
+        
+        # Enhanced SHAP visualization
+        fig_shap = px.bar(
+            df_shap.head(10), 
+            x='contribution', 
+            y='feature',
+            orientation='h',
+            color='contribution',
+            color_continuous_scale='RdBu_r',
+            labels={'contribution': 'SHAP Value (Impact on Risk)', 'feature': 'Patient Feature'},
+            title='🎯 Feature Importance - SHAP Values',
+            text='contribution'
+        )
+        fig_shap.update_traces(texttemplate='%{text:.3f}', textposition='outside')
+        fig_shap.update_layout(
+            height=500, 
+            showlegend=False,
+            xaxis_title="Impact on Prediction",
+            yaxis_title="",
+            font=dict(size=12),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig_shap, use_container_width=True)
+        
+        # Feature interpretation
+        st.markdown("#### 💡 Key Insights:")
+        top_features = df_shap.head(3)
+        for idx, row in top_features.iterrows():
+            impact = "increases" if row['contribution'] > 0 else "decreases"
+            emoji = "🔴" if row['contribution'] > 0 else "🟢"
+            st.markdown(f"{emoji} **{row['feature']}** {impact} risk by **{abs(row['contribution']):.3f}**")
+        
+        with st.expander('📋 View Complete SHAP Data'):
+            st.dataframe(df_shap, use_container_width=True, height=300)
+    else:
+        st.warning(f'⚠️ SHAP analysis not available: {exp.get("shap_error", "Unknown error")}')
+        st.info('💡 SHAP explanations provide the most accurate feature importance. If unavailable, check API logs.')
+
+def render_lime(exp):
+    """LIME chart and insights for an explanation (or its error)."""
+    if exp.get('lime'):
+        df_lime = pd.DataFrame(exp['lime'])
+        df_lime = df_lime.sort_values('weight', key=abs, ascending=False)
+        
+        # Enhanced LIME visualization
+        fig_lime = px.bar(
+            df_lime.head(10),
+            x='weight',
+            y='feature',
+            orientation='h',
+            color='weight',
+            color_continuous_scale='RdYlGn_r',
+            labels={'weight': 'LIME Weight (Feature Importance)', 'feature': 'Patient Feature'},
+            title='🎯 Local Feature Importance - LIME Weights',
+            text='weight'
+        )
+        fig_lime.update_traces(texttemplate='%{text:.3f}', textposition='outside')
+        fig_lime.update_layout(
+            height=500, 
+            showlegend=False,
+            xaxis_title="Feature Weight",
+            yaxis_title="",
+            font=dict(size=12),
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig_lime, use_container_width=True)
+        
+        # Feature interpretation
+        st.markdown("#### 💡 Key Insights:")
+        top_features = df_lime.head(3)
+        for idx, row in top_features.iterrows():
+            impact = "increases" if row['weight'] > 0 else "decreases"
+            emoji = "🔴" if row['weight'] > 0 else "🟢"
+            st.markdown(f"{emoji} **{row['feature']}** {impact} risk (weight: **{abs(row['weight']):.3f}**)")
+        
+        with st.expander('📋 View Complete LIME Data'):
+            st.dataframe(df_lime, use_container_width=True, height=300)
+    else:
+        st.warning(f'⚠️ LIME analysis not available: {exp.get("lime_error", "Unknown error")}')
+
 # Validation functions
 def validate_age(value):
     try:
@@ -984,70 +1085,15 @@ if len(payload) == len(FIELD_ORDER):
     st.markdown("---")
     st.markdown("## 🔬 AI Explanation")
     
-    try:
-        with st.spinner('🧠 Generating AI explanations with SHAP & LIME... This may take 30-60 seconds.'):
-            resp = requests.post(f'{API_URL}/explain', json={'payload': payload}, timeout=120)
-            resp.raise_for_status()
-            exp = resp.json()
-    except requests.exceptions.Timeout:
-        exp = {'shap': None, 'lime': None, 'shap_error': 'Timeout - explanation took too long', 'lime_error': 'Timeout'}
-        st.warning('⏱️ Explanation generation timed out. Try again or continue without detailed explanations.')
-    except requests.exceptions.ConnectionError as e:
-        exp = {'shap': None, 'lime': None, 'shap_error': f'Connection error: {str(e)}', 'lime_error': 'Connection error'}
-        st.error('❌ Cannot connect to explanation service.')
-    except Exception as e:
-        exp = {'shap': None, 'lime': None, 'shap_error': str(e), 'lime_error': str(e)}
-        st.error(f'❌ Error generating explanations: {str(e)}')
-
-    # Explanation tabs
+    # Tabs are laid out first and filled as /explain/stream delivers each
+    # stage, so SHAP shows up without waiting for LIME
+    score_slot = st.empty()
+    status = st.status('🧠 Generating AI explanations with SHAP & LIME...')
     tab1, tab2 = st.tabs(['📊 SHAP Analysis', '🧩 LIME Analysis'])
-    
     with tab1:
         st.markdown('<div class="explanation-box">', unsafe_allow_html=True)
-        
-        if exp.get('shap'):
-            df_shap = pd.DataFrame(exp['shap'])
-            df_shap = df_shap.sort_values('contribution', key=abs, ascending=False)
-            
-            # Enhanced SHAP visualization
-            fig_shap = px.bar(
-                df_shap.head(10), 
-                x='contribution', 
-                y='feature',
-                orientation='h',
-                color='contribution',
-                color_continuous_scale='RdBu_r',
-                labels={'contribution': 'SHAP Value (Impact on Risk)', 'feature': 'Patient Feature'},
-                title='🎯 Feature Importance - SHAP Values',
-                text='contribution'
-            )
-            fig_shap.update_traces(texttemplate='%{text:.3f}', textposition='outside')
-            fig_shap.update_layout(
-                height=500, 
-                showlegend=False,
-                xaxis_title="Impact on Prediction",
-                yaxis_title="",
-                font=dict(size=12),
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_shap, use_container_width=True)
-            
-            # Feature interpretation
-            st.markdown("#### 💡 Key Insights:")
-            top_features = df_shap.head(3)
-            for idx, row in top_features.iterrows():
-                impact = "increases" if row['contribution'] > 0 else "decreases"
-                emoji = "🔴" if row['contribution'] > 0 else "🟢"
-                st.markdown(f"{emoji} **{row['feature']}** {impact} risk by **{abs(row['contribution']):.3f}**")
-            
-            with st.expander('📋 View Complete SHAP Data'):
-                st.dataframe(df_shap, use_container_width=True, height=300)
-        else:
-            st.warning(f'⚠️ SHAP analysis not available: {exp.get("shap_error", "Unknown error")}')
-            st.info('💡 SHAP explanations provide the most accurate feature importance. If unavailable, check API logs.')
+        shap_slot = st.empty()
         st.markdown('</div>', unsafe_allow_html=True)
-    
     with tab2:
         st.markdown('<div class="explanation-box">', unsafe_allow_html=True)
         st.markdown("### What is LIME?")
@@ -1058,47 +1104,44 @@ if len(payload) == len(FIELD_ORDER):
         - Green = reduces risk, Red = increases risk
         """)
         
-        if exp.get('lime'):
-            df_lime = pd.DataFrame(exp['lime'])
-            df_lime = df_lime.sort_values('weight', key=abs, ascending=False)
-            
-            # Enhanced LIME visualization
-            fig_lime = px.bar(
-                df_lime.head(10),
-                x='weight',
-                y='feature',
-                orientation='h',
-                color='weight',
-                color_continuous_scale='RdYlGn_r',
-                labels={'weight': 'LIME Weight (Feature Importance)', 'feature': 'Patient Feature'},
-                title='🎯 Local Feature Importance - LIME Weights',
-                text='weight'
-            )
-            fig_lime.update_traces(texttemplate='%{text:.3f}', textposition='outside')
-            fig_lime.update_layout(
-                height=500, 
-                showlegend=False,
-                xaxis_title="Feature Weight",
-                yaxis_title="",
-                font=dict(size=12),
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)'
-            )
-            st.plotly_chart(fig_lime, use_container_width=True)
-            
-            # Feature interpretation
-            st.markdown("#### 💡 Key Insights:")
-            top_features = df_lime.head(3)
-            for idx, row in top_features.iterrows():
-                impact = "increases" if row['weight'] > 0 else "decreases"
-                emoji = "🔴" if row['weight'] > 0 else "🟢"
-                st.markdown(f"{emoji} **{row['feature']}** {impact} risk (weight: **{abs(row['weight']):.3f}**)")
-            
-            with st.expander('📋 View Complete LIME Data'):
-                st.dataframe(df_lime, use_container_width=True, height=300)
-        else:
-            st.warning(f'⚠️ LIME analysis not available: {exp.get("lime_error", "Unknown error")}')
+        lime_slot = st.empty()
         st.markdown('</div>', unsafe_allow_html=True)
+    shap_slot.info('⏳ Computing SHAP values...')
+    lime_slot.info('⏳ Computing LIME weights...')
+    slots = {'shap': (shap_slot, render_shap), 'lime': (lime_slot, render_lime)}
+
+    exp = {}
+    try:
+        with status:
+            with requests.post(f'{API_URL}/explain/stream', json={'payload': payload}, stream=True, timeout=120) as resp:
+                resp.raise_for_status()
+                for event, data in iter_sse(resp):
+                    if event == 'error':
+                        raise RuntimeError(data['error'])
+                    if event == 'prediction':
+                        score_slot.caption(f"Explaining a risk score of {data['probability']:.1%} "
+                                           f"(model {data.get('model_version', 'unknown')})")
+                    elif event in slots:
+                        exp.update(data)
+                        slot, render = slots.pop(event)
+                        with slot.container():
+                            render(exp)
+                        status.write(f"{'✅' if data.get(event) else '⚠️'} {event.upper()} ready")
+                    elif event == 'timings':
+                        status.update(label=f"✅ Explanations ready in {data['cost_ms']['total']:.0f} ms", state='complete')
+    except requests.exceptions.Timeout:
+        exp.update(shap_error='Timeout - explanation took too long', lime_error='Timeout')
+        st.warning('⏱️ Explanation generation timed out. Try again or continue without detailed explanations.')
+    except requests.exceptions.ConnectionError as e:
+        exp.update(shap_error=f'Connection error: {str(e)}', lime_error='Connection error')
+        st.error('❌ Cannot connect to explanation service.')
+    except Exception as e:
+        exp.update(shap_error=str(e), lime_error=str(e))
+        st.error(f'❌ Error generating explanations: {str(e)}')
+    # Stages that never arrived show their error instead of the spinner
+    for slot, render in slots.values():
+        with slot.container():
+            render(exp)
     
     # ============================================================================
     # ACTION RECOMMENDATIONS
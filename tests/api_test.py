@@ -0,0 +1,394 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from api.api import app, FEATURES, STARTUP
+from api.startup import StartupReport
+
+client = TestClient(app)
+
+PATIENT = {
+    'age': 63, 'sex': 1, 'bmi': 26.5, 'smoker': 0, 'diabetes': 1,
+    'phys_activity': 1, 'sleep_hours': 8.0, 'gen_health': 4
+}
+
+def test_predict_batch_matches_single_predict():
+    other = dict(PATIENT, age=39, smoker=1, bmi=24.3)
+    single = [client.post('/predict', json={'payload': p}).json()['probability'] for p in (PATIENT, other)]
+    resp = client.post('/predict_batch', json={'payloads': [PATIENT, other]})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [r['index'] for r in body['results']] == [0, 1]
+    assert np.allclose([r['probability'] for r in body['results']], single)
+    assert body['features_used'] == FEATURES
+
+def test_predict_batch_reports_row_errors():
+    bad = dict(PATIENT, bmi='not-a-number')
+    resp = client.post('/predict_batch', json={'payloads': [PATIENT, bad, {}, None, 'x']})
+    assert resp.status_code == 200
+    results = resp.json()['results']
+    assert 'probability' in results[0]
+    assert 'error' in results[1] and 'probability' not in results[1]
+    # missing keys are imputed, not rejected
+    assert 'probability' in results[2]
+    # non-object elements fail only their own row
+    assert 'error' in results[3] and 'error' in results[4]
+
+def test_explain_uses_cached_shap_explainer():
+    body = client.post('/explain', json={'payload': PATIENT}).json()
+    assert body['shap_cached'] is True
+    assert body['shap'] and len(body['shap']) <= 10
+
+def test_predict_decodes_typed_payload():
+    partial = {k: v for k, v in PATIENT.items() if k != 'sleep_hours'}
+    resp = client.post('/predict', json={'payload': dict(partial, bmi='26.5', extra_key=1)})
+    assert resp.status_code == 200
+    assert client.post('/predict', json={'payload': dict(PATIENT, bmi='heavy')}).status_code == 422
+    body = '{"payload": {"age": 50, "bmi": Infinity}}'
+    assert client.post('/predict', content=body, headers={'content-type': 'application/json'}).status_code == 422
+
+def test_predict_cache_hits_on_equivalent_payload():
+    payload = dict(PATIENT, age=58, bmi=31)
+    first = client.post('/predict', json={'payload': payload}).json()
+    # same values, different key order and numeric spelling
+    again = client.post('/predict', json={'payload': dict(reversed(list(payload.items())), bmi=31.0)}).json()
+    assert again['cached'] is True
+    assert again['probability'] == first['probability']
+    assert client.get('/cache/stats').json()['predict']['hits'] >= 1
+
+def test_explain_cache_serves_repeat_requests():
+    payload = dict(PATIENT, age=71, sleep_hours=5.5)
+    client.delete('/cache/explain')
+    first = client.post('/explain', json={'payload': payload}).json()
+    again = client.post('/explain', json={'payload': payload}).json()
+    assert first['cache'] == 'miss'
+    assert again['cache'] == 'memory'
+    assert again['shap'] == first['shap'] and again['lime'] == first['lime']
+
+def test_explain_job_submit_and_poll():
+    client.delete('/cache/explain')
+    resp = client.post('/explain/jobs', json={'payload': dict(PATIENT, age=45)})
+    assert resp.status_code == 202
+    job_id = resp.json()['job_id']
+    for _ in range(600):
+        job = client.get(f'/explain/jobs/{job_id}').json()
+        if job['status'] in ('done', 'failed'):
+            break
+        time.sleep(0.05)
+    assert job['status'] == 'done'
+    assert job['stages_done'] == ['shap', 'lime']
+    assert job['result']['shap'] and job['result']['lime']
+    assert 'shap_ms' in job['timings_ms'] and 'total_ms' in job['timings_ms']
+    assert client.get('/explain/jobs/not-a-job').status_code == 404
+
+def test_published_stage_results_are_snapshots():
+    import api.api as api_module
+    inp = api_module.PatientInput(payload=dict(PATIENT, age=46))
+    params = api_module._explain_params(top_k=3)
+    seen = []
+    api_module._compute_explanation(api_module.MODELS.current, inp, params,
+                                    on_stage=lambda name, out, seconds: seen.append((name, out)))
+    (_, after_shap), (_, after_lime) = seen
+    assert set(after_shap['cost_ms']) == {'shap', 'total'} and after_shap['lime'] is None
+    assert set(after_lime['cost_ms']) == {'shap', 'lime', 'total'}
+
+def test_ready_reports_warm_up_phases():
+    with TestClient(app) as warm_client:
+        resp = warm_client.get('/ready')
+        for _ in range(600):
+            if resp.status_code == 200:
+                break
+            assert resp.status_code == 503
+            time.sleep(0.05)
+            resp = warm_client.get('/ready')
+        body = resp.json()
+    assert body['ready'] is True
+    for phase in ('import', 'load_model', 'warm_predict', 'warm_shap', 'warm_lime', 'total'):
+        assert phase in body['phases_ms']
+
+def test_ready_stays_up_when_only_an_explainer_failed(monkeypatch):
+    report = StartupReport()
+    with report.phase('warm_lime', tolerate=True):
+        raise RuntimeError('boom')
+    report.mark_ready()
+    monkeypatch.setattr(STARTUP, 'errors', report.errors)
+    monkeypatch.setattr(STARTUP, '_ready', report._ready)
+    resp = client.get('/ready')
+    assert resp.status_code == 200
+    assert resp.json()['degraded'] is True and resp.json()['failed'] == ['warm_lime']
+    assert 'boom' in resp.json()['errors']['warm_lime']
+    assert client.get('/ready?strict=true').status_code == 503
+    with report.phase('warm_predict', tolerate=True):
+        raise RuntimeError('engine broken')
+    assert client.get('/ready').status_code == 503
+    # Import-time phases are not tolerated: a missing model must stop the worker
+    with pytest.raises(OSError):
+        with report.phase('load_model'):
+            raise OSError('missing')
+
+def test_predict_stream_scores_csv_in_order():
+    import json
+    with open('data/heart.csv') as f:
+        lines = f.read().splitlines()[:8]
+    lines[3] = lines[3].replace(lines[3].split(',')[2], 'abc', 1)  # bad bmi on data row 2
+    # Run in a worker so a stalled upload fails the test instead of hanging the suite
+    with ThreadPoolExecutor(1) as pool:
+        resp = pool.submit(client.post, '/predict_stream?chunk_rows=3', content='\n'.join(lines).encode(),
+                           headers={'content-type': 'text/csv'}).result(timeout=60)
+    assert resp.status_code == 200
+    out = [json.loads(l) for l in resp.text.splitlines()]
+    rows, summary = out[:-1], out[-1]['summary']
+    assert [r['row'] for r in rows] == list(range(7))
+    assert 'error' in rows[2] and all('probability' in r for i, r in enumerate(rows) if i != 2)
+    assert summary == {'rows': 7, 'errors': 1, 'chunk_rows': 3}
+
+    ndjson = '\n'.join(json.dumps({'payload': PATIENT}) for _ in range(2))
+    resp = client.post('/predict_stream', content=ndjson, headers={'content-type': 'application/x-ndjson'})
+    first = json.loads(resp.text.splitlines()[0])
+    assert first['probability'] == client.post('/predict', json={'payload': PATIENT}).json()['probability']
+
+def test_metrics_exposes_request_and_stage_latency():
+    client.post('/predict', json={'payload': PATIENT})
+    resp = client.get('/metrics')
+    assert resp.status_code == 200 and resp.headers['content-type'].startswith('text/plain')
+    text = resp.text
+    assert 'heart_api_request_seconds_count{method="POST",endpoint="/predict",status="200"}' in text
+    assert 'heart_api_stage_seconds_bucket{stage="decode",le="+Inf"}' in text
+    assert 'heart_api_cache_hit_ratio{cache="predict",tier="memory"}' in text
+    assert 'heart_api_model_info{model_sha256=' in text
+
+def test_profiled_explain_reports_stages(monkeypatch, tmp_path):
+    import api.api as api_module
+    assert client.post('/explain?profile=true', json={'payload': PATIENT}).status_code == 403
+    monkeypatch.setattr(api_module, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(api_module, 'PROFILE_DIR', str(tmp_path))
+    resp = client.post('/explain', json={'payload': PATIENT}, headers={'X-Profile': '1'})
+    assert resp.status_code == 200
+    profile = resp.json()['profile']
+    assert {'shap_values', 'lime_explain'} <= set(profile['stages_ms'])
+    assert profile['hot_functions'] and profile['profile_file'].startswith(str(tmp_path))
+    assert 'profile' not in client.post('/predict', json={'payload': PATIENT}).json()
+
+def test_explain_methods_and_cost_knobs():
+    resp = client.post('/explain/shap?top_k=3', json={'payload': PATIENT})
+    body = resp.json()
+    assert resp.status_code == 200 and len(body['shap']) == 3 and 'lime' not in body
+    assert body['cost_ms']['total'] >= 0 and body['params']['methods'] == ['shap']
+    first = client.post('/explain/lime?num_samples=50&seed=7&top_k=4', json={'payload': PATIENT}).json()
+    client.delete('/cache/explain')
+    again = client.post('/explain?methods=lime&num_samples=50&seed=7&top_k=4', json={'payload': PATIENT}).json()
+    assert len(first['lime']) == 4 and first['lime'] == again['lime'] and again['cache'] == 'miss'
+    assert 'lime' in first['cost_ms'] and 'shap' not in first['cost_ms']
+    assert client.post('/explain?methods=gradcam', json={'payload': PATIENT}).status_code == 400
+    assert client.post('/explain?num_samples=1', json={'payload': PATIENT}).status_code == 422
+
+def test_shap_batch_contributions_sum_to_probability():
+    rows = [PATIENT, {'age': 'old'}, dict(PATIENT, bmi=35.0)]
+    body = client.post('/explain/shap/batch', json={'payloads': rows}).json()
+    assert body['n_explained'] == 2 and list(body['errors']) == ['1'] and body['values'][1] is None
+    assert len(body['values'][0]) == len(body['features'])
+    probas = client.post('/predict_batch', json={'payloads': rows}).json()['results']
+    for i in (0, 2):
+        total = body['expected_value'] + sum(body['values'][i])
+        assert abs(total - probas[i]['probability']) < 1e-6
+
+def test_global_importance_is_served_from_artifact():
+    resp = client.get('/global_importance')
+    assert resp.status_code == 200 and resp.headers['etag']
+    body = resp.json()
+    assert {r['feature'] for r in body['importance']} == set(body['features'])
+    assert set(body['dependence']) == set(body['features'])
+    assert len(body['interactions']['mean_abs']) == len(body['features'])
+
+def test_what_if_scores_grid_in_one_call():
+    body = client.post('/what_if', json={'payload': PATIENT, 'axes': [
+        {'feature': 'bmi', 'start': 18, 'stop': 40, 'num': 12},
+        {'feature': 'sleep_hours', 'values': [4, 7, 10]}]}).json()
+    assert body['n_points'] == 36 and np.shape(body['probability']) == (12, 3)
+    single = client.post('/predict', json={'payload': dict(PATIENT, bmi=40.0, sleep_hours=10)}).json()
+    assert abs(body['probability'][-1][-1] - single['probability']) < 1e-12
+    assert abs(body['baseline']['probability'] - client.post('/predict', json={'payload': PATIENT}).json()['probability']) < 1e-12
+    bad = client.post('/what_if', json={'payload': PATIENT, 'axes': [{'feature': 'height', 'values': [1]}]})
+    assert bad.status_code == 422
+
+def test_predict_lookup_mode_uses_table_on_grid(monkeypatch):
+    import api.api as api_module
+    from api.lookup import build_table
+    axes = [[PATIENT[f]] for f in FEATURES]
+    axes[FEATURES.index('bmi')] = [25.0, 26.0, 27.0]
+    snap = ['nearest' if f == 'bmi' else 'exact' for f in FEATURES]
+    bundle = api_module.MODELS.current
+    table = build_table(lambda X: api_module._score(bundle, X), FEATURES, axes, snap)
+    table.error = {'random': {'max_abs_error': 0.01}}
+    exact = client.post('/predict', json={'payload': dict(PATIENT, bmi=26.0)}).json()
+    monkeypatch.setattr(bundle, 'lookup', table)
+    body = client.post('/predict', json={'payload': dict(PATIENT, bmi=26.2)}).json()
+    assert body['engine'] == 'lookup' and body['quantization'] == {'max_abs_error': 0.01}
+    assert abs(body['probability'] - exact['probability']) < 1e-6
+    off_grid = client.post('/predict', json={'payload': dict(PATIENT, age=PATIENT['age'] + 1)}).json()
+    assert off_grid['engine'] != 'lookup'
+
+def test_admin_reload_swaps_in_registry_version(monkeypatch, tmp_path):
+    import api.api as api_module
+    from api.registry import publish
+    assert client.get('/admin/models').status_code == 403
+    monkeypatch.setattr(api_module, 'ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(api_module, 'MODEL_REGISTRY_DIR', str(tmp_path))
+    monkeypatch.setattr(api_module.MODELS, 'current', api_module.MODELS.current)  # restored afterwards
+    headers = {'X-Admin-Token': 'secret'}
+    assert client.get('/admin/models', headers={'X-Admin-Token': 'wrong'}).status_code == 401
+    assert client.post('/admin/models/reload', headers=headers).status_code == 404  # no CURRENT yet
+    manifest = publish(tmp_path, 'models', version='v2')
+    before = client.post('/predict', json={'payload': PATIENT}).json()
+    resp = client.post('/admin/models/reload', json={'version': 'v2', 'activate': True}, headers=headers)
+    assert resp.status_code == 202
+    for _ in range(600):
+        status = client.get('/admin/models', headers=headers).json()
+        if status['reload']['status'] != 'loading':
+            break
+        time.sleep(0.05)
+    assert status['reload']['status'] == 'done', status['reload']
+    assert status['serving']['version'] == 'v2' and status['current'] == 'v2'
+    assert status['versions'][0]['model_sha256'] == manifest['model_sha256']
+    after = client.post('/predict', json={'payload': PATIENT}).json()
+    assert after['model_version'] == 'v2' and after['probability'] == before['probability']
+    assert client.post('/admin/models/reload', json={'version': 'nope'}, headers=headers).status_code == 404
+
+def test_challenger_shadow_and_ab_routing(monkeypatch, tmp_path):
+    import api.api as api_module
+    from api.registry import publish
+    monkeypatch.setattr(api_module, 'ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(api_module, 'MODEL_REGISTRY_DIR', str(tmp_path))
+    monkeypatch.setattr(api_module.MODELS, 'challenger', None)
+    headers = {'X-Admin-Token': 'secret'}
+    publish(tmp_path, 'models', version='cand')
+    assert client.put('/admin/models/challenger', json={'version': 'cand', 'percent': 101}, headers=headers).status_code == 422
+    resp = client.put('/admin/models/challenger', json={'version': 'cand', 'mode': 'ab', 'percent': 100}, headers=headers)
+    assert resp.status_code == 202
+    for _ in range(600):
+        if client.get('/admin/models', headers=headers).json()['reload']['status'] != 'loading':
+            break
+        time.sleep(0.05)
+    assert client.post('/predict', json={'payload': PATIENT}).json()['model_version'] == 'cand'
+    resp = client.put('/admin/models/challenger', json={'version': 'cand'}, headers=headers)
+    assert resp.status_code == 200 and resp.json()['challenger']['mode'] == 'shadow'
+    served = client.post('/predict', json={'payload': dict(PATIENT, age=44)}).json()
+    assert served['model_version'] == api_module.MODELS.current.version
+    for _ in range(200):
+        stats = client.get('/shadow/stats').json()['challenger']['stats']
+        if stats['rows'] >= 2:
+            break
+        time.sleep(0.02)
+    assert stats['served'] == {'primary': 1, 'challenger': 1}
+    assert stats['agreement'] == 1.0 and stats['delta']['max_abs'] == 0.0  # same artifact
+    assert 'heart_api_shadow_rows_total{outcome="agree"}' in client.get('/metrics').text
+    assert client.delete('/admin/models/challenger', headers=headers).json()['removed']['version'] == 'cand'
+    assert client.get('/shadow/stats').json()['challenger'] is None
+
+def test_predict_micro_batches_concurrent_requests(monkeypatch):
+    import api.api as api_module
+    from api.batching import MicroBatcher
+    sizes = []
+    monkeypatch.setattr(api_module, 'BATCHER', MicroBatcher(
+        window=0.05, max_batch=16, on_batch=lambda rows, waits: (sizes.append(rows), api_module._observe_batch(rows, waits))))
+    payloads = [dict(PATIENT, age=30 + i, sleep_hours=6.25) for i in range(8)]  # uncached rows
+    with ThreadPoolExecutor(8) as pool:
+        batched = list(pool.map(lambda p: client.post('/predict', json={'payload': p}).json(), payloads))
+    assert sum(sizes) == 8 and max(sizes) > 1
+    direct = client.post('/predict_batch', json={'payloads': payloads}).json()['results']
+    assert [b['probability'] for b in batched] == pytest.approx([d['probability'] for d in direct], abs=1e-12)
+    assert 'heart_api_predict_batch_rows_count' in client.get('/metrics').text
+
+def test_compact_responses_and_metadata():
+    meta = client.get('/metadata').json()
+    assert meta['features'] == FEATURES and meta['threshold'] == 0.5
+    full = client.post('/predict', json={'payload': PATIENT}).json()
+    compact = client.post('/predict?compact=true', json={'payload': PATIENT}).json()
+    assert 'features_used' not in compact and 'threshold' not in compact
+    assert compact['probability'] == full['probability']
+    body = client.post('/explain/shap?compact=true&top_k=3', json={'payload': PATIENT}).json()
+    assert all(r['feature'] in FEATURES for r in body['shap'])
+    assert all(len(repr(r['contribution']).split('.')[-1]) <= 6 for r in body['shap'])
+    batch = client.post('/explain/shap/batch?compact=true', json={'payloads': [PATIENT]}).json()
+    assert batch['features'] == [n.split('__', 1)[-1] for n in meta['explained_features']]
+
+def test_large_responses_are_gzipped_and_errors_hide_tracebacks(monkeypatch):
+    import api.api as api_module
+    payloads = [dict(PATIENT, age=20 + i % 60) for i in range(200)]
+    resp = client.post('/predict_batch', json={'payloads': payloads}, headers={'Accept-Encoding': 'gzip'})
+    assert resp.headers['content-encoding'] == 'gzip' and resp.num_bytes_downloaded < len(resp.content) / 3
+    small = client.post('/predict?compact=true', json={'payload': PATIENT}, headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in small.headers
+
+    class Broken:
+        name = 'broken'
+        def predict_proba(self, X):
+            raise RuntimeError('engine exploded')
+    monkeypatch.setattr(api_module.MODELS.current, 'engine', Broken())
+    resp = client.post('/predict', json={'payload': dict(PATIENT, age=99)})
+    assert resp.status_code == 500 and resp.json()['detail'] == {'error': 'engine exploded'}
+
+def test_predict_batch_matrix_refuses_oversized_bodies_before_decoding(monkeypatch):
+    import api.api as api_module
+    from api import wire
+    class Unreachable:
+        def unpackb(self, body):
+            raise AssertionError('an oversized body must not be decoded')
+    monkeypatch.setattr(wire, 'msgpack', Unreachable())
+    monkeypatch.setattr(api_module, 'MAX_MATRIX_BODY_BYTES', 100)
+    headers = {'Content-Type': 'application/msgpack'}
+    resp = client.post('/predict_batch/matrix', content=b'\x00' * 101, headers=headers)
+    assert resp.status_code == 413 and 'MAX_MATRIX_BODY_BYTES' in resp.json()['detail']['error']
+    # Without Content-Length the limit applies while the body is read
+    resp = client.post('/predict_batch/matrix', content=iter([b'\x00' * 60, b'\x00' * 60]), headers=headers)
+    assert resp.status_code == 413
+
+def test_predict_batch_matrix_negotiates_binary_formats():
+    from api import wire
+    resp = client.post('/predict_batch/matrix', content=b'{}', headers={'Content-Type': 'application/json'})
+    assert resp.status_code == 415
+    # Without the codec installed the JSON response is the fallback
+    resp = client.post('/predict_batch', json={'payloads': [PATIENT]}, headers={'Accept': 'application/msgpack'})
+    expected = 'application/msgpack' if wire.available('msgpack') else 'application/json'
+    assert resp.headers['content-type'] == expected
+    if not wire.available('msgpack'):
+        resp = client.post('/predict_batch/matrix', content=b'\x80', headers={'Content-Type': 'application/msgpack'})
+        assert resp.status_code == 415 and 'not installed' in resp.json()['detail']['error']
+        return
+    import msgpack
+    single = client.post('/predict', json={'payload': PATIENT}).json()['probability']
+    body = msgpack.packb({'columns': FEATURES, 'rows': [[PATIENT[f] for f in FEATURES], [1e400] * len(FEATURES)]})
+    resp = client.post('/predict_batch/matrix', content=body, headers={'Content-Type': 'application/msgpack',
+                                                                     'Accept': 'application/msgpack'})
+    out = msgpack.unpackb(resp.content)
+    assert out['n_scored'] == 1 and 'error' in out['results'][1]
+    assert np.isclose(out['results'][0]['probability'], single)
+
+def _sse_events(text):
+    events = []
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+def test_explain_stream_emits_stages_in_order():
+    payload = dict(PATIENT, age=58, bmi=31.0)
+    resp = client.post('/explain/stream?top_k=3&seed=1', json={'payload': payload},
+                       headers={'Accept-Encoding': 'gzip'})
+    assert resp.status_code == 200 and resp.headers['content-type'].startswith('text/event-stream')
+    assert 'content-encoding' not in resp.headers  # gzip would buffer the events
+    events = _sse_events(resp.text)
+    assert [name for name, _ in events] == ['prediction', 'shap', 'lime', 'timings']
+    single = client.post('/predict', json={'payload': payload}).json()
+    assert events[0][1]['probability'] == single['probability']
+    assert len(events[1][1]['shap']) == 3 and len(events[2][1]['lime']) == 3
+    assert {'prediction', 'shap', 'lime', 'total'} <= set(events[3][1]['cost_ms'])
+    assert events[3][1]['cache'] == 'miss'
+    # The finished explanation is cached for /explain and later streams
+    again = _sse_events(client.post('/explain/stream?top_k=3&seed=1&compact=true', json={'payload': payload}).text)
+    assert again[3][1]['cache'] != 'miss' and 'features_used' not in again[0][1]
+    assert [r['feature'] for r in again[1][1]['shap']] == [r['feature'].split('__', 1)[-1] for r in events[1][1]['shap']]
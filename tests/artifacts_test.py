@@ -0,0 +1,20 @@
+# tests/artifacts_test.py
+import json, joblib
+import numpy as np
+import pytest
+
+from api.artifacts import export_shared, load_shared
+from api.inference import CompiledForest, probe_rows
+
+def test_shared_artifacts_roundtrip_memory_mapped(tmp_path):
+    model = joblib.load('models/model.joblib')
+    with open('models/features.json') as f:
+        features = json.load(f)
+    compiled = CompiledForest.from_pipeline(model, features)
+    export_shared(tmp_path, compiled, 'abc')
+    loaded, manifest = load_shared(tmp_path, model_sha256='abc')
+    assert isinstance(loaded.value.base, np.memmap) and manifest['model_sha256'] == 'abc'
+    X = probe_rows(compiled, n=64)
+    assert np.array_equal(loaded.predict_proba(X), compiled.predict_proba(X))
+    with pytest.raises(ValueError):
+        load_shared(tmp_path, model_sha256='other')
@@ -0,0 +1,47 @@
+# tests/batching_test.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from api.batching import MicroBatcher
+
+def test_concurrent_rows_share_one_call_per_model():
+    calls, batches = [], []
+    def score(X):
+        calls.append(len(X))
+        return X[:, 0] * 10
+    batcher = MicroBatcher(window=0.2, max_batch=8, on_batch=lambda rows, waits: batches.append(rows))
+    with ThreadPoolExecutor(8) as pool:
+        out = list(pool.map(lambda i: batcher.submit('m', np.array([float(i), 0.0]), score), range(8)))
+    assert out == [i * 10 for i in range(8)]
+    assert sum(calls) == 8 and len(calls) < 8 and batches == calls
+
+def test_max_batch_splits_and_models_are_not_mixed():
+    seen = []
+    lock = threading.Lock()
+    def scorer(name):
+        def score(X):
+            with lock:
+                seen.append((name, len(X)))
+            return np.full(len(X), name == 'b', dtype=float)
+        return score
+    batcher = MicroBatcher(window=0.05, max_batch=3)
+    jobs = [('a' if i % 2 else 'b', i) for i in range(10)]
+    with ThreadPoolExecutor(10) as pool:
+        out = list(pool.map(lambda j: batcher.submit(j[0], np.zeros(2), scorer(j[0])), jobs))
+    assert out == [float(name == 'b') for name, _ in jobs]
+    assert all(n <= 3 for _, n in seen) and sum(n for _, n in seen) == 10
+
+def test_errors_reach_every_caller_of_the_batch():
+    def score(X):
+        raise RuntimeError('model down')
+    batcher = MicroBatcher(window=0.05, max_batch=4)
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(batcher.submit, 'm', np.zeros(2), score) for _ in range(3)]
+    for f in futures:
+        with pytest.raises(RuntimeError, match='model down'):
+            f.result()
+    # the batcher keeps working afterwards
+    assert batcher.submit('m', np.ones(2), lambda X: X.sum(axis=1)) == 2.0
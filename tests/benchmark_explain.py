@@ -0,0 +1,116 @@
+"""
+Explanation benchmark
+Compares the original per-request LIME setup (a new LimeTabularExplainer over
+np.tile(x0, (50, 1)) on every call) with the shared TabularLime that samples
+from train.py's training statistics, and one-row-at-a-time TreeSHAP with
+the chunked shap_matrix().
+
+Run from the repo root:  python tests/benchmark_explain.py [lime|shap]
+"""
+
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import load
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api.explainers import TabularLime, lime_training_stats, positive_class, shap_matrix  # noqa: E402
+from api.inference import CompiledForest  # noqa: E402
+
+
+def load_inputs():
+    model = load('models/model.joblib')
+    features = json.loads(Path('models/features.json').read_text())
+    X = pd.read_csv('data/heart.csv')[features]
+    return model, features, X
+
+
+def lime_tiled(pre, predict_fn, x0, top_k, num_samples, seed):
+    """The pre-TabularLime implementation of /explain's LIME stage."""
+    from lime.lime_tabular import LimeTabularExplainer
+    explainer = LimeTabularExplainer(np.tile(x0, (50, 1)), feature_names=list(pre.get_feature_names_out()),
+                                     discretize_continuous=False, mode='classification',
+                                     class_names=['No Disease', 'Disease'], random_state=seed)
+    return explainer.explain_instance(x0[0], predict_fn, num_features=top_k, num_samples=num_samples).as_list()
+
+
+def lime_shared(lime, predict_fn, x0, top_k, num_samples, seed):
+    return lime.explain(x0[0], predict_fn, num_features=top_k, num_samples=num_samples, seed=seed)
+
+
+def stability(weights, top=3):
+    """Mean pairwise Jaccard overlap of the ``top`` features by |weight| and
+    mean coefficient of variation of each feature's weight across seeds."""
+    sets = [{n for n, _ in sorted(w, key=lambda t: abs(t[1]), reverse=True)[:top]} for w in weights]
+    names = set().union(*(dict(w) for w in weights))
+    jaccard = np.mean([len(a & b) / len(a | b) for a, b in itertools.combinations(sets, 2)])
+    table = np.array([[dict(w).get(n, 0.0) for n in names] for w in weights])
+    cv = np.mean(table.std(axis=0) / np.maximum(np.abs(table.mean(axis=0)), 1e-12))
+    return jaccard, cv
+
+
+def bench_lime(patients=20, seeds=8, top_k=10, num_samples=100):
+    model, features, X = load_inputs()
+    pre, rf = model.named_steps['preproc'], model.named_steps['rf']
+    rf.n_jobs = None
+    Z = np.asarray(pre.transform(X), dtype=float)
+    lime = TabularLime.from_stats(lime_training_stats(Z, pre.get_feature_names_out()))
+    rows = [Z[i:i + 1] for i in range(patients)]
+    # The compiled forest scores preprocessed rows ~100x faster, which exposes the explainer's own overhead
+    compiled = CompiledForest.from_pipeline(model, features)
+    def compiled_proba(z):
+        p = compiled._predict_chunk(z)[:, 1]
+        return np.column_stack([1 - p, p])
+    print(f'{patients} patients x {seeds} seeds, top_k={top_k}, num_samples={num_samples}')
+
+    print(f"\n{'variant':<18}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'top3 jacc':>10}{'weight cv':>11}")
+    variants = []
+    for model_name, predict_fn in (('rf', rf.predict_proba), ('compiled', compiled_proba)):
+        variants += [(f'tiled/{model_name}', lambda x0, s, f=predict_fn: lime_tiled(pre, f, x0, top_k, num_samples, s)),
+                     (f'shared/{model_name}', lambda x0, s, f=predict_fn: lime_shared(lime, f, x0, top_k, num_samples, s))]
+    for name, run in variants:
+        run(rows[0], 0)  # warm-up (imports)
+        lat, jac, cv = [], [], []
+        for x0 in rows:
+            weights = []
+            for seed in range(seeds):
+                t0 = time.perf_counter()
+                weights.append(run(x0, seed))
+                lat.append((time.perf_counter() - t0) * 1000)
+            j, c = stability(weights)
+            jac.append(j); cv.append(c)
+        lat = np.asarray(lat)
+        print(f'{name:<18}{lat.mean():>10.2f}{np.percentile(lat, 50):>10.2f}{np.percentile(lat, 99):>10.2f}'
+              f'{np.mean(jac):>10.3f}{np.mean(cv):>11.3f}')
+
+
+def bench_shap(rows=(1, 32, 400), chunk_rows=(64, 256)):
+    import shap
+    model, features, X = load_inputs()
+    pre, rf = model.named_steps['preproc'], model.named_steps['rf']
+    explainer = shap.TreeExplainer(rf)
+    explainer.shap_values(pre.transform(X.head(1)))  # warm-up
+
+    print(f"{'rows':>6}{'variant':>16}{'total ms':>11}{'ms/row':>9}")
+    for n in rows:
+        Xn = X.head(n)
+        t0 = time.perf_counter()
+        loop = np.vstack([positive_class(explainer.shap_values(pre.transform(Xn.iloc[[i]]))) for i in range(n)])
+        ms = (time.perf_counter() - t0) * 1000
+        print(f'{n:>6}{"per-row":>16}{ms:>11.1f}{ms / n:>9.2f}')
+        for c in chunk_rows:
+            t0 = time.perf_counter()
+            values, _ = shap_matrix(explainer, Xn, chunk_rows=c, transform=pre.transform)
+            ms = (time.perf_counter() - t0) * 1000
+            assert np.allclose(values, loop)
+            print(f'{n:>6}{f"chunks of {c}":>16}{ms:>11.1f}{ms / n:>9.2f}')
+
+
+if __name__ == '__main__':
+    which = sys.argv[1] if len(sys.argv) > 1 else 'lime'
+    {'lime': bench_lime, 'shap': bench_shap}[which]()
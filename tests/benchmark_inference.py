@@ -0,0 +1,117 @@
+"""
+Inference engine benchmark
+Compares the sklearn Pipeline against the compiled array evaluator, the
+pickled n_jobs=-1 forest against the core-aware scheduler under concurrency,
+and one predict_proba call per request against micro-batching.
+
+Run from the repo root:  python tests/benchmark_inference.py [engines|concurrency|batching]
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from joblib import load
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api.batching import MicroBatcher  # noqa: E402
+from api.inference import CompiledForest, SklearnEngine  # noqa: E402
+from api.scheduler import InferenceScheduler, pin_estimator_threads  # noqa: E402
+
+
+def time_calls(fn, x, repeats):
+    """Return per-call latencies in milliseconds."""
+    fn(x)  # warm-up
+    out = np.empty(repeats)
+    for i in range(repeats):
+        t0 = time.perf_counter()
+        fn(x)
+        out[i] = (time.perf_counter() - t0) * 1000
+    return out
+
+
+def load_inputs():
+    model = load('models/model.joblib')
+    features = json.loads(Path('models/features.json').read_text())
+    X = pd.read_csv('data/heart.csv')[features].to_numpy(dtype=float)
+    return model, features, X
+
+
+def bench_engines(repeats=300):
+    model, features, X = load_inputs()
+
+    engines = [SklearnEngine(model, features), CompiledForest.from_pipeline(model, features)]
+    err = engines[1].max_abs_error(engines[0], X)
+    print(f'Max |p_compiled - p_sklearn| over {len(X)} rows: {err:.3g}')
+
+    print(f"\n{'engine':<10}{'rows':>7}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for rows in (1, 32, len(X)):
+        for engine in engines:
+            lat = time_calls(engine.predict_proba, X[:rows], repeats if rows == 1 else max(10, repeats // 10))
+            print(f'{engine.name:<10}{rows:>7}{lat.mean():>10.3f}{np.percentile(lat, 50):>10.3f}{np.percentile(lat, 99):>10.3f}')
+
+
+def concurrent_latency(predict, X, threads, per_thread):
+    """Latencies (ms) of single-row calls issued from ``threads`` threads at once."""
+    def worker(t):
+        rows = X[t::threads][:per_thread]
+        out = []
+        for i in range(len(rows)):
+            t0 = time.perf_counter()
+            predict(rows[i:i + 1])
+            out.append((time.perf_counter() - t0) * 1000)
+        return out
+    with ThreadPoolExecutor(threads) as pool:
+        return np.concatenate([np.asarray(r) for r in pool.map(worker, range(threads))])
+
+
+def bench_concurrency(threads=8, per_thread=25):
+    model, features, X = load_inputs()
+    rf = model.named_steps['rf']
+    engine = SklearnEngine(model, features)
+    scheduler = InferenceScheduler()
+    print(f'Host CPUs available: {scheduler.cpus}; {threads} concurrent clients, single-row calls')
+
+    rf.n_jobs = -1  # what train.py pickles
+    pickled = concurrent_latency(engine.predict_proba, X, threads, per_thread)
+
+    pin_estimator_threads(model)
+    def scheduled(x):
+        with scheduler.slot(len(x)):
+            return engine.predict_proba(x)
+    pinned = concurrent_latency(scheduled, X, threads, per_thread)
+
+    print(f"\n{'mode':<18}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for name, lat in (('n_jobs=-1', pickled), ('scheduler', pinned)):
+        print(f'{name:<18}{np.percentile(lat, 50):>10.2f}{np.percentile(lat, 90):>10.2f}{np.percentile(lat, 99):>10.2f}')
+
+
+def bench_batching(threads=32, per_thread=20, windows_ms=(1, 2, 5), max_batch=64):
+    model, features, X = load_inputs()
+    pin_estimator_threads(model)
+    engine = SklearnEngine(model, features)
+    scheduler = InferenceScheduler()
+    def score(x):
+        with scheduler.slot(len(x)):
+            return engine.predict_proba(x)[:, 1]
+    print(f'{threads} concurrent clients x {per_thread} single-row requests, max_batch={max_batch}')
+
+    variants = [('per-request', score)]
+    for ms in windows_ms:
+        batcher = MicroBatcher(ms / 1000, max_batch)
+        variants.append((f'batched {ms} ms', lambda x, b=batcher: b.submit('m', x[0], score)))
+    print(f"\n{'mode':<16}{'rows/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, predict in variants:
+        t0 = time.perf_counter()
+        lat = concurrent_latency(predict, X, threads, per_thread)
+        rate = len(lat) / (time.perf_counter() - t0)
+        print(f'{name:<16}{rate:>10.0f}{np.percentile(lat, 50):>10.2f}{np.percentile(lat, 99):>10.2f}')
+
+
+if __name__ == '__main__':
+    which = sys.argv[1] if len(sys.argv) > 1 else 'engines'
+    {'engines': bench_engines, 'concurrency': bench_concurrency, 'batching': bench_batching}[which]()
@@ -0,0 +1,55 @@
+"""
+Response serialization benchmark
+Compares bytes on the wire for full vs compact /predict_batch and /explain
+bodies (raw and gzip-compressed), and encode time of FastAPI's default
+jsonable_encoder + json.dumps against api.encoding.dumps.
+
+Run from the repo root:  python tests/benchmark_serialization.py
+"""
+
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api import encoding  # noqa: E402
+from api.api import FEATURES, app  # noqa: E402
+
+
+def default_render(obj):
+    return json.dumps(jsonable_encoder(obj), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(',', ':')).encode()
+
+
+def time_encode(fn, obj, repeats=200):
+    fn(obj)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn(obj)
+    return (time.perf_counter() - t0) / repeats * 1000
+
+
+def report(name, full, compact):
+    print(f'{name:<22} {"raw B":>9} {"gzip B":>9} {"default ms":>11} {"fast ms":>8}')
+    for label, obj in (('full', full), ('compact', compact)):
+        raw = encoding.dumps(obj)
+        print(f'  {label:<20} {len(raw):>9} {len(gzip.compress(raw, 6)):>9} '
+              f'{time_encode(default_render, obj):>11.3f} {time_encode(encoding.dumps, obj):>8.3f}')
+
+
+if __name__ == '__main__':
+    rows = pd.read_csv('data/heart.csv')[FEATURES].head(256).to_dict(orient='records')
+    print(f'json encoder: {"orjson" if encoding.orjson is not None else "stdlib"}')
+    with TestClient(app) as client:
+        report('/predict_batch x256',
+               client.post('/predict_batch', json={'payloads': rows}).json(),
+               client.post('/predict_batch?compact=true', json={'payloads': rows}).json())
+        report('/explain',
+               client.post('/explain', json={'payload': rows[0]}).json(),
+               client.post('/explain?compact=true', json={'payload': rows[0]}).json())
@@ -0,0 +1,84 @@
+"""
+Wire format benchmark
+Scores the same batch through /predict_batch (JSON payload dicts) and
+/predict_batch/matrix (MessagePack rows, Arrow IPC columns), end to end
+including client-side encoding and response decoding, and times the decode
+step alone: RowDecoder over payload dicts vs columns copied into the matrix.
+Formats whose optional package (msgpack, pyarrow) is missing are skipped.
+
+Run from the repo root:  python tests/benchmark_wire.py [rows]
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api import wire  # noqa: E402
+from api.api import DECODER, FEATURES, app  # noqa: E402
+
+
+def best_ms(fn, repeats=5):
+    fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000
+
+
+def arrow_body(frame):
+    pa = wire.pa
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def main(n_rows):
+    data = pd.read_csv('data/heart.csv')[FEATURES]
+    frame = data.sample(n_rows, replace=True, random_state=0).reset_index(drop=True).astype(float)
+    payloads = frame.to_dict(orient='records')
+
+    print(f'{n_rows} rows')
+    print(f'{"decode only":<24} {"ms":>9}')
+    print(f'  {"json dicts":<22} {best_ms(lambda: DECODER.decode_many(payloads)):>9.2f}')
+    columns = [frame[f].to_numpy() for f in FEATURES]
+    print(f'  {"columns":<22} {best_ms(lambda: wire.columns_to_matrix(FEATURES, FEATURES, columns, n_rows)):>9.2f}')
+
+    cases = [('json', '/predict_batch', lambda: json.dumps({'payloads': payloads}).encode(),
+              'application/json', 'application/json', json.loads)]
+    if wire.msgpack is not None:
+        cases.append(('msgpack', '/predict_batch/matrix',
+                      lambda: wire.msgpack.packb({'columns': FEATURES, 'rows': frame.to_numpy().tolist()}),
+                      wire.MSGPACK_TYPE, wire.MSGPACK_TYPE, wire.msgpack.unpackb))
+    if wire.pa is not None:
+        cases.append(('arrow', '/predict_batch/matrix', lambda: arrow_body(frame), wire.ARROW_TYPE, wire.ARROW_TYPE,
+                      lambda b: wire.pa.ipc.open_stream(b).read_all()))
+    skipped = [f for f in ('msgpack', 'arrow') if not wire.available(f)]
+
+    print(f'{"end to end":<24} {"ms":>9} {"rows/s":>10} {"req B":>10} {"resp B":>10}')
+    with TestClient(app) as client:
+        for name, path, encode, content_type, accept, decode in cases:
+            sizes = {}
+            def call():
+                body = encode()
+                resp = client.post(path, content=body, headers={'Content-Type': content_type, 'Accept': accept,
+                                                                'Accept-Encoding': 'identity'})
+                resp.raise_for_status()
+                decode(resp.content)
+                sizes.update(req=len(body), resp=len(resp.content))
+            ms = best_ms(call)
+            print(f'  {name:<22} {ms:>9.1f} {n_rows / ms * 1000:>10.0f} {sizes["req"]:>10} {sizes["resp"]:>10}')
+    if skipped:
+        print(f'skipped (not installed): {", ".join(skipped)}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,38 @@
+# tests/cache_test.py
+import numpy as np
+
+from api.cache import ExplanationCache, TTLCache
+
+def test_ttl_cache_evicts_and_expires():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put('a', 1); cache.put('b', 2); cache.get('a'); cache.put('c', 3)
+    assert cache.get('b') is None and cache.get('a') == 1  # 'b' was least recently used
+    now[0] = 11
+    assert cache.get('c') is None
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['expirations'] == 1
+
+def test_explanation_cache_disk_tier_survives_restart(tmp_path):
+    path = tmp_path / 'explain.sqlite'
+    row = np.array([50.0, 1.0, np.nan])
+    key = ExplanationCache.key('model-a', row, {'top_k': 10})
+    ExplanationCache(path).put(key, 'model-a', {'shap': [1.0]})
+    fresh = ExplanationCache(path)  # new process: empty memory tier
+    assert fresh.get(key) == ({'shap': [1.0]}, 'disk')
+    assert fresh.get(key)[1] == 'memory'
+    assert fresh.purge(keep_model_hash='model-b') == 1
+    assert ExplanationCache(path).get(key) == (None, None)
+
+def test_purge_in_one_worker_clears_memory_tier_of_others(tmp_path):
+    path = tmp_path / 'explain.sqlite'
+    now = [0.0]
+    key = ExplanationCache.key('model-a', np.array([50.0]), {'top_k': 10})
+    worker_a = ExplanationCache(path, sync_interval=1.0, clock=lambda: now[0])
+    worker_b = ExplanationCache(path)
+    worker_a.put(key, 'model-a', {'shap': [1.0]})
+    assert worker_a.get(key)[1] == 'memory'
+    worker_b.purge()  # DELETE /cache/explain handled by another worker
+    assert worker_a.get(key)[1] == 'memory'  # within sync_interval
+    now[0] = 1.5
+    assert worker_a.get(key) == (None, None)
@@ -12,6 +12,10 @@ from sklearn.metrics import (
 )
 import time
 import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 # Optional: Uncomment if you want to test against actual LLMs
 # import openai
@@ -79,6 +83,26 @@ class ModelComparison:
         
         return results, predictions, probabilities
     
+    def explain_test_set_shap(self, top=5):
+        """Exact SHAP for the whole test set in batched calls (api/explainers.py)"""
+        print("\n🔍 SHAP over the test set...")
+        import shap
+        from api.explainers import shap_matrix
+        
+        pre = self.model.named_steps['preproc']
+        X_test = self.test_data.drop('heart_disease', axis=1)
+        start_time = time.time()
+        values, base = shap_matrix(shap.TreeExplainer(self.model.named_steps['rf']), X_test,
+                                   transform=pre.transform)
+        elapsed = (time.time() - start_time) / len(X_test) * 1000
+        
+        importance = pd.Series(np.abs(values).mean(axis=0), index=pre.get_feature_names_out())
+        print(f"  Explained {len(X_test)} patients ({elapsed:.2f} ms each), base value {base:.3f}")
+        print("  Mean |SHAP| per feature:")
+        for name, value in importance.sort_values(ascending=False).head(top).items():
+            print(f"    {name}: {value:.4f}")
+        return values, base
+    
     def simulate_chatgpt_predictions(self):
         """
         Simulate ChatGPT predictions based on typical LLM behavior
@@ -237,6 +261,9 @@ def main():
     # Test XAI Model
     xai_results, xai_preds, xai_probs = comparison.test_xai_model()
     
+    # Cohort-level SHAP
+    comparison.explain_test_set_shap()
+    
     # Simulate ChatGPT
     llm_results, llm_preds = comparison.simulate_chatgpt_predictions()
     
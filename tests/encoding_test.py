@@ -0,0 +1,72 @@
+# tests/encoding_test.py
+import asyncio
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from api import encoding
+from api.encoding import GZipMiddleware, compact_explanation, dumps, short_name
+
+def test_dumps_is_compact_and_handles_numpy():
+    raw = dumps({'p': np.float64(0.25), 'rows': np.arange(3), 'name': 'åge'})
+    assert json.loads(raw) == {'p': 0.25, 'rows': [0, 1, 2], 'name': 'åge'}
+    assert b' ' not in raw
+
+@pytest.mark.parametrize('backend', ['orjson', 'stdlib'])
+def test_dumps_writes_non_finite_floats_as_null(backend, monkeypatch):
+    if backend == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(encoding, 'orjson', None)
+    obj = {'p': float('nan'), 'rows': [1.5, float('inf')], 'arr': np.array([np.nan, 2.0]),
+           'x': np.float64('-inf'), 'ok': 0.25}
+    assert json.loads(dumps(obj)) == {'p': None, 'rows': [1.5, None], 'arr': [None, 2.0], 'x': None, 'ok': 0.25}
+
+def test_compact_explanation_rounds_and_shortens():
+    out = {'shap': [{'feature': 'num__bmi', 'contribution': 0.123456789}],
+           'lime': [{'feature': 'num__age', 'weight': -0.000000412}],
+           'cost_ms': {'total': 12.3456789}, 'params': {'top_k': 1}}
+    compact = compact_explanation(out, digits=4)
+    assert compact['shap'] == [{'feature': 'bmi', 'contribution': 0.1235}]
+    assert compact['lime'] == [{'feature': 'age', 'weight': -0.0}]
+    assert compact['cost_ms'] == {'total': 12.346} and compact['params'] == {'top_k': 1}
+    assert out['shap'][0]['feature'] == 'num__bmi'  # input untouched
+    assert short_name('age') == 'age'
+
+
+def _run_gzip(media_type, chunks, accept='gzip, deflate'):
+    """Send ``chunks`` through GZipMiddleware; returns the ASGI messages reaching the server."""
+    async def app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', media_type.encode())]})
+        for i, chunk in enumerate(chunks):
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': i < len(chunks) - 1})
+            sent.append(len(messages))  # messages already forwarded when the next chunk is produced
+
+    messages, sent = [], []
+    async def send(message):
+        messages.append(message)
+    scope = {'type': 'http', 'headers': [(b'accept-encoding', accept.encode())]}
+    asyncio.run(GZipMiddleware(app, minimum_size=100)(scope, None, send))
+    return messages, sent
+
+def test_gzip_passes_event_streams_through_chunk_by_chunk():
+    for media_type in ('text/event-stream', 'application/x-ndjson'):
+        chunks = [b'event: prediction\ndata: {}\n\n', b'x' * 500, b'']
+        messages, sent = _run_gzip(media_type, chunks)
+        assert b'content-encoding' not in dict(messages[0]['headers'])
+        assert [m['body'] for m in messages[1:]] == chunks
+        assert sent == [2, 3, 4]  # each chunk is forwarded before the next is produced
+
+def test_gzip_compresses_large_bodies_only():
+    messages, _ = _run_gzip('application/json', [b'{"a": 1}'])
+    assert b'content-encoding' not in dict(messages[0]['headers'])
+    body = json.dumps({'rows': list(range(200))}).encode()
+    messages, _ = _run_gzip('application/json', [body[:300], body[300:]])
+    headers = dict(messages[0]['headers'])
+    assert headers[b'content-encoding'] == b'gzip' and b'content-length' not in headers
+    assert gzip.decompress(b''.join(m['body'] for m in messages[1:])) == body
+    messages, _ = _run_gzip('application/json', [body], accept='identity')
+    assert messages[1]['body'] == body
@@ -0,0 +1,46 @@
+# tests/explainers_test.py
+import json, joblib
+import numpy as np
+import pandas as pd
+import shap
+
+from api.explainers import TabularLime, global_explanation, lime_training_stats, shap_matrix
+
+def test_tabular_lime_is_seeded_and_recovers_linear_weights():
+    rng = np.random.default_rng(0)
+    Z = rng.normal(size=(500, 3))
+    lime = TabularLime.from_stats(lime_training_stats(Z, ['a', 'b', 'c']))
+    def predict_fn(z):
+        p = 1 / (1 + np.exp(-(2.0 * z[:, 0] - 0.5 * z[:, 2])))
+        return np.column_stack([1 - p, p])
+    first = lime.explain(Z[0], predict_fn, num_features=3, num_samples=500, seed=1)
+    assert first == lime.explain(Z[0], predict_fn, num_features=3, num_samples=500, seed=1)
+    weights = dict(first)
+    assert first[0][0] == 'a' and weights['a'] > 0 > weights['c']
+    assert abs(weights['b']) < abs(weights['c'])
+
+def test_shap_matrix_chunks_match_one_call():
+    model = joblib.load('models/model.joblib')
+    with open('models/features.json') as f:
+        features = json.load(f)
+    pre, rf = model.named_steps['preproc'], model.named_steps['rf']
+    X = pd.read_csv('data/heart.csv')[features].head(20)
+    explainer = shap.TreeExplainer(rf)
+    values, base = shap_matrix(explainer, X, chunk_rows=7, transform=pre.transform)
+    whole, _ = shap_matrix(explainer, pre.transform(X), chunk_rows=100)
+    assert values.shape == (20, len(features)) and np.allclose(values, whole)
+    assert np.allclose(values.sum(axis=1) + base, model.predict_proba(X)[:, 1])
+
+def test_global_explanation_summarises_rows():
+    model = joblib.load('models/model.joblib')
+    with open('models/features.json') as f:
+        features = json.load(f)
+    pre, rf = model.named_steps['preproc'], model.named_steps['rf']
+    X = pd.read_csv('data/heart.csv')[features].head(12)
+    out = global_explanation(shap.TreeExplainer(rf), X, pre.transform, pre.get_feature_names_out(),
+                             chunk_rows=5, interaction_rows=3)
+    assert out['n_rows'] == 12 and out['interaction_rows'] == 3
+    values, _ = shap_matrix(shap.TreeExplainer(rf), X, transform=pre.transform)
+    top = out['importance'][0]
+    assert abs(top['mean_abs_shap'] - np.abs(values).mean(axis=0).max()) < 1e-12
+    assert sum(b['count'] for b in out['dependence']['num__sex']) == 12
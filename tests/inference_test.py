@@ -0,0 +1,25 @@
+# tests/inference_test.py
+import json, joblib
+import numpy as np, pandas as pd
+
+from api.inference import CompiledForest, SklearnEngine, build_engine, probe_rows
+
+def _load():
+    model = joblib.load('models/model.joblib')
+    with open('models/features.json') as f:
+        features = json.load(f)
+    return model, features
+
+def test_compiled_forest_matches_sklearn():
+    model, features = _load()
+    reference = SklearnEngine(model, features)
+    compiled = CompiledForest.from_pipeline(model, features)
+    X = pd.read_csv('data/heart.csv')[features].to_numpy(dtype=float)
+    X[::7, 2] = np.nan  # exercise median imputation
+    assert compiled.max_abs_error(reference, X) < 1e-12
+    assert compiled.max_abs_error(reference, probe_rows(compiled, n=500, seed=3)) < 1e-12
+
+def test_build_engine_selects_by_name():
+    model, features = _load()
+    assert build_engine('sklearn', model, features).name == 'sklearn'
+    assert build_engine('compiled', model, features).name == 'compiled'
@@ -0,0 +1,24 @@
+# tests/jobs_test.py
+import threading
+import pytest
+
+from api.jobs import JobManager, JobQueueFull
+
+def test_job_manager_bounds_pending_jobs():
+    release = threading.Event()
+    jobs = JobManager(workers=1, max_pending=2, ttl=60)
+    first = jobs.submit(lambda job: release.wait(5))
+    jobs.submit(lambda job: None)
+    with pytest.raises(JobQueueFull):
+        jobs.submit(lambda job: None)
+    second = jobs._jobs[[k for k in jobs._jobs if k != first.id][0]]
+    jobs.shutdown()
+    release.set()
+    assert jobs.get(first.id) is first and jobs.stats()['rejected'] == 1
+    assert second.status == 'cancelled' and second.finished is not None
+
+def test_job_status_reflects_stage_failures():
+    jobs = JobManager(workers=1)
+    job = jobs.submit(lambda job: 'partial')
+    jobs._pool.shutdown(wait=True)
+    assert job.status == 'partial'
@@ -0,0 +1,19 @@
+# tests/lookup_test.py
+import numpy as np
+
+from api.lookup import build_table, grid_axes, load_table, measure_error, save_table
+
+def test_risk_table_snaps_continuous_and_matches_discrete(tmp_path):
+    X = np.array([[0, 20.0, 30], [1, 22.0, 35], [1, 24.9, 31]], dtype=float)
+    features = ['flag', 'bmi', 'age']
+    axes, snap = grid_axes(X, features, {'bmi': 1.0}, max_levels=2)
+    assert snap == ['exact', 'nearest', 'exact'] and axes[1].tolist() == [20, 21, 22, 23, 24, 25]
+    assert axes[2].tolist() == list(range(30, 36))  # integer range, more levels than max_levels
+    score = lambda rows: rows[:, 0] + rows[:, 1] / 100 + rows[:, 2] / 1000
+    table = build_table(score, features, axes, snap, chunk_cells=7)
+    save_table(tmp_path, table, 'abc')
+    table = load_table(tmp_path, model_sha256='abc', features=features)
+    proba, covered = table.lookup([[1, 21.4, 33], [1, 21.6, 33], [0.5, 21, 33], [1, 27, 33], [1, np.nan, 33]])
+    assert covered.tolist() == [True, True, False, False, False]
+    assert np.allclose(proba[:2], [1.21 + 0.033, 1.22 + 0.033])
+    assert measure_error(table, score, [[1, 21.4, 33]])['max_abs_error'] < 0.0041
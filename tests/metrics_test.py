@@ -0,0 +1,14 @@
+# tests/metrics_test.py
+from api.metrics import Registry
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram('demo_seconds', 'Demo', ('stage',), buckets=(0.1, 1.0))
+    latency.observe(0.05, stage='a'); latency.observe(0.5, stage='a'); latency.observe(5, stage='a')
+    registry.collector(lambda: [('demo_info', 'gauge', 'Info', [({'v': 'x"y'}, 1)])])
+    text = registry.render()
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="a",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="a"} 3' in text
+    assert 'demo_info{v="x\\"y"} 1' in text
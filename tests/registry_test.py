@@ -0,0 +1,58 @@
+# tests/registry_test.py
+import json
+import numpy as np
+import pytest
+
+from api.registry import current_version, list_versions, load_bundle, publish, resolve, set_current, verify
+
+def _fake_models(path, model=b'model-1'):
+    path.mkdir(parents=True, exist_ok=True)
+    (path / 'model.joblib').write_bytes(model)
+    (path / 'features.json').write_text(json.dumps(['age', 'bmi']))
+    (path / 'metrics.json').write_text(json.dumps({'roc_auc': 0.8}))
+    (path / 'lookup').mkdir(exist_ok=True)
+    (path / 'lookup' / 'table.npy').write_bytes(b'table')
+    return path
+
+def test_publish_activate_and_verify(tmp_path):
+    src, registry = _fake_models(tmp_path / 'models'), tmp_path / 'registry'
+    assert current_version(registry) is None and list_versions(registry) == []
+    first = publish(registry, src, version='v1')
+    assert first['metrics'] == {'roc_auc': 0.8}
+    assert sorted(first['files']) == ['features.json', 'lookup/table.npy', 'metrics.json', 'model.joblib']
+    second = publish(registry, _fake_models(src, b'model-2'), activate=True)
+    assert second['version'].endswith(second['model_sha256'][:8])
+    assert current_version(registry) == second['version']
+    assert [m['version'] for m in list_versions(registry)] == ['v1', second['version']]
+    set_current(registry, 'v1')
+    path, manifest = resolve(registry)
+    assert manifest['version'] == 'v1' and verify(path) == manifest
+    with pytest.raises(FileExistsError):
+        publish(registry, src, version='v1')
+    with pytest.raises(LookupError):
+        resolve(registry, '../models')
+    (path / 'lookup' / 'table.npy').write_bytes(b'tampered')
+    with pytest.raises(ValueError):
+        verify(path)
+
+def test_load_bundle_from_registry_version(tmp_path):
+    manifest = publish(tmp_path, 'models', version='v1')
+    path, manifest = resolve(tmp_path, 'v1')
+    bundle = load_bundle(path, manifest=manifest)
+    assert bundle.version == 'v1' and bundle.model_sha256 == manifest['model_sha256']
+    assert bundle.metrics == manifest['metrics'] and bundle.describe()['engine'] == 'sklearn'
+    X = np.full((1, len(bundle.features)), np.nan)
+    assert bundle.engine.predict_proba(X).shape == (1, 2)
+
+def test_compiled_bundle_explains_without_loading_the_pipeline():
+    compiled, reference = load_bundle('models', engine='compiled'), load_bundle('models')
+    assert compiled.engine.name == 'compiled' and not compiled.describe()['pipeline_loaded']
+    X = np.array([[63, 1, 26.5, 0, 1, 1, np.nan, 4], [39, 0, 24.3, 1, 0, 1, 7.0, 2]], dtype=float)
+    Z = compiled.transform(X)
+    assert np.allclose(Z, reference.transform(X))
+    assert np.allclose(compiled.predict_preprocessed(Z), reference.predict_preprocessed(Z), atol=1e-9)
+    explainer, cached = compiled.shap_explainer()
+    assert cached and compiled.explained_features == reference.explained_features
+    assert np.allclose(explainer.shap_values(Z), reference.shap_explainer()[0].shap_values(reference.transform(X)))
+    assert not compiled.describe()['pipeline_loaded'] and compiled.categorical == []
+    assert compiled.model is not None and compiled.describe()['pipeline_loaded']  # still available on demand
@@ -0,0 +1,14 @@
+# tests/scheduler_test.py
+import joblib
+
+from api.scheduler import InferenceScheduler, pin_estimator_threads
+
+def test_scheduler_keeps_small_batches_single_threaded():
+    scheduler = InferenceScheduler(cpus=8, parallel_min_rows=100)
+    assert scheduler.plan(rows=1, inflight=1) == 1
+    assert scheduler.plan(rows=5000, inflight=1) == 8
+    assert scheduler.plan(rows=5000, inflight=4) == 2
+    with scheduler.slot(5000) as n_jobs:
+        assert n_jobs == 8 and scheduler.inflight == 1
+    model = joblib.load('models/model.joblib')
+    assert pin_estimator_threads(model).named_steps['rf'].n_jobs is None
@@ -0,0 +1,38 @@
+# tests/schema_test.py
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from api.schema import RowDecoder, categorical_features
+
+def _features():
+    with open('models/features.json') as f:
+        return json.load(f)
+
+def test_row_decoder_fills_missing_with_nan():
+    features = _features()
+    decoder = RowDecoder(features)
+    X, errors = decoder.decode_many([{'age': 50, 'bmi': None}, {'age': 'old'}])
+    assert X.dtype == np.float64 and X.shape == (2, len(features))
+    assert X[0, features.index('age')] == 50
+    assert np.isnan(X[0, features.index('bmi')]) and np.isnan(X[0, features.index('sex')])
+    assert list(errors) == [1] and 'age' in errors[1]
+    _, errors = decoder.decode_many([{'bmi': float('inf')}, {'bmi': float('nan')}])
+    assert list(errors) == [0, 1]
+
+def test_row_decoder_rejects_categorical_features():
+    with pytest.raises(ValueError, match='categorical'):
+        RowDecoder(['age', 'region'], categorical=['region'])
+
+def test_models_with_one_hot_columns_are_refused():
+    # train.py one-hot encodes non-numeric columns (cat_cols); the float-only schema cannot serve them
+    X = pd.DataFrame({'age': [50.0, 60.0], 'region': ['north', 'south']})
+    pre = ColumnTransformer([('num', 'passthrough', ['age']), ('cat', OneHotEncoder(), ['region'])])
+    pipe = Pipeline([('preproc', pre)]).fit(X)
+    assert categorical_features(pipe) == ['region']
+    with pytest.raises(ValueError, match='categorical'):
+        RowDecoder(list(X.columns), categorical=categorical_features(pipe))
@@ -0,0 +1,45 @@
+# tests/shadow_test.py
+import threading
+import time
+
+import pytest
+
+from api.shadow import Challenger, ShadowPool, ShadowStats
+
+def test_shadow_stats_agreement_and_deltas():
+    stats = ShadowStats('v1', threshold=0.5, window=3)
+    stats.record({'primary': 0.4, 'challenger': 0.45}, {'primary': 0.002, 'challenger': 0.001}, served='primary')
+    stats.record({'primary': 0.6, 'challenger': 0.4}, {'primary': None, 'challenger': 0.003}, served='challenger')
+    stats.count('dropped')
+    out = stats.as_dict()
+    assert out['rows'] == 2 and out['agreement'] == 0.5 and out['dropped'] == 1
+    assert out['served'] == {'primary': 1, 'challenger': 1}
+    assert out['delta']['max_abs'] == pytest.approx(0.2) and out['delta']['mean'] == pytest.approx(-0.075)
+    assert out['latency_ms']['primary']['p50'] == pytest.approx(2.0)
+
+def test_ab_routing_is_sticky_and_proportional():
+    challenger = Challenger(bundle=None, primary_version='v1', mode='ab', percent=25)
+    keys = [i.to_bytes(8, 'little') for i in range(4000)]
+    share = sum(challenger.routes(k) for k in keys) / len(keys)
+    assert 0.2 < share < 0.3
+    assert [challenger.routes(k) for k in keys[:50]] == [challenger.routes(k) for k in keys[:50]]
+    assert not Challenger(None, 'v1', mode='shadow', percent=50).routes(keys[0])
+    with pytest.raises(ValueError):
+        Challenger(None, 'v1', mode='canary')
+    # A new primary restarts the comparison
+    challenger.stats.record({'primary': 0.1, 'challenger': 0.1}, {}, served='primary')
+    assert challenger.stats_for('v2').rows == 0
+
+def test_shadow_pool_drops_instead_of_queueing():
+    pool = ShadowPool(workers=1, max_pending=1)
+    release = threading.Event()
+    assert pool.submit(release.wait) is True
+    assert pool.submit(lambda: None) is False
+    release.set()
+    pool.shutdown()
+    # The slot frees once the running task ends; the pool then restarts with the app
+    deadline = time.monotonic() + 5
+    while not pool.submit(lambda: None):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    pool.shutdown()
@@ -0,0 +1,66 @@
+# tests/wire_test.py
+import numpy as np
+import pytest
+
+from api import wire
+
+FEATURES = ['age', 'bmi', 'smoker']
+
+def test_response_format_follows_accept_and_installed_codecs(monkeypatch):
+    monkeypatch.setattr(wire, 'msgpack', object())
+    monkeypatch.setattr(wire, 'pa', None)
+    assert wire.response_format(None) == 'json'
+    assert wire.response_format('application/msgpack') == 'msgpack'
+    assert wire.response_format('application/json;q=0.5, application/x-msgpack') == 'msgpack'
+    assert wire.response_format('application/msgpack;q=0.2, application/json') == 'json'
+    # Arrow is not installed: fall through to the next acceptable format, then JSON
+    assert wire.response_format('application/vnd.apache.arrow.stream, application/msgpack;q=0.1') == 'msgpack'
+    assert wire.response_format('application/vnd.apache.arrow.stream') == 'json'
+    assert wire.request_format('application/msgpack; charset=binary') == 'msgpack'
+    assert wire.request_format('application/json') is None
+
+def test_columns_to_matrix_orders_chunks_and_flags_infinite_rows():
+    names = ['smoker', 'extra', 'age']
+    columns = [np.array([0., 1., np.nan]), np.array([9., 9., 9.]),
+               [np.array([40.]), np.array([np.inf, 61.])]]
+    X, errors = wire.columns_to_matrix(FEATURES, names, columns, 3)
+    assert X.dtype == np.float64 and X.shape == (3, 3)
+    assert np.array_equal(X[0], [40., np.nan, 0.], equal_nan=True)  # absent bmi is missing
+    assert np.isnan(X[1]).all() and errors == {1: 'age: Input should be a finite number'}
+    assert np.array_equal(X[2], [61., np.nan, np.nan], equal_nan=True)
+    with pytest.raises(ValueError, match='expected 3'):
+        wire.columns_to_matrix(FEATURES, ['age'], [np.array([1., 2.])], 3)
+
+def test_row_limit_is_checked_before_building_the_matrix(monkeypatch):
+    class FakeMsgpack:
+        def unpackb(self, body):
+            return {'rows': [[1.0, 2.0, 0.0]] * 5}
+    monkeypatch.setattr(wire, 'msgpack', FakeMsgpack())
+    monkeypatch.setattr(wire, 'columns_to_matrix', None)  # must not be reached
+    with pytest.raises(wire.BatchTooLarge, match='5 rows'):
+        wire.decode('msgpack', b'', FEATURES, max_rows=4)
+    assert wire.max_body_bytes(10000, 8) > 10000 * 8 * 9
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    body = msgpack.packb({'columns': ['bmi', 'age'], 'rows': [[25.0, 50], [None, 70]]})
+    X, errors = wire.decode('msgpack', body, FEATURES)
+    assert np.array_equal(X, [[50., 25., np.nan], [70., np.nan, np.nan]], equal_nan=True) and not errors
+    with pytest.raises(ValueError, match='2 numbers'):
+        wire.decode('msgpack', msgpack.packb({'columns': ['bmi', 'age'], 'rows': [[1.0]]}), FEATURES)
+
+def test_arrow_round_trip():
+    pa = pytest.importorskip('pyarrow')
+    table = pa.table({'age': pa.array([50, None], pa.int64()), 'bmi': [25.5, 30.0], 'note': ['a', 'b']})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    X, errors = wire.decode('arrow', sink.getvalue().to_pybytes(), FEATURES)
+    assert np.array_equal(X, [[50., 25.5, np.nan], [np.nan, 30., np.nan]], equal_nan=True) and not errors
+
+    body = wire.encode_arrow({'model_version': 'v1'}, np.array([0.7, np.nan]), np.array([True, False]),
+                             {1: 'bad row'}, 0.5)
+    out = pa.ipc.open_stream(body).read_all()
+    assert out.column('prediction').to_pylist() == [1, None]
+    assert out.column('error').to_pylist() == [None, 'bad row']
+    assert out.schema.metadata[b'model_version'] == b'v1'
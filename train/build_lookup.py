@@ -0,0 +1,60 @@
+# train/build_lookup.py
+"""Precompute the quantized risk table served with PREDICT_MODE=lookup.
+
+Run from the repo root after train/train.py:
+    python train/build_lookup.py [--bmi-step 1.0] [--sleep-step 0.5] [--n-jobs -1]
+
+Discrete features keep their observed levels (age as whole years); bmi and
+sleep_hours are quantized with the given steps. The table is scored with the
+compiled forest (checked against sklearn first) and its quantization error is
+measured on random off-grid points and on the training rows.
+"""
+import argparse, hashlib, json, joblib, sys, time
+from pathlib import Path
+import numpy as np, pandas as pd
+from joblib import parallel_config
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api.inference import build_engine
+from api.lookup import build_table, grid_axes, measure_error, save_table
+
+MODEL_DIR = Path('models')
+DATA_PATH = Path('data/heart.csv')
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--bmi-step', type=float, default=1.0)
+parser.add_argument('--sleep-step', type=float, default=0.5)
+parser.add_argument('--n-jobs', type=int, default=-1)
+parser.add_argument('--validation-rows', type=int, default=20000)
+parser.add_argument('--out', default=str(MODEL_DIR/'lookup'))
+args = parser.parse_args()
+
+pipe = joblib.load(MODEL_DIR/'model.joblib')
+features = json.loads((MODEL_DIR/'features.json').read_text())
+model_sha256 = hashlib.sha256((MODEL_DIR/'model.joblib').read_bytes()).hexdigest()
+X = pd.read_csv(DATA_PATH)[features].to_numpy(dtype=float)
+
+engine = build_engine('compiled', pipe, features)
+def score(rows):
+    with parallel_config(n_jobs=args.n_jobs):
+        return engine.predict_proba(rows)[:, 1]
+
+axes, snap = grid_axes(X, features, {'bmi': args.bmi_step, 'sleep_hours': args.sleep_step})
+print('Grid:', {f: len(a) for f, a in zip(features, axes)})
+t0 = time.time()
+def progress(done, total):
+    if done == total or done % (1 << 20) < (1 << 16):
+        print(f'  {done}/{total} cells ({time.time() - t0:.0f}s)')
+table = build_table(score, features, axes, snap, progress=progress)
+
+# Off-grid validation: continuous axes uniform over their range, discrete ones at their levels
+rng = np.random.default_rng(0)
+R = np.column_stack([
+    rng.uniform(a[0], a[-1], args.validation_rows) if s == 'nearest' else rng.choice(a, args.validation_rows)
+    for a, s in zip(axes, snap)
+])
+table.error = {'random': measure_error(table, score, R), 'training': measure_error(table, score, X)}
+print('Quantization error:', table.error)
+
+save_table(args.out, table, model_sha256)
+print(f'Wrote {table.n_cells} cells ({table.table.nbytes / 2**20:.1f} MiB) to {args.out}')
@@ -0,0 +1,33 @@
+# train/publish_model.py
+"""Publish the artifacts in models/ as a new model registry version.
+
+Run from the repo root after train/train.py (and build_lookup.py, if used):
+    python train/publish_model.py [--version NAME] [--activate]
+    python train/publish_model.py --list
+
+With --activate the version becomes the registry's CURRENT: API workers
+started with MODEL_WATCH_SECONDS > 0 load, warm and swap it in on their own;
+otherwise POST /admin/models/reload on each worker.
+"""
+import argparse, json, sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api.registry import current_version, list_versions, publish
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--source', default='models')
+parser.add_argument('--registry', default='models/registry')
+parser.add_argument('--version', default=None)
+parser.add_argument('--activate', action='store_true')
+parser.add_argument('--list', action='store_true')
+args = parser.parse_args()
+
+if args.list:
+    current = current_version(args.registry)
+    for m in list_versions(args.registry):
+        print('*' if m['version'] == current else ' ', m['version'], m['model_sha256'][:12], json.dumps(m['metrics']))
+else:
+    manifest = publish(args.registry, args.source, version=args.version, activate=args.activate)
+    print(f"Published {manifest['version']} ({len(manifest['files'])} files)"
+          + (' and made it CURRENT' if args.activate else ''))
@@ -1,5 +1,5 @@
 # train/train.py
-import json, joblib
+import hashlib, json, joblib, sys
 from pathlib import Path
 import numpy as np, pandas as pd
 from sklearn.compose import ColumnTransformer
@@ -11,9 +11,15 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, accuracy_score, precision_score, recall_score
 import shap
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from api.artifacts import export_shared
+from api.explainers import global_explanation, lime_training_stats
+from api.inference import build_engine
+
 DATA_PATH = Path('data/heart.csv')       # change to your CSV
 TARGET = 'heart_disease'                  # binary 0/1
 MODEL_DIR = Path('models'); MODEL_DIR.mkdir(exist_ok=True, parents=True)
+GLOBAL_INTERACTION_ROWS = 200             # SHAP interaction values are ~n_features x slower
 
 df = pd.read_csv(DATA_PATH)
 assert TARGET in df.columns, f"Target '{TARGET}' not found"
@@ -71,13 +77,44 @@ print('Validation metrics:', metrics)
 
 joblib.dump(pipe, MODEL_DIR/'model.joblib')
 joblib.dump(preproc, MODEL_DIR/'preproc.joblib')
+# The API only reuses derived artifacts whose hash matches the model it loaded
+model_sha256 = hashlib.sha256((MODEL_DIR/'model.joblib').read_bytes()).hexdigest()
+X_bg = None
 
 try:
     rf = pipe.named_steps['rf']
-    X_bg = pipe.named_steps['preproc'].fit_transform(X_tr)
+    X_bg = pipe.named_steps['preproc'].transform(X_tr)
     explainer = shap.TreeExplainer(rf)
-    joblib.dump({'explainer': explainer, 'background': X_bg, 'feature_names': pipe.named_steps['preproc'].get_feature_names_out()}, MODEL_DIR/'shap_explainer.joblib')
+    joblib.dump({'explainer': explainer, 'background': X_bg, 'feature_names': pipe.named_steps['preproc'].get_feature_names_out(),
+                 'model_sha256': model_sha256}, MODEL_DIR/'shap_explainer.joblib')
 except Exception as e:
     print('SHAP explainer not cached:', e)
 
+# Global SHAP summary served by /global_importance (no per-request model work)
+try:
+    global_exp = global_explanation(
+        shap.TreeExplainer(pipe.named_steps['rf']), X_tr, pipe.named_steps['preproc'].transform,
+        pipe.named_steps['preproc'].get_feature_names_out(), n_jobs=-1,
+        interaction_rows=GLOBAL_INTERACTION_ROWS, model_sha256=model_sha256)
+    (MODEL_DIR/'global_importance.json').write_text(json.dumps(global_exp, indent=2))
+    print('Top global features:', [r['feature'] for r in global_exp['importance'][:3]])
+except Exception as e:
+    print('Global explanation not written:', e)
+
+# Training-distribution statistics LIME samples perturbations from
+try:
+    Z_tr = np.asarray(pipe.named_steps['preproc'].transform(X_tr), dtype=float)
+    lime_stats = lime_training_stats(Z_tr, pipe.named_steps['preproc'].get_feature_names_out(), model_sha256)
+    (MODEL_DIR/'lime_stats.json').write_text(json.dumps(lime_stats, indent=2))
+except Exception as e:
+    print('LIME stats not written:', e)
+
+# Memory-mappable copy of the forest for multi-worker serving (compiled engine only).
+# Checked against sklearn here: workers loading it never load the pipeline to compare.
+try:
+    forest = build_engine('compiled', pipe, features)
+    export_shared(MODEL_DIR/'shared', forest, model_sha256)
+except Exception as e:
+    print('Shared artifacts not exported:', e)
+
 (Path(MODEL_DIR/'metrics.json')).write_text(json.dumps(metrics, indent=2))